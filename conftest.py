@@ -1,3 +1,5 @@
+import sys
+
 # Define which file to ignore in tests:
 collect_ignore = ["setup.py", "bootstrap.py", "docs/conf.py"]
 
@@ -8,3 +10,8 @@ collect_ignore.append("docs/client.rst")
 # These lines should be deleted when all examples use local files:
 collect_ignore.append("docs/index.rst")
 collect_ignore.append("src/pydap/client.py")
+
+# The asynchronous client requires Python 3.6:
+if sys.version_info < (3, 6):
+    collect_ignore.append("src/pydap/aio.py")
+    collect_ignore.append("src/pydap/tests/test_aio.py")
@@ -16,6 +16,9 @@ install_requires = [
 if sys.version_info < (3, 5):
     install_requires.append('singledispatch')
 
+if sys.version_info < (3, 2):
+    install_requires.append('futures')
+
 functions_extras = [
     'gsw==3.0.6',
     'coards'
@@ -36,6 +39,10 @@ cas_extras = [
     'lxml'
 ]
 
+async_extras = [
+    'aiohttp'
+]
+
 hdl_netcdf_extras = [
     'netCDF4',
     'ordereddict'
@@ -45,7 +52,7 @@ tests_require = (functions_extras + cas_extras + server_extras +
                  hdl_netcdf_extras +
                  ['WebTest',
                   'beautifulsoup4',
-                  'flake8'])
+                  'flake8>=3.8'])
 
 testing_extras = tests_require + [
     'pytest>=2.8',
@@ -92,6 +99,7 @@ setup(name='Pydap',
             'docs': docs_extras,
             'tests': tests_require,
             'cas': cas_extras,
+            'async': async_extras,
             'server': server_extras,
             'handlers.netcdf': hdl_netcdf_extras
       },
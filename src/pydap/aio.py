@@ -0,0 +1,415 @@
+"""Asynchronous Pydap client.
+
+This module offers an ``asyncio`` flavour of ``pydap.client.open_url``, so
+that many remote reads can be multiplexed on a single event loop. Datasets
+are built like in the blocking client, but their data proxies download data
+only when awaited:
+
+    >>> from pydap.aio import open_url_async
+    >>> async def main():
+    ...     dataset = await open_url_async(
+    ...         'http://test.opendap.org/dap/data/nc/coads_climatology.nc')
+    ...     sst = await dataset.SST.array.data.get((0, slice(10, 20)))
+    ...     await dataset.aclose()
+
+Slicing a proxy returns a new proxy, without downloading anything, and
+sequences are iterated with ``async for``, decoding the records as the data
+arrives.
+
+Requests for a dataset share a single ``aiohttp.ClientSession``, so that
+connections are reused; the session is closed by awaiting the ``aclose``
+method of the dataset.
+
+This module requires Python 3.6 or newer, and remote URLs require the
+``aiohttp`` package. Local WSGI applications can be opened without it.
+
+"""
+
+import asyncio
+import copy
+import logging
+
+from xml.etree.ElementTree import ParseError
+
+import numpy as np
+from six.moves.urllib.parse import urlsplit, urlunsplit
+from webob.exc import HTTPError
+from webob.response import Response
+
+from .lib import (
+    combine_slices, fix_slice, slice_shape, native_dtype, BytesReader,
+    DEFAULT_TIMEOUT)
+from .net import GET, raise_for_status, BLOCKSIZE, HOP_BY_HOP
+from .handlers.dap import (
+    DAPHandler, BaseProxy, SequenceProxy, CHUNK_BYTES, safe_charset_text,
+    safe_dds_and_data_stream, unpack_sequence, records_to_array, iter_body)
+
+logger = logging.getLogger('pydap')
+
+
+async def open_url_async(url, application=None, session=None,
+                         output_grid=True, timeout=DEFAULT_TIMEOUT,
+                         max_workers=None, chunk_bytes=CHUNK_BYTES,
+                         lazy_attributes=False, ddx=False):
+    """Open a remote URL, returning a dataset with asynchronous proxies.
+
+    session can be an ``aiohttp.ClientSession``, shared with other datasets;
+    otherwise a new session is created for the dataset, and closed by
+    awaiting ``dataset.aclose()``.
+
+    set max_workers to download requests larger than chunk_bytes
+    in parallel, using up to max_workers concurrent requests.
+
+    set ddx to True to read the metadata from a single DDX response, for
+    servers that support it.
+    """
+    own_session = None
+    if session is None and application is None:
+        session = own_session = import_aiohttp().ClientSession()
+    handler = AsyncDAPHandler(application, session, output_grid, timeout,
+                              max_workers, chunk_bytes, lazy_attributes)
+    handler.own_session = own_session
+    try:
+        dataset = await handler.open(url, ddx)
+    except BaseException:
+        await handler.aclose()
+        raise
+    dataset.aclose = handler.aclose
+    return dataset
+
+
+async def get_metadata_async(url, application=None, session=None,
+                             timeout=DEFAULT_TIMEOUT):
+    """Return the text of a metadata response, like the DDS or the DAS."""
+    async with AsyncGET(url, application, session, timeout) as r:
+        response = await r.read()
+    raise_for_status(response)
+    return safe_charset_text(response)
+
+
+class AsyncDAPHandler(DAPHandler):
+
+    """Build datasets with asynchronous proxies.
+
+    Unlike ``DAPHandler`` the metadata is not downloaded on initialization;
+    it is downloaded by awaiting ``open``, or passed to ``build`` instead.
+
+    """
+
+    def __init__(self, application=None, session=None, output_grid=True,
+                 timeout=DEFAULT_TIMEOUT, max_workers=None,
+                 chunk_bytes=CHUNK_BYTES, lazy_attributes=False):
+        self.application = application
+        self.session = session
+        self.own_session = None
+        self.output_grid = output_grid
+        self.timeout = timeout
+        self.max_workers = max_workers
+        self.chunk_bytes = chunk_bytes
+        self.cache = None
+        self.planner = None
+        self.lazy_attributes = lazy_attributes
+
+    async def open(self, url, ddx=False):
+        """Download the metadata of `url`, returning the dataset."""
+        application, session, timeout = (
+            self.application, self.session, self.timeout)
+        scheme, netloc, path, query, fragment = urlsplit(url)
+
+        if ddx:
+            ddxurl = urlunsplit(
+                (scheme, netloc, path + '.ddx', query, fragment))
+            try:
+                text = await get_metadata_async(
+                    ddxurl, application, session, timeout)
+                return self.build_ddx(url, text)
+            except (HTTPError, ParseError):
+                # not supported, or answered with an error page
+                pass
+
+        ddsurl = urlunsplit((scheme, netloc, path + '.dds', query, fragment))
+        dasurl = urlunsplit((scheme, netloc, path + '.das', query, fragment))
+        dds, das = await asyncio.gather(
+            get_metadata_async(ddsurl, application, session, timeout),
+            get_metadata_async(dasurl, application, session, timeout))
+        return self.build(url, dds, das)
+
+    async def aclose(self):
+        """Close the session, if it was created for this dataset."""
+        if self.own_session is not None:
+            session, self.own_session = self.own_session, None
+            await session.close()
+
+    def base_proxy(self, url, var):
+        return AsyncBaseProxy(url, var.id, var.dtype, var.shape,
+                              application=self.application,
+                              session=self.session, timeout=self.timeout,
+                              max_workers=self.max_workers,
+                              chunk_bytes=self.chunk_bytes)
+
+    def grid_proxies(self, url, grid, maps):
+        # grids are sliced with a request per variable
+        for var in grid.children():
+            var.data = self.base_proxy(url, var)
+
+    def sequence_proxy(self, url, template):
+        return AsyncSequenceProxy(url, template, application=self.application,
+                                  session=self.session, timeout=self.timeout)
+
+
+class AsyncBaseProxy(BaseProxy):
+
+    """An asynchronous proxy for remote base types.
+
+    Slicing the proxy returns a new proxy; the data is downloaded by awaiting
+    ``get``.
+
+    Unlike in the blocking client, each response is read completely before
+    it is decoded, so it is held in memory together with the decoded data.
+    Set `max_workers` above one to split requests larger than `chunk_bytes`,
+    which also limits the size of each response.
+
+    """
+
+    def __getitem__(self, index):
+        out = copy.copy(self)
+        out.slice = combine_slices(self.slice, fix_slice(index, self.shape))
+        return out
+
+    async def get(self, index=Ellipsis):
+        """Download and return the data for `index`."""
+        index = combine_slices(self.slice, fix_slice(index, self.shape))
+
+        parts = None
+        if self.max_workers and self.max_workers > 1:
+            parts = self._parts(index)
+        if not parts:
+            return await self._fetch_async(index)
+
+        # download the parts concurrently, directly into the output array
+        out = np.empty(slice_shape(index), native_dtype(self.dtype))
+        semaphore = asyncio.Semaphore(self.max_workers)
+
+        async def fetch_part(part, region):
+            async with semaphore:
+                out[region] = await self._fetch_async(part)
+
+        await asyncio.gather(*[fetch_part(part, region)
+                               for part, region in parts])
+        return out
+
+    async def _fetch_async(self, index):
+        url = self._data_url(index)
+        logger.info("Fetching URL: %s" % url)
+        async with AsyncGET(url, self.application, self.session,
+                            self.timeout) as r:
+            response = await r.read()
+        raise_for_status(response)
+        dds, stream = safe_dds_and_data_stream(response)
+        return self._unpack(dds, stream)
+
+
+class AsyncSequenceProxy(SequenceProxy):
+
+    """An asynchronous proxy for remote sequences.
+
+    Records are iterated with ``async for``, and are decoded as soon as they
+    are received.
+
+    """
+
+    async def __aiter__(self):
+        async with AsyncGET(self.url, self.application, self.session,
+                            self.timeout) as r:
+            if r.response.status_code >= 300:
+                raise_for_status(await r.read())
+            chunks = r.iter_chunks()
+            try:
+                async for rec in self._unpack_chunks(chunks):
+                    yield rec
+            finally:
+                await chunks.aclose()
+
+    async def _unpack_chunks(self, chunks):
+        # fast forward past the DDS header; the buffer is extended and
+        # consumed in place, so that data is not copied for each chunk
+        marker = b'\nData:\n'
+        buffer = bytearray()
+        async for chunk in chunks:
+            start = max(0, len(buffer) - len(marker) + 1)
+            buffer += chunk
+            i = buffer.find(marker, start)
+            if i != -1:
+                del buffer[:i + len(marker)]
+                break
+        else:
+            raise ValueError(
+                "Could not find data segment in response from {}"
+                .format(self.url))
+
+        while True:
+            records, pos, done = unpack_available(buffer, self.template)
+            for rec in records:
+                yield rec
+            if done:
+                break
+
+            # keep the incomplete record and wait for more data
+            del buffer[:pos]
+            try:
+                buffer += await chunks.__anext__()
+            except StopAsyncIteration:
+                raise ValueError(
+                    "Incomplete sequence in response from {}"
+                    .format(self.url))
+
+    async def to_array(self):
+        """Download the sequence, returning a Numpy structured array."""
+        return records_to_array(
+            [rec async for rec in self], self.template)
+
+    def _stream(self):
+        raise TypeError(
+            "Asynchronous sequences should be iterated with ``async for``")
+
+
+class Incomplete(Exception):
+
+    """Raised when a record is not fully received yet."""
+
+
+class PartialReader(BytesReader):
+
+    """A reader over the data received so far.
+
+    Reading past the end raises ``Incomplete``, since the missing data may
+    not have arrived yet; peeking returns only the data received.
+
+    """
+
+    def _check(self, n):
+        if self.pos + n > len(self.data):
+            raise Incomplete()
+
+    def skip(self, n):
+        self._check(n)
+        return super(PartialReader, self).skip(n)
+
+    def read(self, n):
+        self._check(n)
+        return super(PartialReader, self).read(n)
+
+    def readinto(self, b):
+        self._check(memoryview(b).nbytes)
+        return super(PartialReader, self).readinto(b)
+
+
+def unpack_available(data, template):
+    """Unpack the complete records in the beginning of a sequence.
+
+    Returns the records, the position after the last complete record, and a
+    flag indicating if the end of the sequence was found.
+
+    """
+    reader = PartialReader(data)
+    records, pos = [], 0
+    try:
+        for rec in unpack_sequence(reader, template):
+            records.append(rec)
+            pos = reader.pos
+    except Incomplete:
+        return records, pos, False
+    return records, reader.pos, True
+
+
+class AsyncGET(object):
+
+    """Asynchronous context manager for a GET request.
+
+    The response is available as a ``webob`` response in the ``response``
+    attribute, while the body is read with ``read`` or ``iter_chunks``.
+    Local WSGI applications are called directly.
+
+    """
+
+    def __init__(self, url, application=None, session=None,
+                 timeout=DEFAULT_TIMEOUT, headers=None):
+        self.url = url
+        self.application = application
+        self.session = session
+        self.timeout = timeout
+        self.headers = headers
+        self.response = None
+        self.raw = None
+        self.own_session = None
+
+    async def __aenter__(self):
+        if self.application is not None:
+            self.response = GET(self.url, self.application,
+                                headers=self.headers)
+            return self
+
+        aiohttp = import_aiohttp()
+        session = self.session
+        if session is None:
+            session = self.own_session = aiohttp.ClientSession()
+        try:
+            # like in the blocking client, the timeout applies to each read
+            self.raw = await session.get(
+                self.url, headers=self.headers,
+                timeout=aiohttp.ClientTimeout(
+                    sock_connect=self.timeout, sock_read=self.timeout))
+        except asyncio.TimeoutError:
+            await self.close()
+            raise HTTPError('Timeout')
+
+        # the body is decompressed by aiohttp
+        exclude = set(HOP_BY_HOP)
+        if getattr(session, 'auto_decompress', True):
+            exclude.update(['content-encoding', 'content-length'])
+        self.response = Response(
+            status=self.raw.status,
+            headerlist=[(k, v) for k, v in self.raw.headers.items()
+                        if k.lower() not in exclude],
+            app_iter=[])
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+
+    async def close(self):
+        if self.raw is not None:
+            self.raw.release()
+        if self.own_session is not None:
+            await self.own_session.close()
+
+    async def iter_chunks(self):
+        """Iterate over the chunks of the body."""
+        if self.raw is None:
+            for chunk in iter_body(self.response):
+                yield chunk
+        else:
+            try:
+                async for chunk in self.raw.content.iter_chunked(BLOCKSIZE):
+                    yield chunk
+            except asyncio.TimeoutError:
+                raise HTTPError('Timeout')
+
+    async def read(self):
+        """Read the whole body, returning the ``webob`` response."""
+        if self.raw is not None:
+            try:
+                body = await self.raw.read()
+            except asyncio.TimeoutError:
+                raise HTTPError('Timeout')
+            self.response.app_iter = [body]
+        return self.response
+
+
+def import_aiohttp():
+    try:
+        import aiohttp
+    except ImportError:
+        raise ImportError(
+            "The asynchronous client requires aiohttp for remote URLs")
+    return aiohttp
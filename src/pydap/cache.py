@@ -0,0 +1,318 @@
+"""Client side caches.
+
+The ``TileCache`` keeps pieces of remote arrays in memory, so that
+overlapping requests for the same variable are served without downloading
+the data again. It can be passed to ``pydap.client.open_url``:
+
+    >>> from pydap.client import open_url
+    >>> from pydap.cache import TileCache
+    >>> cache = TileCache(max_bytes=2**30)
+    >>> dataset = open_url(
+    ...     'http://test.opendap.org/dap/data/nc/coads_climatology.nc',
+    ...     cache=cache)  # doctest: +SKIP
+
+The ``MetadataCache`` stores the DDS and DAS responses on disk, so that
+opening the same dataset again only needs a conditional request, or no
+request at all while the responses are younger than `ttl` seconds:
+
+    >>> from pydap.cache import MetadataCache
+    >>> dataset = open_url(
+    ...     'http://test.opendap.org/dap/data/nc/coads_climatology.nc',
+    ...     metadata_cache=MetadataCache('/tmp/pydap', ttl=3600),
+    ...     )  # doctest: +SKIP
+
+"""
+
+import io
+import os
+import json
+import time
+import hashlib
+import tempfile
+import threading
+import itertools
+from collections import OrderedDict
+
+import numpy as np
+from six import text_type
+
+from .lib import slice_shape, native_dtype
+
+
+class TileCache(object):
+
+    """An in-memory cache of remote arrays, stored in tiles.
+
+    Each variable is divided into a regular grid of tiles of about
+    `tile_bytes`. A request downloads only the tiles that are not in the
+    cache, merging adjacent tiles into as few hyperslabs as possible, and the
+    response is assembled from the tiles. Tiles are discarded in least
+    recently used order when the cache holds more than `max_bytes`.
+
+    Concurrent requests for the same tiles are collapsed: only the first
+    request downloads the data, while the others wait for it.
+
+    """
+
+    def __init__(self, max_bytes=2**28, tile_bytes=2**20):
+        self.max_bytes = max_bytes
+        self.tile_bytes = tile_bytes
+        self.nbytes = 0
+        self.tiles = OrderedDict()
+        self.pending = {}
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.tiles)
+
+    def clear(self):
+        """Remove all tiles from the cache."""
+        with self.lock:
+            self.tiles.clear()
+            self.nbytes = 0
+
+    def tile_shape(self, bounds, itemsize):
+        """Return the shape of the tiles for a variable.
+
+        Tiles span the fastest varying axes completely, splitting the slower
+        ones so that each tile has about `tile_bytes`.
+
+        """
+        shape = [1] * len(bounds)
+        size = max(itemsize, 1)
+        for axis in reversed(range(len(bounds))):
+            n = max(1, min(bounds[axis], self.tile_bytes // size))
+            shape[axis] = n
+            if n < bounds[axis]:
+                break
+            size *= n
+        return tuple(shape)
+
+    def get(self, key, index, bounds, dtype, fetch, out=None):
+        """Return the data for a normalized `index` of a variable.
+
+        The variable is identified by `key`, and `bounds` is its shape. Missing
+        tiles are downloaded by calling `fetch` with a normalized slice. If
+        `out` is given the data is assembled directly into it.
+
+        """
+        tile = self.tile_shape(bounds, dtype.itemsize)
+        key = (key, tile)
+        shape = slice_shape(index)
+        if 0 in shape:
+            return np.empty(shape, native_dtype(dtype)) if out is None else out
+
+        # find the tiles that hold at least one of the requested points
+        needed = list(itertools.product(*[
+            tile_range(s, n, count)
+            for s, n, count in zip(index, tile, shape)]))
+
+        tiles = {}
+        while len(tiles) < len(needed):
+            missing, waiting = self._reserve(key, needed, tiles)
+            try:
+                for box in merge_tiles(missing):
+                    part = tuple(slice(lo * n, min(hi * n, bound), 1)
+                                 for (lo, hi), n, bound
+                                 in zip(box, tile, bounds))
+                    data = fetch(part)
+                    for coords in itertools.product(
+                            *[range(lo, hi) for lo, hi in box]):
+                        region = tuple(
+                            slice((i - lo) * n, (i - lo + 1) * n)
+                            for i, (lo, hi), n in zip(coords, box, tile))
+                        tiles[coords] = data[region].copy()
+                        self._store((key, coords), tiles[coords])
+            finally:
+                self._release(key, missing)
+
+            # tiles being downloaded by other requests
+            for coords, event in waiting:
+                event.wait()
+            with self.lock:
+                for coords, event in waiting:
+                    if (key, coords) in self.tiles:
+                        tiles[coords] = self.tiles[(key, coords)]
+
+        return assemble_tiles(tiles, index, tile, shape, out)
+
+    def _reserve(self, key, needed, tiles):
+        """Collect cached tiles, and reserve the missing ones for download.
+
+        Returns the tiles that should be downloaded, and the tiles that are
+        being downloaded by other requests with the corresponding events.
+
+        """
+        missing, waiting = [], []
+        with self.lock:
+            for coords in needed:
+                if coords in tiles:
+                    continue
+                if (key, coords) in self.tiles:
+                    self.tiles[(key, coords)] = tiles[coords] = (
+                        self.tiles.pop((key, coords)))
+                elif (key, coords) in self.pending:
+                    waiting.append((coords, self.pending[(key, coords)]))
+                else:
+                    self.pending[(key, coords)] = threading.Event()
+                    missing.append(coords)
+        return missing, waiting
+
+    def _release(self, key, missing):
+        with self.lock:
+            for coords in missing:
+                self.pending.pop((key, coords)).set()
+
+    def _store(self, key, data):
+        with self.lock:
+            if key in self.tiles:
+                self.nbytes -= self.tiles.pop(key).nbytes
+            self.tiles[key] = data
+            self.nbytes += data.nbytes
+            while self.nbytes > self.max_bytes and self.tiles:
+                _, old = self.tiles.popitem(last=False)
+                self.nbytes -= old.nbytes
+
+
+def merge_tiles(tiles):
+    """Merge tile coordinates into boxes of adjacent tiles.
+
+    Returns a list of boxes, each one a tuple with the range of tiles along
+    each axis:
+
+        >>> merge_tiles([(0, 0), (0, 1), (1, 0), (1, 1), (3, 1)])
+        [((0, 2), (0, 2)), ((3, 4), (1, 2))]
+
+    """
+    boxes = [tuple((i, i + 1) for i in coords) for coords in tiles]
+    for axis in reversed(range(len(boxes[0]) if boxes else 0)):
+        def others(box):
+            return box[:axis] + box[axis+1:]
+
+        boxes.sort(key=lambda box: (others(box), box[axis]))
+        merged = []
+        for box in boxes:
+            if (merged and others(merged[-1]) == others(box) and
+                    merged[-1][axis][1] == box[axis][0]):
+                last = merged[-1]
+                merged[-1] = (last[:axis] + ((last[axis][0], box[axis][1]),) +
+                              last[axis+1:])
+            else:
+                merged.append(box)
+        boxes = merged
+    return sorted(boxes)
+
+
+def tile_range(s, n, count):
+    """Return the tiles of size `n` holding the points of a normalized slice.
+
+        >>> tile_range(slice(3, 20, 2), 4, 9)
+        [0, 1, 2, 3, 4]
+        >>> tile_range(slice(3, 40, 10), 4, 4)
+        [0, 3, 5, 8]
+
+    """
+    last = s.start + (count - 1) * s.step
+    if s.step <= n:
+        # consecutive points never skip a tile
+        return list(range(s.start // n, last // n + 1))
+    return np.unique(np.arange(s.start, last + 1, s.step) // n).tolist()
+
+
+def assemble_tiles(tiles, index, tile, shape, out=None):
+    """Assemble the data for a normalized `index` from a dict of tiles.
+
+    If `out` is given the data is assembled into it.
+
+    """
+    for coords, data in tiles.items():
+        src, dst = [], []
+        for i, s, n, count, size in zip(
+                coords, index, tile, shape, data.shape):
+            lo, hi = i * n, i * n + size
+            # first and last points of the request inside the tile
+            k0 = max(0, -(-(lo - s.start) // s.step))
+            k1 = min(count, -(-(hi - s.start) // s.step))
+            src.append(slice(s.start + k0 * s.step - lo,
+                             s.start + (k1 - 1) * s.step - lo + 1, s.step))
+            dst.append(slice(k0, k1))
+        if out is None:
+            out = np.empty(shape, data.dtype)
+        out[tuple(dst)] = data[tuple(src)]
+    return out
+
+
+class MetadataCache(object):
+
+    """A persistent cache of metadata responses, stored in `path`.
+
+    Each response is stored in a JSON file named after the hash of its URL,
+    together with its ``ETag`` and ``Last-Modified`` headers. Responses
+    younger than `ttl` seconds are used directly; older ones are revalidated
+    with a conditional request.
+
+    """
+
+    def __init__(self, path, ttl=0):
+        self.path = path
+        self.ttl = ttl
+        if not os.path.isdir(path):
+            os.makedirs(path)
+
+    def filename(self, url):
+        """Return the file where the response for `url` is stored."""
+        key = hashlib.sha1(url.encode('utf-8')).hexdigest()
+        return os.path.join(self.path, key + '.json')
+
+    def get(self, url):
+        """Return the entry stored for `url`, or ``None``."""
+        try:
+            with io.open(self.filename(url), encoding='utf-8') as f:
+                entry = json.load(f)
+        except (IOError, OSError, ValueError):
+            return None
+        if entry.get('url') != url:
+            return None
+        return entry
+
+    def set(self, url, text, headers=None, entry=None):
+        """Store the `text` of the response for `url`.
+
+        The validators are read from the response `headers`, or copied from
+        an old `entry` when the response was revalidated.
+
+        """
+        entry = dict(entry or {}, url=url, text=text, time=time.time())
+        for header in ['ETag', 'Last-Modified']:
+            if headers is not None and header in headers:
+                entry[header] = headers[header]
+
+        # write to a temporary file first, so readers never see partial data
+        fd, tmp = tempfile.mkstemp(dir=self.path, suffix='.tmp')
+        try:
+            with io.open(fd, 'w', encoding='utf-8') as f:
+                f.write(text_type(json.dumps(entry)))
+            getattr(os, 'replace', os.rename)(tmp, self.filename(url))
+        except Exception:
+            os.remove(tmp)
+            raise
+        return entry
+
+    def fresh(self, entry):
+        """Return true if `entry` can be used without revalidation."""
+        return time.time() - entry['time'] < self.ttl
+
+    def conditional_headers(self, entry):
+        """Return the headers for revalidating `entry`."""
+        headers = {}
+        if 'ETag' in entry:
+            headers['If-None-Match'] = entry['ETag']
+        if 'Last-Modified' in entry:
+            headers['If-Modified-Since'] = entry['Last-Modified']
+        return headers
+
+    def clear(self):
+        """Remove all entries from the cache."""
+        for name in os.listdir(self.path):
+            if name.endswith('.json'):
+                os.remove(os.path.join(self.path, name))
@@ -24,6 +24,23 @@ Ferret and the GrADS data servers:
 Setting the `metadata` flag will also request the das response, populating the
 dataset with the corresponding metadata.
 
+Many datasets can be opened concurrently, and small reads from all of them
+downloaded in parallel, returning the data of each read in order:
+
+    >>> from pydap.client import open_urls, gather
+    >>> datasets = open_urls(
+    ...     ["http://test.pydap.org/coads.nc"] * 2)  #doctest: +SKIP
+    >>> times = gather([(dataset.TIME, slice(0, 1))
+    ...                 for dataset in datasets])  #doctest: +SKIP
+
+Datasets split in several files, eg, one per month, can be opened as a single
+dataset, concatenating their variables along a dimension:
+
+    >>> from pydap.client import open_mfurl
+    >>> dataset = open_mfurl(
+    ...     ["http://example.com/%02d.nc" % month for month in range(1, 13)],
+    ...     concat_dim='TIME')  #doctest: +SKIP
+
 If the dods response has already been downloaded, it is possible to open it as
 if it were a remote dataset. Optionally, it is also possible to specify a das
 response:
@@ -32,6 +49,9 @@ response:
     >>> dataset = open_file(
     ...     "/path/to/file.dods", "/path/to/file.das")  #doctest: +SKIP
 
+The file is memory mapped, so arrays of numbers are read only, big endian
+views of it; copy them with `numpy.array` to modify them.
+
 Remote datasets opened with `open_url` can call server functions. Pydap has a
 lazy mechanism for function call, supporting any function. Eg, to call the
 `geogrid` function on the server:
@@ -44,27 +64,65 @@ lazy mechanism for function call, supporting any function. Eg, to call the
 
 """
 
-from io import open, BytesIO
+import copy
+import mmap
+from io import open
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+import numpy as np
 from six.moves.urllib.parse import urlsplit, urlunsplit
 
-from .model import DapType
-from .lib import encode, DEFAULT_TIMEOUT
+from .model import DapType, BaseType, GridType
+from .lib import (
+    encode, combine_slices, fix_slice, walk, BytesReader, DEFAULT_TIMEOUT)
 from .net import GET, raise_for_status
-from .handlers.dap import DAPHandler, unpack_data, StreamReader
-from .parsers.dds import build_dataset
+from .handlers.dap import (
+    DAPHandler, BaseProxy, AggregatedProxy, unpack_data, map_children,
+    fetch_batch, fetch_projections, safe_dds_and_data, safe_charset_text,
+    CHUNK_BYTES)
+from .parsers.dds import build_dataset, DummyData
 from .parsers.das import parse_das, add_attributes
 
+# number of datasets opened, or requests made, at the same time by default
+MAX_CONCURRENCY = 16
+
 
 def open_url(url, application=None, session=None, output_grid=True,
-             timeout=DEFAULT_TIMEOUT):
+             timeout=DEFAULT_TIMEOUT, max_workers=None,
+             chunk_bytes=CHUNK_BYTES, cache=None, metadata_cache=None,
+             lazy_attributes=False, ddx=False, planner=None):
     """
     Open a remote URL, returning a dataset.
 
     set output_grid to False to retrieve only main arrays and
     never retrieve coordinate axes.
+
+    set max_workers to download requests larger than chunk_bytes
+    in parallel, using up to max_workers concurrent requests.
+
+    set cache to a ``pydap.cache.TileCache`` to keep downloaded
+    data in memory, reusing it in overlapping requests.
+
+    set metadata_cache to a ``pydap.cache.MetadataCache`` to store
+    the DDS and DAS on disk, revalidating them on later opens.
+
+    set lazy_attributes to True to convert the values of the attributes
+    only when the attributes of a variable are first accessed.
+
+    set ddx to True to read the metadata from a single DDX response, for
+    servers that support it; otherwise the DDS and the DAS are downloaded
+    concurrently.
+
+    set planner to a ``pydap.planner.FetchPlanner`` to choose, from the
+    observed timings, whether strided reads are requested from the server
+    or downloaded as a contiguous range and decimated locally.
     """
     dataset = DAPHandler(url, application, session, output_grid,
-                         timeout).dataset
+                         timeout, max_workers, chunk_bytes, cache,
+                         metadata_cache, lazy_attributes, ddx,
+                         planner).dataset
 
     # attach server-side functions
     dataset.functions = Functions(url, application, session)
@@ -72,32 +130,178 @@ def open_url(url, application=None, session=None, output_grid=True,
     return dataset
 
 
+def open_urls(urls, max_concurrency=MAX_CONCURRENCY, **kwargs):
+    """Open several remote URLs concurrently, returning a list of datasets.
+
+    The datasets are opened by up to `max_concurrency` threads, sharing the
+    pooled connections of the session. Other keyword arguments are passed to
+    ``open_url``.
+
+    """
+    def open_one(url):
+        return open_url(url, **kwargs)
+
+    with ThreadPoolExecutor(max_concurrency) as executor:
+        return list(executor.map(open_one, urls))
+
+
+def open_mfurl(urls, concat_dim, max_concurrency=MAX_CONCURRENCY, **kwargs):
+    """Open several remote URLs as a single dataset.
+
+    The URLs should have the same variables, which are concatenated along
+    the dimension `concat_dim`, like files with consecutive time steps. The
+    dataset has the metadata from the first URL. Variables with the
+    dimension `concat_dim` read the data from all URLs, downloading the part
+    from each URL concurrently into a single array; other variables are read
+    from the first URL.
+
+    The URLs are opened with ``open_urls``, and other keyword arguments are
+    passed to ``open_url``.
+
+    """
+    datasets = open_urls(urls, max_concurrency, **kwargs)
+
+    # the variables of the first dataset are kept for reading its part
+    dataset = copy.copy(datasets[0])
+    dataset.functions = datasets[0].functions
+    for var in walk(dataset, GridType):
+        var.set_output_grid(kwargs.get('output_grid', True))
+
+    # the position of each URL along the dimension is shared by all variables
+    offsets = None
+    for var in walk(dataset, BaseType):
+        if concat_dim not in var.dimensions:
+            continue
+        axis = list(var.dimensions).index(concat_dim)
+        sizes = [other[var.id].shape[axis] for other in datasets]
+        if offsets is None:
+            offsets = np.cumsum([0] + sizes).tolist()
+        elif np.diff(offsets).tolist() != sizes:
+            raise ValueError(
+                "Variable {0} has different lengths along {1} than the "
+                "other variables".format(var.id, concat_dim))
+
+        # the proxies are created only when the data is accessed
+        shape = var.shape[:axis] + (offsets[-1],) + var.shape[axis+1:]
+        var.data = DummyData(var.dtype, shape)
+        var.defer_data(partial(
+            aggregate_data, datasets, axis, offsets, max_concurrency))
+
+    return dataset
+
+
+def aggregate_data(datasets, axis, offsets, max_workers, var):
+    """Return a proxy concatenating the data of `var` from all datasets."""
+    proxies = [dataset[var.id].data for dataset in datasets]
+    return AggregatedProxy(proxies, axis, offsets, max_workers=max_workers)
+
+
+def gather(reads, max_concurrency=MAX_CONCURRENCY):
+    """Return the data for several ``(variable, index)`` reads.
+
+    The variables can be from different datasets. Reads of different
+    variables from the same dataset are combined in a single request, like in
+    ``fetch``, and the requests are made by up to `max_concurrency` threads.
+    Returns a list with the data of each read, in order.
+
+    """
+    reads = list(reads)
+    result = [None] * len(reads)
+
+    # group the remote reads in batches, reading each variable once per batch
+    batches = OrderedDict()
+    for i, (var, index) in enumerate(reads):
+        if isinstance(var, GridType):
+            var = var.array
+        proxy = var.data
+        if not isinstance(proxy, BaseProxy):
+            result[i] = proxy[index]
+            continue
+
+        index = combine_slices(proxy.slice, fix_slice(index, proxy.shape))
+        for batch in batches.setdefault(proxy.baseurl, []):
+            if proxy.id not in batch:
+                break
+        else:
+            batch = OrderedDict()
+            batches[proxy.baseurl].append(batch)
+        batch[proxy.id] = (i, proxy, index)
+
+    def fetch_one(batch):
+        positions, proxies, indexes = zip(*batch.values())
+        data = fetch_projections(list(proxies), list(indexes))
+        for i, values in zip(positions, data):
+            result[i] = values
+
+    with ThreadPoolExecutor(max_concurrency) as executor:
+        futures = [executor.submit(fetch_one, url_batch)
+                   for url_batches in batches.values()
+                   for url_batch in url_batches]
+        for future in futures:
+            future.result()
+    return result
+
+
+def fetch(dataset, names, index=Ellipsis, out=None):
+    """Return the data for `index` of several variables from a dataset.
+
+    The variables from a remote dataset are downloaded in a single request,
+    returning a list with the data of each variable. For grids the data of
+    the array is returned.
+
+    `out` can be a list with an existing array for each variable, or
+    ``None``, where the data is decoded directly; see
+    ``BaseProxy.read_into``.
+
+    """
+    variables = [dataset[name] for name in names]
+    variables = [var.array if isinstance(var, GridType) else var
+                 for var in variables]
+    out = out or [None] * len(variables)
+
+    remote = [(var.data, array) for var, array in zip(variables, out)
+              if isinstance(var.data, BaseProxy)]
+    data = iter(fetch_batch([proxy for proxy, array in remote], index,
+                            [array for proxy, array in remote]))
+
+    result = []
+    for var, array in zip(variables, out):
+        if isinstance(var.data, BaseProxy):
+            result.append(next(data))
+        elif array is not None:
+            array[...] = var.data[index]
+            result.append(array)
+        else:
+            result.append(var.data[index])
+    return result
+
+
 def open_file(dods, das=None):
     """Open a file downloaded from a `.dods` response, returning a dataset.
 
     Optionally, read also the `.das` response to assign attributes to the
     dataset.
 
+    The file is memory mapped, and arrays of numbers are returned as read
+    only views of it: their data is read from disk only when accessed. They
+    keep the big endian byte order of the file, and can't be modified in
+    place; use ``np.array(var.data)`` to get a writable copy in memory.
+
     """
-    dds = ''
+    with open(dods, "rb") as f:
+        buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
     # This file contains both ascii _and_ binary data
-    # Let's handle them separately in sequence
-    # Without ignoring errors, the IO library will
-    # actually read past the ascii part of the
-    # file (despite our break from iteration) and
-    # will error out on the binary data
-    with open(dods, "rt", buffering=1, encoding='ascii',
-              newline='\n', errors='ignore') as f:
-        for line in f:
-            if line.strip() == 'Data:':
-                break
-            dds += line
+    pos = buffer.find(b'\nData:\n')
+    if pos == -1:
+        raise ValueError(
+            "Could not find data segment in {0}".format(dods))
+    dds = buffer[:pos + 1].decode('ascii', 'ignore')
     dataset = build_dataset(dds)
-    pos = len(dds) + len('Data:\n')
 
-    with open(dods, "rb") as f:
-        f.seek(pos)
-        dataset.data = unpack_data(f, dataset)
+    stream = BytesReader(buffer)
+    stream.skip(pos + len(b'\nData:\n'))
+    dataset.data = map_children(stream, dataset)
 
     if das is not None:
         with open(das) as f:
@@ -112,10 +316,9 @@ def open_dods(url, metadata=False, application=None, session=None,
     r = GET(url, application, session, timeout=timeout)
     raise_for_status(r)
 
-    dds, data = r.body.split(b'\nData:\n', 1)
-    dds = dds.decode(r.content_encoding or 'ascii')
+    dds, data = safe_dds_and_data(r)
     dataset = build_dataset(dds)
-    stream = StreamReader(BytesIO(data))
+    stream = BytesReader(data)
     dataset.data = unpack_data(stream, dataset)
 
     if metadata:
@@ -124,7 +327,7 @@ def open_dods(url, metadata=False, application=None, session=None,
             (scheme, netloc, path[:-4] + 'das', query, fragment))
         r = GET(dasurl, application, session, timeout=timeout)
         raise_for_status(r)
-        das = r.text
+        das = safe_charset_text(r)
         add_attributes(dataset, parse_das(das))
 
     return dataset
@@ -7,31 +7,42 @@ dataset to the internal model.
 """
 
 import io
-import gzip
+import time
+import bisect
+import zlib
+import struct
 import sys
 import pprint
 import copy
+import operator
 import re
 from itertools import chain
+from functools import partial, reduce
+from concurrent.futures import ThreadPoolExecutor
+from xml.etree.ElementTree import ParseError
 
 # handlers should be set by the application
 # http://docs.python.org/2/howto/logging.html#configuring-logging-for-a-library
 import logging
 import numpy as np
 from six.moves.urllib.parse import urlsplit, urlunsplit, quote
-from six import text_type, string_types, BytesIO
+from six import text_type, string_types
+from webob.exc import HTTPError
 
 from pydap.model import (BaseType,
                          SequenceType, StructureType,
                          GridType)
 from ..net import GET, raise_for_status
 from ..lib import (
-    encode, combine_slices, fix_slice, hyperslab,
-    START_OF_SEQUENCE, walk, StreamReader, BytesReader,
+    encode, combine_slices, fix_slice, hyperslab, slice_shape, split_slice,
+    span_slice, is_fancy_index, fix_fancy_index, coalesce_indices,
+    START_OF_SEQUENCE, walk, StreamReader, native_dtype, to_native,
     DEFAULT_TIMEOUT, DAP2_ARRAY_LENGTH_NUMPY_TYPE)
 from .lib import ConstraintExpression, BaseHandler, IterData
 from ..parsers.dds import build_dataset
 from ..parsers.das import parse_das, add_attributes
+from ..parsers.ddx import parse_ddx
+from ..planner import CONTIGUOUS, request_mode
 from ..parsers import parse_ce
 from ..responses.dods import DAP2_response_dtypemap
 logger = logging.getLogger('pydap')
@@ -40,47 +51,101 @@ logger.addHandler(logging.NullHandler())
 
 BLOCKSIZE = 512
 
+# number of sequence records decoded at once by ``unpack_sequence_batches``
+BATCH_ROWS = 8192
+
+# size in bytes of each request when downloading data in parallel
+CHUNK_BYTES = 2**26
+
+# maximum size in bytes of each piece of decompressed data
+DECOMPRESS_BYTES = 2**16
+
+# window bits for the decompression of each content encoding
+DECOMPRESSORS = {
+    'gzip': 16 + zlib.MAX_WBITS,
+    'x-gzip': 16 + zlib.MAX_WBITS,
+    'deflate': zlib.MAX_WBITS,
+}
+
+# maximum size in bytes of the blocks scanned when decoding strings
+STRING_BYTES = 2**20
+
+# number of distinct responses for which each proxy keeps a decode plan
+MAX_PLANS = 32
+
+# size in bytes of the blocks converted when decoding into an existing array
+CONVERT_BYTES = 2**20
+
+# maximum size in bytes of the unrequested data downloaded to join the
+# hyperslabs of a read with index arrays
+GAP_BYTES = 2**16
+
 
 class DAPHandler(BaseHandler):
 
     """Build a dataset from a DAP base URL."""
 
     def __init__(self, url, application=None, session=None, output_grid=True,
-                 timeout=DEFAULT_TIMEOUT):
-        # download DDS/DAS
+                 timeout=DEFAULT_TIMEOUT, max_workers=None,
+                 chunk_bytes=CHUNK_BYTES, cache=None, metadata_cache=None,
+                 lazy_attributes=False, ddx=False, planner=None):
+        self.application = application
+        self.session = session
+        self.output_grid = output_grid
+        self.timeout = timeout
+        self.max_workers = max_workers
+        self.chunk_bytes = chunk_bytes
+        self.cache = cache
+        self.lazy_attributes = lazy_attributes
+        self.planner = planner
+
         scheme, netloc, path, query, fragment = urlsplit(url)
 
+        # download the DDX, if the server supports it
+        if ddx:
+            ddxurl = urlunsplit(
+                (scheme, netloc, path + '.ddx', query, fragment))
+            try:
+                text = get_metadata(ddxurl, application, session, timeout,
+                                    metadata_cache)
+                self.dataset = self.build_ddx(url, text)
+                return
+            except (HTTPError, ParseError):
+                # not supported, or answered with an error page
+                pass
+
+        # download DDS/DAS concurrently
         ddsurl = urlunsplit((scheme, netloc, path + '.dds', query, fragment))
-        r = GET(ddsurl, application, session, timeout=timeout)
-        raise_for_status(r)
-        dds = safe_charset_text(r)
-
         dasurl = urlunsplit((scheme, netloc, path + '.das', query, fragment))
-        r = GET(dasurl, application, session, timeout=timeout)
-        raise_for_status(r)
-        das = safe_charset_text(r)
+        dds, das = get_metadata_concurrently(
+            [ddsurl, dasurl], application, session, timeout, metadata_cache)
+
+        self.dataset = self.build(url, dds, das)
+
+    def build(self, url, dds, das):
+        """Build the dataset from the DDS and DAS, adding data proxies."""
+        dataset = build_dataset(dds)
+        add_attributes(dataset, parse_das(das, self.lazy_attributes))
+        return self.add_proxies(url, dataset)
 
-        # build the dataset from the DDS and add attributes from the DAS
-        self.dataset = build_dataset(dds)
-        add_attributes(self.dataset, parse_das(das))
+    def build_ddx(self, url, ddx):
+        """Build the dataset from the DDX, adding data proxies."""
+        dataset = parse_ddx(ddx, self.lazy_attributes)
+        return self.add_proxies(url, dataset)
 
+    def add_proxies(self, url, dataset):
+        """Add data proxies to the dataset, applying the projection."""
         # remove any projection from the url, leaving selections
+        scheme, netloc, path, query, fragment = urlsplit(url)
         projection, selection = parse_ce(query)
         url = urlunsplit((scheme, netloc, path, '&'.join(selection), fragment))
 
-        # now add data proxies
-        for var in walk(self.dataset, BaseType):
-            var.data = BaseProxy(url, var.id, var.dtype, var.shape,
-                                 application=application,
-                                 session=session)
-        for var in walk(self.dataset, SequenceType):
-            template = copy.copy(var)
-            var.data = SequenceProxy(url, template, application=application,
-                                     session=session)
+        # now add data proxies, created when the data is first accessed
+        self.defer_proxies(url, dataset, partial(self.base_data, url), {})
 
         # apply projections
         for var in projection:
-            target = self.dataset
+            target = dataset
             while var:
                 token, index = var.pop(0)
                 target = target[token]
@@ -94,9 +159,116 @@ class DAPHandler(BaseHandler):
                 elif isinstance(target, SequenceType):
                     target.data.slice = index
 
-        # retrieve only main variable for grid types:
-        for var in walk(self.dataset, GridType):
-            var.set_output_grid(output_grid)
+        return dataset
+
+    def defer_proxies(self, url, var, factory, maps):
+        """Defer the creation of the proxies of `var` and its children.
+
+        Base types use `factory`, which is shared by all the variables outside
+        sequences and grids, so that no objects are allocated per variable.
+
+        """
+        if isinstance(var, GridType):
+            # retrieve only main variable for grid types
+            var.set_output_grid(self.output_grid)
+            if self.output_grid:
+                factory = partial(self.grid_data, url, var, maps)
+        elif isinstance(var, SequenceType):
+            var.defer_data(partial(self.sequence_data, url))
+            factory = partial(sequence_child_data, var)
+        elif isinstance(var, BaseType):
+            var.defer_data(factory)
+        for child in var.children():
+            self.defer_proxies(url, child, factory, maps)
+
+    def base_data(self, url, var):
+        return self.base_proxy(url, var)
+
+    def grid_data(self, url, grid, maps, var):
+        # the proxies of the array and the maps are created together
+        self.grid_proxies(url, grid, maps)
+        return grid[var.name].data
+
+    def sequence_data(self, url, var):
+        return self.sequence_proxy(url, copy.copy(var))
+
+    def base_proxy(self, url, var, cls=None, **kwargs):
+        """Return the data proxy for a base type."""
+        cls = cls or BaseProxy
+        return cls(url, var.id, var.dtype, var.shape,
+                   application=self.application,
+                   session=self.session, timeout=self.timeout,
+                   max_workers=self.max_workers,
+                   chunk_bytes=self.chunk_bytes, cache=self.cache,
+                   planner=self.planner, **kwargs)
+
+    def grid_proxies(self, url, grid, maps):
+        """Add proxies that download a grid and its maps together.
+
+        The maps are stored in `maps`, shared by all grids in the dataset.
+
+        """
+        proxies = []
+        for var in grid.maps.values():
+            var.data = self.base_proxy(url, var, MapProxy, maps=maps)
+            proxies.append(var.data)
+        grid.array.data = self.base_proxy(
+            url, grid.array, GridArrayProxy, map_proxies=proxies)
+
+    def sequence_proxy(self, url, template):
+        """Return the data proxy for a sequence."""
+        return SequenceProxy(url, template, application=self.application,
+                             session=self.session, timeout=self.timeout)
+
+
+def sequence_child_data(sequence, var):
+    """Return the data of a variable inside a sequence."""
+    tokens = var.id[len(sequence.id)+1:].split('.')
+    return reduce(operator.getitem, [sequence.data] + tokens)
+
+
+def get_metadata(url, application=None, session=None,
+                 timeout=DEFAULT_TIMEOUT, metadata_cache=None):
+    """Return the text of a metadata response, like the DDS or the DAS.
+
+    If a ``pydap.cache.MetadataCache`` is given, fresh responses are read
+    from it, while stale ones are revalidated with a conditional request.
+
+    """
+    if metadata_cache is None:
+        r = GET(url, application, session, timeout=timeout)
+        raise_for_status(r)
+        return safe_charset_text(r)
+
+    entry = metadata_cache.get(url)
+    if entry is not None and metadata_cache.fresh(entry):
+        return entry['text']
+
+    headers = entry and metadata_cache.conditional_headers(entry)
+    r = GET(url, application, session, timeout=timeout, headers=headers)
+    if entry is not None and r.status_code == 304:
+        metadata_cache.set(url, entry['text'], r.headers, entry)
+        return entry['text']
+    raise_for_status(r)
+    text = safe_charset_text(r)
+    metadata_cache.set(url, text, r.headers)
+    return text
+
+
+def get_metadata_concurrently(urls, application=None, session=None,
+                              timeout=DEFAULT_TIMEOUT, metadata_cache=None):
+    """Return the text of several metadata responses, like ``get_metadata``.
+
+    The responses are downloaded concurrently, so that opening a dataset
+    costs a single round trip.
+
+    """
+    def get(url):
+        return get_metadata(url, application, session, timeout,
+                            metadata_cache)
+
+    with ThreadPoolExecutor(len(urls)) as executor:
+        return list(executor.map(get, urls))
 
 
 def get_charset(r):
@@ -107,23 +279,94 @@ def get_charset(r):
 
 
 def safe_charset_text(r):
-    if r.content_encoding == 'gzip':
-        return (gzip.GzipFile(fileobj=BytesIO(r.body)).read()
-                .decode(get_charset(r)))
+    if r.content_encoding in DECOMPRESSORS:
+        return b''.join(iter_body(r)).decode(get_charset(r))
     else:
         r.charset = get_charset(r)
         return r.text
 
 
 def safe_dds_and_data(r):
-    if r.content_encoding == 'gzip':
-        raw = gzip.GzipFile(fileobj=BytesIO(r.body)).read()
+    if r.content_encoding in DECOMPRESSORS:
+        raw = b''.join(iter_body(r))
     else:
         raw = r.body
     dds, data = raw.split(b'\nData:\n', 1)
     return dds.decode(get_charset(r)), data
 
 
+def iter_body(r):
+    """Iterate over the chunks of the body of a response, decompressed.
+
+    Compressed responses are decompressed incrementally as the chunks
+    arrive, in pieces of at most ``BLOCKSIZE`` bytes, so that neither the
+    compressed nor the decompressed body is held in memory.
+
+    """
+    if r.content_encoding not in DECOMPRESSORS:
+        return iter(r.app_iter)
+    return decompress_chunks(r.app_iter, DECOMPRESSORS[r.content_encoding])
+
+
+def decompress_chunks(chunks, wbits):
+    """Decompress an iterator of zlib, gzip or deflate data chunks.
+
+    A deflate stream is tried first with a zlib header, falling back to raw
+    deflate, since both are used by servers. Concatenated gzip members are
+    also decompressed.
+
+    """
+    decompressor = zlib.decompressobj(wbits)
+    # the input read until the zlib header is checked, to retry it as raw
+    head = b'' if wbits == zlib.MAX_WBITS else None
+    for chunk in chunks:
+        while chunk:
+            try:
+                data = decompressor.decompress(chunk, DECOMPRESS_BYTES)
+            except zlib.error:
+                if head is None:
+                    raise
+                wbits = -zlib.MAX_WBITS
+                decompressor = zlib.decompressobj(wbits)
+                chunk, head = head + chunk, None
+                continue
+            if head is not None:
+                # the chunk is consumed completely when there's no output
+                head = (None if data or len(head) + len(chunk) >= 2
+                        else head + chunk)
+            if data:
+                yield data
+            chunk = decompressor.unconsumed_tail
+            if not chunk and decompressor.unused_data:
+                # start of another gzip member
+                chunk = decompressor.unused_data
+                decompressor = zlib.decompressobj(wbits)
+    data = decompressor.flush()
+    if data:
+        yield data
+
+
+def safe_dds_and_data_stream(r):
+    """Return the DDS and a stream positioned at the start of the XDR data.
+
+    Unlike ``safe_dds_and_data``, the body of the response is not loaded in
+    memory: the DDS is read from the first chunks of the response and the
+    data is then read incrementally through a ``StreamReader``, being
+    decompressed as it arrives.
+
+    """
+    chunks = iter_body(r)
+    dds, last_chunk = split_pattern_in_string_iter(b'\nData:\n', chunks)
+    if last_chunk is None:
+        raise ValueError("Could not find data segment in response")
+
+    def stream_start():
+        yield last_chunk
+
+    stream = StreamReader(chain(stream_start(), chunks))
+    return dds.decode(get_charset(r)), stream
+
+
 class BaseProxy(object):
 
     """A proxy for remote base types.
@@ -131,10 +374,32 @@ class BaseProxy(object):
     This class behaves like a Numpy array, proxying the data from a base type
     on a remote dataset.
 
+    If `max_workers` is larger than one, requests for more than `chunk_bytes`
+    are split along their slowest varying axis into several smaller requests,
+    which are downloaded concurrently into a single output array.
+
+    If a `cache` is given (eg, a ``pydap.cache.TileCache``) data is read
+    from it, and only the missing pieces are downloaded. String arrays are
+    not cached, since their tiles can have different widths.
+
+    If a `planner` is given (eg, a ``pydap.planner.FetchPlanner``) it
+    decides whether strided reads are requested from the server, or the
+    contiguous range is downloaded and decimated locally; the duration of
+    each request is recorded in it.
+
+    Responses are decoded with a plan built from their DDS, which is reused
+    for later responses with the same DDS; repeated requests of the same
+    shape are decoded without parsing the DDS again.
+
+    Integer arrays and boolean masks can be used as indexes, like in Numpy;
+    only a few hyperslabs containing the selected elements are downloaded.
+
     """
 
     def __init__(self, baseurl, id, dtype, shape, slice_=None,
-                 application=None, session=None, timeout=DEFAULT_TIMEOUT):
+                 application=None, session=None, timeout=DEFAULT_TIMEOUT,
+                 max_workers=None, chunk_bytes=CHUNK_BYTES, cache=None,
+                 planner=None):
         self.baseurl = baseurl
         self.id = id
         self.dtype = dtype
@@ -143,6 +408,11 @@ class BaseProxy(object):
         self.application = application
         self.session = session
         self.timeout = timeout
+        self.max_workers = max_workers
+        self.chunk_bytes = chunk_bytes
+        self.cache = cache
+        self.planner = planner
+        self.plans = {}
 
     def __repr__(self):
         return 'BaseProxy(%s)' % ', '.join(
@@ -150,24 +420,510 @@ class BaseProxy(object):
                 self.baseurl, self.id, self.dtype, self.shape, self.slice]))
 
     def __getitem__(self, index):
-        # build download url
+        if is_fancy_index(index):
+            return self._getitem_fancy(index)
         index = combine_slices(self.slice, fix_slice(index, self.shape))
-        scheme, netloc, path, query, fragment = urlsplit(self.baseurl)
-        url = urlunsplit((
-            scheme, netloc, path + '.dods',
-            quote(self.id) + hyperslab(index) + '&' + query,
-            fragment)).rstrip('&')
+        return self._read(index)
+
+    def _read(self, index):
+        if self.cache is not None and self.dtype.char not in 'SU':
+            return self.cache.get((self.baseurl, self.id), index, self.shape,
+                                  self.dtype, self._download)
+        return self._download(index)
+
+    def _getitem_fancy(self, index):
+        """Read the elements selected by integer arrays or boolean masks.
+
+        The arrays are broadcast against each other like in Numpy, while
+        integers keep their axis like in other reads. The selected points
+        are grouped by their coordinates along all but the last indexed
+        axis, and their indexes along the last one are joined in strided or
+        contiguous hyperslabs, downloading up to ``GAP_BYTES`` of unrequested
+        data between points to save requests. The hyperslabs are downloaded
+        concurrently and scattered into the result.
+
+        """
+        view = fix_slice(self.slice, self.shape)
+        index = fix_fancy_index(index, slice_shape(view))
+        axes = [i for i, s in enumerate(index) if isinstance(s, np.ndarray)]
+        arrays = np.broadcast_arrays(*[index[i] for i in axes])
+        points = np.stack([a.ravel() for a in arrays], axis=1)
+        if len(points):
+            points, inverse = np.unique(points, axis=0, return_inverse=True)
+        else:
+            # older versions of Numpy can't find the unique rows of nothing
+            inverse = np.zeros(0, np.intp)
+
+        # the selected points are collected along the first indexed axis
+        first, last = axes[0], axes[-1]
+        shape = list(slice_shape(
+            [s for i, s in enumerate(index) if i not in axes]))
+        item_bytes = self.dtype.itemsize * int(np.prod(shape))
+        max_gap = GAP_BYTES // max(1, item_bytes)
+        shape.insert(first, len(points))
+
+        requests = []
+        if not all(shape):
+            points = points[:0]
+        groups = np.nonzero(
+            (points[1:, :-1] != points[:-1, :-1]).any(axis=1))[0] + 1
+        for group in np.split(np.arange(len(points)), groups):
+            if not group.size:
+                continue
+            indexes = points[group, -1]
+            for run in coalesce_indices(indexes, max_gap):
+                i = np.searchsorted(indexes, run.start)
+                j = np.searchsorted(indexes, run.stop)
+                request = list(index)
+                for axis, c in zip(axes[:-1], points[group[0], :-1]):
+                    request[axis] = slice(c, c + 1, 1)
+                request[last] = run
+                requests.append((
+                    tuple(slice(v.start + r.start * v.step,
+                                v.start + (r.stop - 1) * v.step + 1,
+                                v.step * r.step)
+                          for v, r in zip(view, request)),
+                    (indexes[i:j] - run.start) // run.step,
+                    slice(group[i], group[i] + j - i)))
+
+        def fetch(request, offsets):
+            data = np.take(self._read(request), offsets, axis=last)
+            data = data.reshape([
+                n for i, n in enumerate(data.shape)
+                if i not in axes[:-1]])
+            return np.moveaxis(data, last - len(axes) + 1, first)
+
+        if len(requests) > 1:
+            with ThreadPoolExecutor(self.max_workers) as executor:
+                blocks = list(executor.map(
+                    lambda r: fetch(*r[:2]), requests))
+        else:
+            blocks = [fetch(*r[:2]) for r in requests]
+
+        # scatter the points into the output, and select them like Numpy
+        dtype = np.result_type(*[block.dtype for block in blocks]) \
+            if blocks else native_dtype(self.dtype)
+        out = np.empty(shape, dtype)
+        for (request, offsets, region), block in zip(requests, blocks):
+            out[(slice(None),) * first + (region,)] = block
+        out = out[(slice(None),) * first + (inverse.reshape(arrays[0].shape),)]
+        if axes != list(range(first, first + len(axes))):
+            # separate indexed axes are moved to the front, like in Numpy
+            ndim = arrays[0].ndim
+            out = np.moveaxis(
+                out, list(range(first, first + ndim)), list(range(ndim)))
+        return out
+
+    def read_into(self, out, index=Ellipsis):
+        """Download the data for `index` directly into the array `out`.
+
+        `out` can be any writable array with the shape of the requested data,
+        like a memory map or an array in shared memory. The data is decoded
+        into it without allocating a temporary array of the same size.
+        Returns `out`.
+
+        """
+        index = combine_slices(self.slice, fix_slice(index, self.shape))
+        if out.shape != slice_shape(index):
+            raise ValueError(
+                "Output array has shape {0}, expected {1}".format(
+                    out.shape, slice_shape(index)))
+        if self.cache is not None and self.dtype.char not in 'SU':
+            self.cache.get((self.baseurl, self.id), index, self.shape,
+                           self.dtype, self._download, out)
+        else:
+            self._download(index, out)
+        return out
+
+    def _download(self, index, out=None):
+        if self._decimate(index):
+            return self._download_decimated(index, out)
+        return self._download_parts(index, out)
+
+    def _download_decimated(self, index, out=None):
+        """Download the contiguous range of a strided read, and decimate it.
+
+        The range is downloaded in parts of up to `chunk_bytes`, each one
+        decimated into its region of the output, so that only a part is
+        held in memory besides the output array.
+
+        """
+        if out is None:
+            out = np.empty(slice_shape(index), native_dtype(self.dtype))
+        span, _ = span_slice(index)
+        size = int(np.prod(slice_shape(span))) * self.dtype.itemsize
+        parts = split_slice(index, -(-size // self.chunk_bytes))
+
+        def fetch_part(part, region):
+            span, decimation = span_slice(part)
+            out[region] = self._fetch(span)[decimation]
+
+        if self.max_workers and self.max_workers > 1 and len(parts) > 1:
+            with ThreadPoolExecutor(self.max_workers) as executor:
+                futures = [executor.submit(fetch_part, part, region)
+                           for part, region in parts]
+                for future in futures:
+                    future.result()
+        else:
+            for part, region in parts:
+                fetch_part(part, region)
+        return out
+
+    def _decimate(self, index):
+        """Return true if a strided read is downloaded as a contiguous range.
+
+        The choice is made by the planner, if there is one. Empty reads
+        are always requested as they are.
+
+        """
+        if (self.planner is None or self.dtype.char in 'SU' or
+                0 in slice_shape(index) or
+                request_mode(index) == CONTIGUOUS):
+            return False
+        span, decimation = span_slice(index)
+        itemsize = self.dtype.itemsize
+        return self.planner.choose(
+            self.baseurl, int(np.prod(slice_shape(index))) * itemsize,
+            int(np.prod(slice_shape(span))) * itemsize) == CONTIGUOUS
+
+    def _download_parts(self, index, out=None):
+        parts = None
+        if self.max_workers and self.max_workers > 1:
+            parts = self._parts(index)
+        if not parts:
+            return self._fetch(index, out)
+
+        # download the parts concurrently, directly into the output array
+        if out is None:
+            out = np.empty(slice_shape(index), native_dtype(self.dtype))
+
+        def fetch_part(part, region):
+            self._fetch(part, out[region])
+
+        with ThreadPoolExecutor(self.max_workers) as executor:
+            futures = [executor.submit(fetch_part, part, region)
+                       for part, region in parts]
+            for future in futures:
+                future.result()
+        return out
+
+    def _parts(self, index):
+        """Return the parts for a parallel download, if it's worth it."""
+        if self.dtype.char in 'SU':
+            return None
+        size = int(np.prod(slice_shape(index))) * self.dtype.itemsize
+        n = -(-size // self.chunk_bytes)
+        if n > 1:
+            return split_slice(index, n)
 
+    def _fetch(self, index, out=None):
         # download and unpack data
+        url = self._data_url(index)
         logger.info("Fetching URL: %s" % url)
+        start = time.time()
         r = GET(url, self.application, self.session, timeout=self.timeout)
         raise_for_status(r)
-        dds, data = safe_dds_and_data(r)
+        dds, stream = safe_dds_and_data_stream(r)
+        data = self._unpack(dds, stream, out)
+        if self.planner is not None and self.dtype.char not in 'SU':
+            nbytes = int(np.prod(slice_shape(index))) * self.dtype.itemsize
+            self.planner.record(self.baseurl, request_mode(index), nbytes,
+                                time.time() - start)
+        return data
+
+    def _data_url(self, index):
+        """Return the URL of the dods response for a normalized index."""
+        scheme, netloc, path, query, fragment = urlsplit(self.baseurl)
+        return urlunsplit((
+            scheme, netloc, path + '.dods',
+            quote(self.id) + hyperslab(index) + '&' + query,
+            fragment)).rstrip('&')
+
+    def _unpack(self, dds, stream, out=None):
+        """Decode the received data, returning the data of the variable.
+
+        If `out` is given the data is decoded into it.
+
+        """
+        plan = self.plans.get(dds)
+        if plan is None:
+            if len(self.plans) >= MAX_PLANS:
+                self.plans.clear()
+            plan = self.plans[dds] = decode_plan(dds, self.id)
+        return plan(stream, out)
+
+    def __len__(self):
+        return self.shape[0]
 
-        # Parse received dataset:
+    def __iter__(self):
+        return iter(self[:])
+
+    # Comparisons return a boolean array
+    def __eq__(self, other):
+        return self[:] == other
+
+    def __ne__(self, other):
+        return self[:] != other
+
+    def __ge__(self, other):
+        return self[:] >= other
+
+    def __le__(self, other):
+        return self[:] <= other
+
+    def __gt__(self, other):
+        return self[:] > other
+
+    def __lt__(self, other):
+        return self[:] < other
+
+
+def decode_plan(dds, id):
+    """Return a function decoding the data of the variable `id`.
+
+    When the response holds only the requested variable, possibly inside
+    structures, its data is decoded directly using the type and shape from
+    the DDS; otherwise the whole dataset is parsed and decoded.
+
+    The function is called with the stream and an optional output array.
+
+    """
+    dataset = build_dataset(dds)
+    leaves = list(walk(dataset, BaseType))
+    if (len(leaves) == 1 and leaves[0].id == id and
+            not list(walk(dataset, SequenceType))):
+        var = leaves[0]
+
+        def plan(stream, out=None):
+            if out is not None:
+                return unpack_into(stream, var.dtype, var.shape, var.id, out)
+            return convert_stream_to_list(
+                stream, var.dtype, var.shape, var.id)[0]
+        return plan
+
+    def plan(stream, out=None):
         dataset = build_dataset(dds)
-        dataset.data = unpack_data(BytesReader(data), dataset)
-        return dataset[self.id].data
+        dataset.data = unpack_data(stream, dataset)
+        if out is not None:
+            out[...] = dataset[id].data
+            return out
+        return dataset[id].data
+    return plan
+
+
+def fetch_batch(proxies, index=Ellipsis, out=None):
+    """Download the data from several proxies in a single request.
+
+    The proxies should belong to the same dataset. Their projections are
+    combined in a single ``.dods`` request, which is decoded in one pass,
+    returning a list with the data of each proxy for `index`.
+
+    `out` can be a list with an array for each proxy, or ``None``, where the
+    data should be decoded, like in ``BaseProxy.read_into``.
+
+    """
+    indexes = [combine_slices(proxy.slice, fix_slice(index, proxy.shape))
+               for proxy in proxies]
+    for array, index in zip(out or [], indexes):
+        if array is not None and array.shape != slice_shape(index):
+            raise ValueError(
+                "Output array has shape {0}, expected {1}".format(
+                    array.shape, slice_shape(index)))
+    return fetch_projections(proxies, indexes, out)
+
+
+def fetch_projections(proxies, indexes, out=None):
+    """Download the data from several proxies for normalized `indexes`."""
+    if not proxies:
+        return []
+    first = proxies[0]
+    ids = [proxy.id for proxy in proxies]
+    if len(set(ids)) < len(ids):
+        raise ValueError("Each variable can be fetched only once in a batch")
+    if any(proxy.baseurl != first.baseurl for proxy in proxies):
+        raise ValueError("All variables in a batch must be from the same "
+                         "dataset")
+
+    projection = ','.join(
+        quote(proxy.id) + hyperslab(index)
+        for proxy, index in zip(proxies, indexes))
+    scheme, netloc, path, query, fragment = urlsplit(first.baseurl)
+    url = urlunsplit((
+        scheme, netloc, path + '.dods', projection + '&' + query,
+        fragment)).rstrip('&')
+
+    # download and unpack data
+    logger.info("Fetching URL: %s" % url)
+    r = GET(url, first.application, first.session, timeout=first.timeout)
+    raise_for_status(r)
+    dds, stream = safe_dds_and_data_stream(r)
+    dataset = build_dataset(dds)
+    if out is None:
+        dataset.data = unpack_data(stream, dataset)
+        return [dataset[id].data for id in ids]
+
+    # the response has only base types, possibly inside structures
+    targets = dict(zip(ids, out))
+    data = {}
+    for var in walk(dataset, BaseType):
+        if targets.get(var.id) is not None:
+            data[var.id] = unpack_into(
+                stream, var.dtype, var.shape, var.id, targets[var.id])
+        else:
+            data[var.id] = convert_stream_to_list(
+                stream, var.dtype, var.shape, var.id)[0]
+    return [data[id] for id in ids]
+
+
+class GridArrayProxy(BaseProxy):
+
+    """A proxy for the array of a grid.
+
+    The first request also downloads the complete maps of the grid, storing
+    them in their ``MapProxy`` objects, so that slicing the grid needs a
+    single request.
+
+    """
+
+    def __init__(self, *args, **kwargs):
+        self.map_proxies = kwargs.pop('map_proxies', [])
+        super(GridArrayProxy, self).__init__(*args, **kwargs)
+
+    def _fetch(self, index, out=None):
+        missing = [proxy for proxy in self.map_proxies
+                   if proxy.id not in proxy.maps]
+        if not missing:
+            return super(GridArrayProxy, self)._fetch(index, out)
+
+        data = fetch_projections([self] + missing, [index] + [
+            tuple(slice(0, n, 1) for n in proxy.shape) for proxy in missing],
+            None if out is None else [out] + [None] * len(missing))
+        for proxy, map_ in zip(missing, data[1:]):
+            proxy.maps[proxy.id] = map_
+        return data[0]
+
+
+class MapProxy(BaseProxy):
+
+    """A proxy for a map of a grid.
+
+    Maps are small, so they are downloaded completely and stored in `maps`,
+    a dictionary shared by the maps in a dataset; later requests are sliced
+    locally, including those with integer arrays or boolean masks.
+
+    """
+
+    def __init__(self, *args, **kwargs):
+        self.maps = kwargs.pop('maps', {})
+        super(MapProxy, self).__init__(*args, **kwargs)
+
+    def __getitem__(self, index):
+        if self.id not in self.maps:
+            self.maps[self.id] = self._fetch(
+                tuple(slice(0, n, 1) for n in self.shape))
+        data = self.maps[self.id]
+        if is_fancy_index(index):
+            data = data[fix_slice(self.slice, self.shape)]
+            return data[fix_fancy_index(index, data.shape)]
+        index = combine_slices(self.slice, fix_slice(index, self.shape))
+        # a copy, so that changes to the result don't affect later reads
+        return data[index].copy()
+
+
+class AggregatedProxy(object):
+
+    """A proxy concatenating the data of several proxies along an axis.
+
+    `offsets` holds the position of the first element of each proxy along
+    `axis`, followed by the total length. A request is split into a part for
+    each proxy it overlaps, and the parts are downloaded concurrently by up
+    to `max_workers` threads directly into a single output array.
+
+    """
+
+    def __init__(self, proxies, axis, offsets, slice_=None, max_workers=None):
+        self.proxies = proxies
+        self.axis = axis
+        self.offsets = offsets
+        self.max_workers = max_workers
+
+        first = proxies[0]
+        self.id = first.id
+        self.dtype = first.dtype
+        self.shape = (first.shape[:axis] + (offsets[-1],) +
+                      first.shape[axis+1:])
+        self.slice = slice_ or tuple(slice(None) for s in self.shape)
+
+    def __repr__(self):
+        return 'AggregatedProxy(%s)' % ', '.join(
+            map(repr, [self.id, self.dtype, self.shape, self.slice]))
+
+    def __getitem__(self, index):
+        index = combine_slices(self.slice, fix_slice(index, self.shape))
+        return self._download(index)
+
+    def read_into(self, out, index=Ellipsis):
+        """Download the data for `index` directly into the array `out`."""
+        index = combine_slices(self.slice, fix_slice(index, self.shape))
+        if out.shape != slice_shape(index):
+            raise ValueError(
+                "Output array has shape {0}, expected {1}".format(
+                    out.shape, slice_shape(index)))
+        return self._download(index, out)
+
+    def _parts(self, index):
+        """Return a ``(proxy, part, region)`` tuple for each overlapped proxy.
+
+        ``part`` is the slice of the data of the proxy, and ``region`` the
+        corresponding slice of the output.
+
+        """
+        s = index[self.axis]
+        out = []
+        first = bisect.bisect_right(self.offsets, s.start) - 1
+        for k in range(max(first, 0), len(self.proxies)):
+            begin, end = self.offsets[k], min(self.offsets[k+1], s.stop)
+            if begin >= s.stop:
+                break
+
+            # the elements selected by the slice inside this proxy
+            i = max(0, -(-(begin - s.start) // s.step))
+            j = max(i, -(-(end - s.start) // s.step))
+            if j > i:
+                start = s.start + i * s.step - begin
+                part = list(index)
+                part[self.axis] = slice(start, start + (j-i-1) * s.step + 1,
+                                        s.step)
+                region = [slice(None)] * len(index)
+                region[self.axis] = slice(i, j)
+                out.append((self.proxies[k], tuple(part), tuple(region)))
+        return out
+
+    def _download(self, index, out=None):
+        parts = self._parts(index)
+        if self.dtype.char in 'SU':
+            # the width of strings can differ between proxies
+            data = [proxy[part] for proxy, part, region in parts]
+            if data:
+                data = np.concatenate(data, self.axis)
+            else:
+                data = np.empty(slice_shape(index), self.dtype)
+            if out is None:
+                return data
+            out[...] = data
+            return out
+
+        if out is None:
+            out = np.empty(slice_shape(index), native_dtype(self.dtype))
+
+        def fetch_part(proxy, part, region):
+            proxy.read_into(out[region], part)
+
+        with ThreadPoolExecutor(self.max_workers) as executor:
+            futures = [executor.submit(fetch_part, *args) for args in parts]
+            for future in futures:
+                future.result()
+        return out
 
     def __len__(self):
         return self.shape[0]
@@ -233,7 +989,8 @@ class SequenceProxy(object):
     def __copy__(self):
         """Return a lightweight copy of the object."""
         return self.__class__(self.baseurl, self.template, self.selection[:],
-                              self.slice[:], self.application)
+                              self.slice[:], self.application, self.session,
+                              self.timeout)
 
     def __getitem__(self, key):
         """Return a new object representing a subset of the data."""
@@ -282,13 +1039,36 @@ class SequenceProxy(object):
         return id_
 
     def __iter__(self):
+        return unpack_sequence(self._stream(), self.template)
+
+    def iter_batches(self, batch_rows=BATCH_ROWS):
+        """Iterate over the data in batches of up to `batch_rows` records.
+
+        Each batch is a Numpy structured array with one field per child, or a
+        plain array when the proxy represents a single child of the sequence.
+
+        """
+        return unpack_sequence_batches(self._stream(), self.template,
+                                       batch_rows)
+
+    def to_array(self, batch_rows=BATCH_ROWS):
+        """Download the whole data, returning a single Numpy array."""
+        batches = list(self.iter_batches(batch_rows))
+        if batches:
+            return np.concatenate(batches)
+        else:
+            dtype = sequence_dtype(self.template)
+            if dtype is not None and not isinstance(self.template,
+                                                    SequenceType):
+                dtype = dtype[0]
+            return np.empty(0, dtype)
+
+    def _stream(self):
         # download and unpack data
         r = GET(self.url, self.application, self.session, timeout=self.timeout)
         raise_for_status(r)
 
-        i = r.app_iter
-        if not hasattr(i, '__next__'):
-            i = iter(i)
+        i = iter_body(r)
 
         # Fast forward past the DDS header
         # the pattern could span chunk boundaries though so make sure to check
@@ -304,9 +1084,7 @@ class SequenceProxy(object):
         def stream_start():
             yield last_chunk
 
-        stream = StreamReader(chain(stream_start(), i))
-
-        return unpack_sequence(stream, self.template)
+        return StreamReader(chain(stream_start(), i))
 
     def __eq__(self, other):
         return ConstraintExpression('%s=%s' % (self.id, encode(other)))
@@ -329,57 +1107,300 @@ class SequenceProxy(object):
 
 def unpack_sequence(stream, template):
     """Unpack data from a sequence, yielding records."""
-    # is this a sequence or a base type?
-    sequence = isinstance(template, SequenceType)
+    return sequence_plan(template).iter_records(stream)
 
-    # if there are no children, we use the template as the only column
+
+def sequence_plan(template):
+    """Return the decode plan for the records of a sequence.
+
+    The template can also be a child of a sequence, when only that child was
+    requested. Records with only base types are packed, without padding.
+
+    """
     cols = list(template.children()) or [template]
+    return RecordPlan(
+        template, packed=all(isinstance(c, BaseType) for c in cols))
 
-    # if there are no strings and no nested sequences we can unpack record by
-    # record easily
-    simple = all(isinstance(c, BaseType) and c.dtype.char not in "SU"
-                 for c in cols)
 
-    if simple:
-        dtype = np.dtype([("", c.dtype, c.shape) for c in cols])
-        marker = stream.read(4)
-        while marker == START_OF_SEQUENCE:
-            rec = np.fromstring(stream.read(dtype.itemsize), dtype=dtype)[0]
+def sequence_dtype(template):
+    """Return the dtype of a sequence record, if it has a fixed size.
+
+    Returns ``None`` when the sequence has strings or nested sequences.
+
+    """
+    return sequence_plan(template).dtype
+
+
+def unpack_sequence_batches(stream, template, batch_rows=BATCH_ROWS):
+    """Unpack data from a sequence, yielding arrays of records.
+
+    When all the columns have a fixed size the records are decoded directly
+    from the stream buffer, thousands at a time, by scanning the sequence
+    markers with Numpy. Otherwise records are decoded one at a time and
+    collected into arrays.
+
+    """
+    sequence = isinstance(template, SequenceType)
+    plan = sequence_plan(template)
+
+    if plan.dtype is None:
+        batch = []
+        for rec in plan.iter_records(stream):
+            batch.append(rec)
+            if len(batch) == batch_rows:
+                yield records_to_array(batch, template)
+                batch = []
+        if batch:
+            yield records_to_array(batch, template)
+        return
+
+    # each record is preceded by a START_OF_SEQUENCE marker
+    row = np.dtype([('marker', '>u4'), ('record', plan.wire)])
+    start = np.frombuffer(START_OF_SEQUENCE, '>u4')[0]
+    size = batch_rows * row.itemsize
+    while True:
+        # peeked views are copied, since Numpy on Python 2 can't read them
+        buf = stream.peek(size).tobytes()
+        rows = np.frombuffer(buf, row, len(buf) // row.itemsize)
+        end = np.flatnonzero(rows['marker'] != start)
+        count = end[0] if end.size else len(rows)
+
+        if count:
+            out = plan.convert(rows['record'][:count])
             if not sequence:
-                rec = rec[0]
-            yield rec
-            marker = stream.read(4)
-    else:
+                out = out[plan.dtype.names[0]]
+            stream.skip(count * row.itemsize)
+            yield out
+
+        # stop at the END_OF_SEQUENCE marker, or if the stream is exhausted
+        if end.size or len(buf) < size:
+            stream.skip(4)
+            return
+
+
+class RecordPlan(object):
+
+    """A compiled plan for decoding the records of a template.
+
+    The template is walked only once, when the plan is built. Runs of
+    consecutive fixed size fields, including the scalars of nested
+    structures, are merged into a single dtype and decoded with one call;
+    strings, arrays and nested sequences use the generic decoders.
+
+    If the whole record has a fixed size its dtype on the wire is stored in
+    ``wire``, and the dtype of the decoded records, in native byte order, in
+    ``dtype``; ``convert`` then decodes many records at once. Otherwise both
+    are ``None``.
+
+    `packed` should be true for the records of sequences with only base
+    types, where bytes are sent without padding.
+
+    """
+
+    def __init__(self, template, packed=False):
+        self.template = template
+        self.sequence = isinstance(template, SequenceType)
+        self.packed = packed
+        self.steps = []
+        self.count = 0
+        self.run = []
+        self.leaves = []
+        if isinstance(template, StructureType):
+            cols = list(template.children())
+        else:
+            cols = [template]
+        self.layout, dtype = self._compile(cols, ())
+        self._flush()
+
+        self.wire = self.dtype = self.record = None
+        if len(self.steps) == 1 and self.leaves:
+            self.wire, self.record = self.steps[0].dtypes
+            self.dtype = dtype
+
+    def _compile(self, cols, path):
+        """Add the steps for `cols`, returning their layout and dtype.
+
+        The layout has the position of the value of each column in the list
+        of decoded values, and a nested list for structures. The dtype is
+        ``None`` unless all the columns have a fixed size.
+
+        """
+        layout, fields = [], []
+        for col in cols:
+            if isinstance(col, SequenceType):
+                self._flush()
+                self.steps.append(SequenceStep(col))
+                fields = None
+            elif isinstance(col, StructureType):
+                sub, dtype = self._compile(
+                    list(col.children()), path + (col.name,))
+                layout.append(sub)
+                if fields is not None and dtype is not None:
+                    fields.append((col.name, dtype))
+                else:
+                    fields = None
+                continue
+            else:
+                wire = DAP2_response_dtypemap(col.dtype)
+                if wire.char == 'S' or (col.shape and not self.packed):
+                    self._flush()
+                    self.steps.append(ArrayStep(col))
+                    fields = None
+                else:
+                    if self.packed and wire.char == 'B':
+                        padding = 0
+                    else:
+                        padding = -wire.itemsize % 4
+                    self.run.append((wire, col.dtype, col.shape, padding))
+                    self.leaves.append(
+                        ('f%d' % self.count, path + (col.name,)))
+                    if fields is not None:
+                        fields.append(
+                            (col.name, native_dtype(col.dtype), col.shape))
+            layout.append(self.count)
+            self.count += 1
+
+        return layout, None if fields is None else np.dtype(fields)
+
+    def _flush(self):
+        """Merge the current run of fixed size fields into a single step."""
+        if self.run:
+            first = self.count - len(self.run)
+            self.steps.append(FixedStep(self.run, first))
+            self.run = []
+
+    def convert(self, data):
+        """Convert an array of records from ``wire`` to ``dtype``."""
+        out = np.empty(len(data), self.dtype)
+        for name, path in self.leaves:
+            target = out
+            for key in path[:-1]:
+                target = target[key]
+            target[path[-1]] = data[name]
+        return out
+
+    def iter_records(self, stream):
+        """Unpack the records of a sequence from `stream`."""
         marker = stream.read(4)
         while marker == START_OF_SEQUENCE:
-            rec = unpack_children(stream, template)
-            if not sequence:
-                rec = rec[0]
+            if self.packed and self.record is not None:
+                # one Numpy record, like the rows from ``convert``
+                rec = self.steps[0].decode(stream)[0]
             else:
-                rec = tuple(rec)
+                rec = tuple(self.unpack(stream))
+            if not self.sequence:
+                rec = rec[0]
             yield rec
             marker = stream.read(4)
 
+    def unpack(self, stream):
+        """Unpack a single record, returning the list of its values."""
+        values = []
+        for step in self.steps:
+            step(stream, values)
+        return build_record(self.layout, values)
 
-def unpack_children(stream, template):
-    """Unpack children from a structure, returning their data."""
-    cols = list(template.children()) or [template]
 
-    out = []
-    for col in cols:
-        # sequences and other structures
-        if isinstance(col, SequenceType):
-            out.append(IterData(list(unpack_sequence(stream, col)), col))
-        elif isinstance(col, StructureType):
-            out.append(tuple(unpack_children(stream, col)))
+class FixedStep(object):
+
+    """Decode a run of fixed size fields with a single read."""
+
+    def __init__(self, run, first):
+        names = ['f%d' % i for i in range(first, first + len(run))]
+        offsets, offset = [], 0
+        for wire, dtype, shape, padding in run:
+            offsets.append(offset)
+            offset += wire.itemsize * int(np.prod(shape)) + padding
+        wire = np.dtype({
+            'names': names,
+            'formats': [(wire, shape) for wire, _, shape, _ in run],
+            'offsets': offsets,
+            'itemsize': offset})
+        record = np.dtype({
+            'names': names,
+            'formats': [(native_dtype(dtype), shape)
+                        for _, dtype, shape, _ in run]})
+        self.dtypes = wire, record
+        self.size = offset
+
+    def decode(self, stream):
+        wire, record = self.dtypes
+        data = np.frombuffer(stream.read(self.size), wire)
+        if wire != record:
+            data = data.astype(record)
+        return data
+
+    def __call__(self, stream, values):
+        values.extend(self.decode(stream)[0])
+
+
+class ArrayStep(object):
+
+    """Decode a string or an array with the generic decoder."""
 
-        # unpack arrays
+    def __init__(self, var):
+        self.var = var
+
+    def __call__(self, stream, values):
+        var = self.var
+        values.extend(
+            convert_stream_to_list(stream, var.dtype, var.shape, var.id))
+
+
+class SequenceStep(object):
+
+    """Decode a nested sequence, with its own compiled plan."""
+
+    def __init__(self, var):
+        self.var = var
+        self.plan = sequence_plan(var)
+
+    def __call__(self, stream, values):
+        values.append(
+            IterData(list(self.plan.iter_records(stream)), self.var))
+
+
+def build_record(layout, values):
+    """Arrange decoded values following a layout, with tuples for structures.
+
+        >>> build_record([0, [1, 2], 3], ['a', 'b', 'c', 'd'])
+        ['a', ('b', 'c'), 'd']
+
+    """
+    return [values[item] if isinstance(item, int) else
+            tuple(build_record(item, values)) for item in layout]
+
+
+def records_to_array(records, template):
+    """Convert a list of records from ``unpack_sequence`` into an array."""
+    if not isinstance(template, SequenceType):
+        return np.array(records)
+
+    names = [col.name for col in template.children()]
+    cols = []
+    for name, col in zip(names, zip(*records)):
+        if all(isinstance(value, (np.generic, np.ndarray, text_type))
+               for value in col):
+            cols.append(np.array(col))
         else:
-            out.extend(convert_stream_to_list(stream, col.dtype, col.shape,
-                                              col.id))
+            # nested sequences and structures are kept as objects
+            values = np.empty(len(col), object)
+            for i, value in enumerate(col):
+                values[i] = value
+            cols.append(values)
+
+    out = np.empty(len(records), [(name, col.dtype, col.shape[1:])
+                                  for name, col in zip(names, cols)])
+    for name, col in zip(names, cols):
+        out[name] = col
     return out
 
 
+def unpack_children(stream, template):
+    """Unpack children from a structure, returning their data."""
+    return RecordPlan(template).unpack(stream)
+
+
 def convert_stream_to_list(stream, parser_dtype, shape, id):
     out = []
     response_dtype = DAP2_response_dtypemap(parser_dtype)
@@ -389,21 +1410,18 @@ def convert_stream_to_list(stream, parser_dtype, shape, id):
         if response_dtype.char in 'S':
             # Consider on 'S' and not 'SU' because
             # response_dtype.char should never be
-            data = []
-            for _ in range(n):
-                k = np.fromstring(stream.read(4),
-                                  DAP2_ARRAY_LENGTH_NUMPY_TYPE)[0]
-                data.append(stream.read(k))
-                stream.read(-k % 4)
-            out.append(np.array([text_type(x.decode('ascii'))
-                                 for x in data], 'S').reshape(shape))
+            out.append(unpack_strings(stream, n).reshape(shape))
         else:
             stream.read(4)  # read additional length
+            data = np.empty(n, response_dtype)
+            if readinto(stream, data) < count:
+                raise ValueError('variable {0} could not be read: unexpected '
+                                 'end of data'.format(quote(id)))
+            # return native arrays, swapping the bytes in place
+            data = to_native(data)
             try:
-                out.append(
-                    np.fromstring(
-                        stream.read(count), response_dtype)
-                    .astype(parser_dtype).reshape(shape))
+                out.append(data.astype(native_dtype(parser_dtype), copy=False)
+                           .reshape(shape))
             except ValueError as e:
                 if str(e) == 'total size of new array must be unchanged':
                     # server-side failure.
@@ -424,13 +1442,11 @@ def convert_stream_to_list(stream, parser_dtype, shape, id):
         # Consider on 'S' and not 'SU' because
         # response_dtype.char should never be
         # 'U'
-        k = np.fromstring(stream.read(4), DAP2_ARRAY_LENGTH_NUMPY_TYPE)[0]
-        out.append(text_type(stream.read(k).decode('ascii')))
-        stream.read(-k % 4)
+        out.append(text_type(unpack_strings(stream, 1)[0].decode('ascii')))
     # usual data
     else:
         out.append(
-            np.fromstring(stream.read(response_dtype.itemsize), response_dtype)
+            np.frombuffer(stream.read(response_dtype.itemsize), response_dtype)
             .astype(parser_dtype)[0])
         if response_dtype.char == "B":
             # Unsigned Byte type is packed to multiples of 4 bytes:
@@ -438,11 +1454,248 @@ def convert_stream_to_list(stream, parser_dtype, shape, id):
     return out
 
 
+def unpack_into(stream, parser_dtype, shape, id, out):
+    """Unpack the data of a base type into the array `out`, returning it.
+
+    Contiguous arrays with the type of the data on the wire, in any byte
+    order, are filled directly from the stream. Otherwise the data is read
+    and converted in blocks of ``CONVERT_BYTES``, so that no temporary array
+    of the full size is allocated.
+
+    """
+    response_dtype = DAP2_response_dtypemap(parser_dtype)
+    if not shape or response_dtype.char == 'S':
+        out[...] = convert_stream_to_list(stream, parser_dtype, shape, id)[0]
+        return out
+
+    n = np.frombuffer(stream.read(4), DAP2_ARRAY_LENGTH_NUMPY_TYPE)[0]
+    stream.read(4)  # read additional length
+    if n != out.size:
+        raise ValueError(
+            'variable {0} could not be read: expected {1} values, got '
+            '{2}'.format(quote(id), out.size, n))
+
+    if (out.flags.c_contiguous and
+            native_dtype(out.dtype) == native_dtype(response_dtype)):
+        if readinto(stream, out) < out.nbytes:
+            raise ValueError('variable {0} could not be read: unexpected '
+                             'end of data'.format(quote(id)))
+        if out.dtype != response_dtype:
+            out.byteswap(True)
+    else:
+        flat = out.flat
+        buf = np.empty(
+            max(1, min(n, CONVERT_BYTES // response_dtype.itemsize)),
+            response_dtype)
+        for start in range(0, n, len(buf)):
+            block = buf[:min(len(buf), n - start)]
+            if readinto(stream, block) < block.nbytes:
+                raise ValueError('variable {0} could not be read: unexpected '
+                                 'end of data'.format(quote(id)))
+            flat[start:start + len(block)] = block
+
+    if response_dtype.char == "B":
+        # Unsigned Byte type is packed to multiples of 4 bytes:
+        stream.read(-n % 4)
+    return out
+
+
+def unpack_strings(stream, n):
+    """Unpack `n` strings, returning a Numpy array of bytes.
+
+    Each string is sent with its length, and padded to a multiple of 4
+    bytes. The lengths are scanned over blocks of the stream buffer, and the
+    strings are then copied to a fixed width array in bulk. Blocks where all
+    the strings have the same length, common for names and flags, are
+    decoded without scanning.
+
+    Streams without ``peek`` and ``skip``, like plain file objects, are read
+    one string at a time.
+
+    """
+    if not (hasattr(stream, 'peek') and hasattr(stream, 'skip')):
+        return read_strings(stream, n)
+
+    parts = []
+    while n:
+        # peeked views are copied, since Numpy on Python 2 can't read them
+        head = stream.peek(4).tobytes()
+        k = struct.unpack('>I', head)[0] if len(head) == 4 else 0
+        stride = 4 + k + (-k % 4)
+        buf = stream.peek(min(STRING_BYTES, n * stride)).tobytes()
+
+        strings, end = uniform_strings(buf, n, k, stride)
+        if strings is None:
+            strings, end = scan_strings(buf, n)
+        if not len(strings):
+            # a single string larger than the block, or not received yet
+            k = np.frombuffer(stream.read(4), '>u4')[0]
+            strings = np.array([stream.read(k)], 'S')
+            stream.read(-k % 4)
+        else:
+            stream.skip(end)
+        parts.append(strings)
+        n -= len(strings)
+
+    if not parts:
+        return np.array([], 'S')
+    return np.concatenate(parts)
+
+
+def read_strings(stream, n):
+    """Read `n` strings from any file-like object, one at a time."""
+    strings = []
+    for i in range(n):
+        k = np.frombuffer(stream.read(4), '>u4')[0]
+        strings.append(stream.read(k))
+        stream.read(-k % 4)
+    return np.array(strings, 'S')
+
+
+def uniform_strings(buf, n, k, stride):
+    """Decode strings from `buf`, if all of them have the length `k`.
+
+    Returns the array of strings and the number of bytes used, or ``None``
+    if the lengths differ.
+
+    """
+    count = min(n, len(buf) // stride)
+    words = np.frombuffer(buf, '>u4', count * stride // 4)
+    if not (words[::stride // 4] == k).all():
+        return None, 0
+    chars = np.frombuffer(buf, np.uint8, count * stride).reshape(
+        count, stride)[:, 4:4 + k]
+    if not k:
+        return np.zeros(count, 'S1'), count * stride
+    return chars.copy().view('S%d' % k).reshape(count), count * stride
+
+
+def scan_strings(buf, n):
+    """Decode up to `n` complete strings of different lengths from `buf`.
+
+    Returns the array of strings and the number of bytes used.
+
+    """
+    offsets, lengths = [], []
+    pos, size = 0, len(buf)
+    unpack_from = struct.Struct('>I').unpack_from
+    while len(lengths) < n and pos + 4 <= size:
+        k = unpack_from(buf, pos)[0]
+        end = pos + 4 + k + (-k % 4)
+        if end > size:
+            break
+        offsets.append(pos + 4)
+        lengths.append(k)
+        pos = end
+
+    # copy the characters of every string to its row of the output
+    lengths = np.array(lengths, np.intp)
+    width = max(1, lengths.max()) if len(lengths) else 1
+    starts = np.cumsum(lengths) - lengths
+    position = np.arange(lengths.sum())
+    src = np.repeat(np.array(offsets, np.intp) - starts, lengths) + position
+    dst = np.repeat(np.arange(len(lengths)) * width - starts,
+                    lengths) + position
+    chars = np.zeros(len(lengths) * width, np.uint8)
+    chars[dst] = np.frombuffer(buf, np.uint8, pos)[src]
+    return chars.view('S%d' % width), pos
+
+
+def readinto(stream, data):
+    """Read bytes from `stream` directly into the Numpy array `data`.
+
+    The stream can be a file object or one of the Pydap readers; the number of
+    bytes read is returned.
+
+    """
+    buf = data.reshape(-1).view(np.uint8)
+    if hasattr(stream, 'readinto'):
+        return stream.readinto(buf)
+    raw = stream.read(len(buf))
+    buf[:len(raw)] = np.frombuffer(raw, np.uint8)
+    return len(raw)
+
+
 def unpack_data(xdr_stream, dataset):
     """Unpack a string of encoded data, returning data as lists."""
     return unpack_children(xdr_stream, dataset)
 
 
+def map_children(stream, template):
+    """Unpack children from a structure, mapping arrays to the buffer.
+
+    Like ``unpack_children``, but `stream` should be a ``BytesReader`` over a
+    buffer like a ``mmap``. Arrays of numbers are returned as read only views
+    of the buffer, so that their data is only read when accessed, while the
+    other types are decoded.
+
+    """
+    if isinstance(template, StructureType):
+        cols = list(template.children())
+    else:
+        cols = [template]
+
+    out = []
+    for col in cols:
+        if isinstance(col, SequenceType):
+            out.append(IterData(list(unpack_sequence(stream, col)), col))
+        elif isinstance(col, StructureType):
+            out.append(tuple(map_children(stream, col)))
+        else:
+            out.append(map_array(stream, col))
+    return out
+
+
+def map_array(stream, var):
+    """Return a view of the data of a base type in the buffer of `stream`."""
+    response_dtype = DAP2_response_dtypemap(var.dtype)
+    if not var.shape or response_dtype.char == 'S':
+        return convert_stream_to_list(stream, var.dtype, var.shape, var.id)[0]
+
+    n = np.frombuffer(stream.read(4), DAP2_ARRAY_LENGTH_NUMPY_TYPE)[0]
+    stream.skip(4)  # skip additional length
+    if n != int(np.prod(var.shape)):
+        raise ValueError(
+            'variable {0} could not be read: expected {1} values, got '
+            '{2}'.format(quote(var.id), int(np.prod(var.shape)), n))
+    offset = stream.pos
+    size = n * response_dtype.itemsize
+    if response_dtype.char == "B":
+        # Unsigned Byte type is packed to multiples of 4 bytes:
+        size += -n % 4
+    if stream.skip(size) < size:
+        raise ValueError('variable {0} could not be read: unexpected '
+                         'end of data'.format(quote(var.id)))
+
+    # Int16 and UInt16 are sent as big endian 32 bit integers, so their
+    # values are in the last two bytes of each word
+    strides = tuple(int(np.prod(var.shape[i+1:])) * response_dtype.itemsize
+                    for i in range(len(var.shape)))
+    return np.ndarray(
+        var.shape, var.dtype, buffer=stream.data, strides=strides,
+        offset=offset + response_dtype.itemsize - var.dtype.itemsize)
+
+
+def split_pattern_in_string_iter(pattern, i):
+    """Split a stream of chunks on the first occurrence of `pattern`.
+
+    Returns the bytes read before the pattern, and the remainder of the chunk
+    where the pattern ends; the rest of the stream can then be read from `i`.
+    If the pattern is not found the remainder is ``None``.
+
+    """
+    head = bytearray()
+    length = len(pattern)
+    for this_chunk in i:
+        # only search the new bytes, plus enough to cover a split pattern
+        start = max(0, len(head) - length + 1)
+        head.extend(this_chunk)
+        pos = head.find(pattern, start)
+        if pos != -1:
+            return bytes(head[:pos]), bytes(head[pos+length:])
+    return bytes(head), None
+
+
 def find_pattern_in_string_iter(pattern, i):
     last_chunk = b''
     length = len(pattern)
@@ -1,7 +1,9 @@
 """Basic functions related to the DAP spec."""
 import operator
+from collections import deque
 
 from pkg_resources import get_distribution
+import numpy as np
 from six.moves.urllib.parse import quote as quote_
 from six.moves import reduce, zip_longest
 from six import binary_type, MAXSIZE
@@ -228,6 +230,192 @@ def hyperslab(slice_):
         s.start or 0, s.step or 1, (s.stop or MAXSIZE)-1) for s in slice_)
 
 
+def slice_shape(slice_):
+    """Return the shape of the data selected by a normalized slice.
+
+        >>> slice_shape((slice(0, 10, 1), slice(2, 10, 3), slice(5, 5, 1)))
+        (10, 3, 0)
+
+    """
+    return tuple(max(0, -(-(s.stop - s.start) // s.step)) for s in slice_)
+
+
+def span_slice(slice_):
+    """Return the contiguous range of a normalized slice, and the decimation.
+
+    Indexing the data of the contiguous range with the decimation returns
+    the data selected by the original slice:
+
+        >>> span, decimation = span_slice((slice(2, 10, 3), slice(0, 4, 1)))
+        >>> span
+        (slice(2, 9, 1), slice(0, 4, 1))
+        >>> decimation
+        (slice(None, None, 3), slice(None, None, 1))
+
+    """
+    span = []
+    for s, count in zip(slice_, slice_shape(slice_)):
+        stop = s.start + (count - 1) * s.step + 1 if count else s.start
+        span.append(slice(s.start, stop, 1))
+    return tuple(span), tuple(slice(None, None, s.step) for s in slice_)
+
+
+def split_slice(slice_, n):
+    """Split a normalized slice into up to `n` contiguous parts.
+
+    The slice is split along its first axis selecting more than one element.
+    Returns a list of ``(part, region)`` pairs, where ``part`` is the slice of
+    the original data and ``region`` the corresponding slice of the output.
+
+        >>> for part, region in split_slice((slice(0, 1, 1), slice(0, 10, 2)),
+        ...                                 2):
+        ...     print(part[1], region[1])
+        slice(0, 3, 2) slice(0, 2, None)
+        slice(4, 9, 2) slice(2, 5, None)
+
+    """
+    shape = slice_shape(slice_)
+    axes = [i for i, count in enumerate(shape) if count > 1]
+    if not axes or n < 2:
+        return [(slice_, tuple(slice(None) for s in slice_))]
+
+    axis = axes[0]
+    count = shape[axis]
+    n = min(n, count)
+    s = slice_[axis]
+    out = []
+    for k in range(n):
+        i, j = k * count // n, (k + 1) * count // n
+        part = list(slice_)
+        part[axis] = slice(s.start + i * s.step,
+                           s.start + (j - 1) * s.step + 1,
+                           s.step)
+        region = [slice(None)] * len(slice_)
+        region[axis] = slice(i, j)
+        out.append((tuple(part), tuple(region)))
+    return out
+
+
+def is_fancy_index(index):
+    """Return true if an index selects elements with arrays or lists.
+
+        >>> is_fancy_index((0, slice(None)))
+        False
+        >>> is_fancy_index((0, [1, 3]))
+        True
+
+    """
+    if not isinstance(index, tuple):
+        index = (index,)
+    return any(isinstance(s, (list, np.ndarray)) for s in index)
+
+
+def fix_fancy_index(index, shape):
+    """Return a normalized index with integer arrays.
+
+    Boolean masks are converted to the integer arrays of their selected
+    elements, and negative indexes in arrays are wrapped. Integers become
+    slices selecting a single element, so that their axis is kept like in the
+    other requests to proxies.
+
+        >>> fix_fancy_index((0, [1, -1]), (3, 4))
+        (slice(0, 1, 1), array([1, 3]))
+        >>> fix_fancy_index([[True, False], [False, True]], (2, 2, 3))
+        (array([0, 1]), array([0, 1]), slice(0, 3, 1))
+
+    """
+    if not isinstance(index, tuple):
+        index = (index,)
+
+    # convert the masks, which can span more than one axis
+    out = []
+    for s in index:
+        if isinstance(s, list):
+            s = np.asarray(s)
+        if isinstance(s, np.ndarray) and s.dtype == np.bool_:
+            k = len(out)
+            if (not any(t is Ellipsis for t in out) and
+                    s.shape != tuple(shape[k:k+s.ndim])):
+                raise IndexError(
+                    "boolean index of shape {0} does not match axes of "
+                    "shape {1}".format(s.shape, tuple(shape[k:k+s.ndim])))
+            out.extend(np.nonzero(s))
+        else:
+            out.append(s)
+    ellipses = sum(1 for s in out if s is Ellipsis)
+    if len(out) - ellipses > len(shape):
+        raise IndexError("too many indices for an array of shape {0}".format(
+            shape))
+
+    # expand Ellipsis, and normalize each axis
+    expand = len(shape) - len(out) + ellipses
+    index = []
+    for s in out:
+        if s is Ellipsis:
+            index.extend((slice(None),) * expand)
+            expand = 0
+        else:
+            index.append(s)
+    index.extend((slice(None),) * expand)
+
+    out = []
+    for axis, (s, n) in enumerate(zip(index, shape)):
+        if isinstance(s, np.ndarray):
+            if s.size and not np.issubdtype(s.dtype, np.integer):
+                raise IndexError("arrays used as indices must be integers")
+            s = np.where(s < 0, s + n, s).astype(int)
+            if s.size and (s.min() < 0 or s.max() >= n):
+                raise IndexError(
+                    "index out of bounds for axis {0} with size {1}".format(
+                        axis, n))
+            out.append(s)
+        else:
+            if isinstance(s, np.integer):
+                s = int(s)
+            s = fix_slice((s,), (n,))[0]
+            if isinstance(s, slice):
+                out.append(s)
+            else:
+                out.append(slice(s, s + 1, 1))
+    return tuple(out)
+
+
+def coalesce_indices(indices, max_gap=0):
+    """Group sorted unique indices into a few normalized slices.
+
+    Indices separated by up to `max_gap` unrequested elements are joined in a
+    contiguous slice, or in a strided one if they have a constant step.
+    Isolated indices with a constant step are joined in a strided slice, so
+    that no unrequested elements are selected.
+
+        >>> coalesce_indices([0, 1, 2, 5, 6, 20, 30, 40], max_gap=2)
+        [slice(0, 7, 1), slice(20, 41, 10)]
+        >>> coalesce_indices([1, 3, 5, 7, 9])
+        [slice(1, 10, 2)]
+
+    """
+    indices = np.asarray(indices)
+    if not indices.size:
+        return []
+
+    # each run is ``[start, last, step, isolated]``
+    runs = []
+    breaks = np.nonzero(np.diff(indices) > max_gap + 1)[0] + 1
+    for cluster in np.split(indices, breaks):
+        start, last = int(cluster[0]), int(cluster[-1])
+        if len(cluster) > 1:
+            steps = np.diff(cluster)
+            step = int(steps[0]) if (steps == steps[0]).all() else 1
+            runs.append([start, last, step, False])
+        elif runs and runs[-1][3] and (
+                runs[-1][0] == runs[-1][1] or
+                start - runs[-1][1] == runs[-1][2]):
+            runs[-1][1:3] = [start, start - runs[-1][1]]
+        else:
+            runs.append([start, start, 1, True])
+    return [slice(run[0], run[1] + 1, run[2]) for run in runs]
+
+
 def walk(var, type=object):
     """Yield all variables of a given type from a dataset.
 
@@ -279,6 +467,23 @@ def decode_np_strings(numpy_var):
         return numpy_var
 
 
+def native_dtype(dtype):
+    """Return `dtype` in the byte order of the machine.
+
+        >>> native_dtype(np.dtype('>i4')) == np.dtype('=i4')
+        True
+
+    """
+    return np.dtype(dtype).newbyteorder('=')
+
+
+def to_native(data):
+    """Return an array in the native byte order, swapping bytes in place."""
+    if not data.dtype.isnative:
+        data = data.byteswap(True).view(native_dtype(data.dtype))
+    return data
+
+
 def load_from_entry_point_relative(r, package):
     try:
         loaded = getattr(__import__(r.module_name
@@ -293,32 +498,147 @@ def load_from_entry_point_relative(r, package):
 
 class StreamReader(object):
 
-    """Class to allow reading a `urllib3.HTTPResponse`."""
+    """Class to allow reading a `urllib3.HTTPResponse`.
+
+    Chunks are queued as they arrive from the stream and consumed through an
+    offset into the first chunk, so reading never reallocates buffered data.
+    Bytes can be copied out with ``read``, inspected without copying with
+    ``peek``, or copied directly into an existing buffer with ``readinto``.
+
+    """
 
     def __init__(self, stream):
         self.stream = stream
-        self.buf = bytearray()
+        self.chunks = deque()
+        self.pos = 0   # offset into the first chunk
+        self.size = 0  # number of unread bytes in the queue
+
+    def fill(self, n):
+        """Buffer at least `n` bytes, returning the number of buffered bytes.
+
+        Fewer bytes are buffered only if the stream is exhausted.
+
+        """
+        while self.size < n:
+            try:
+                chunk = next(self.stream)
+            except StopIteration:
+                break
+            if chunk:
+                self.chunks.append(chunk)
+                self.size += len(chunk)
+        return self.size
+
+    def peek(self, n):
+        """Return a ``memoryview`` of up to `n` bytes, without consuming them.
+
+        If the bytes span several chunks these are first merged into a single
+        chunk, so that repeated peeks do not copy data.
+
+        """
+        n = min(n, self.fill(n))
+        if not n:
+            return memoryview(b'')
+        if len(self.chunks[0]) - self.pos < n:
+            merged = bytearray(memoryview(self.chunks.popleft())[self.pos:])
+            while len(merged) < n:
+                merged.extend(self.chunks.popleft())
+            self.chunks.appendleft(bytes(merged))
+            self.pos = 0
+        return memoryview(self.chunks[0])[self.pos:self.pos+n]
+
+    def skip(self, n):
+        """Discard `n` bytes, returning the number of bytes skipped."""
+        n = min(n, self.fill(n))
+        self.size -= n
+        self.pos += n
+        while self.chunks and self.pos >= len(self.chunks[0]):
+            self.pos -= len(self.chunks.popleft())
+        return n
 
     def read(self, n):
         """Read and return `n` bytes."""
-        while len(self.buf) < n:
-            bytes_read = next(self.stream)
-            self.buf.extend(bytes_read)
-
-        out = bytes(self.buf[:n])
-        self.buf = self.buf[n:]
+        # fast path, when the bytes are all in the first chunk
+        end = self.pos + n
+        if self.chunks and end < len(self.chunks[0]):
+            out = self.chunks[0][self.pos:end]
+            self.pos = end
+            self.size -= n
+            return out
+
+        out = self.peek(n).tobytes()
+        self.skip(len(out))
         return out
 
+    def readinto(self, b):
+        """Read bytes directly into the writable buffer `b`.
+
+        Returns the number of bytes read, which is smaller than the size of
+        `b` only if the stream is exhausted.
+
+        """
+        view = memoryview(b)
+        n = len(view)
+
+        # start with the bytes already buffered...
+        k = 0
+        while k < n and self.chunks:
+            chunk = memoryview(self.chunks[0])[self.pos:self.pos+n-k]
+            view[k:k+len(chunk)] = chunk
+            k += self.skip(len(chunk))
+
+        # ...then copy chunks straight from the stream
+        while k < n:
+            try:
+                chunk = next(self.stream)
+            except StopIteration:
+                break
+            m = min(n - k, len(chunk))
+            view[k:k+m] = memoryview(chunk)[:m]
+            k += m
+            if m < len(chunk):
+                self.chunks.append(chunk)
+                self.pos = m
+                self.size = len(chunk) - m
+        return k
+
 
 class BytesReader(object):
 
-    """Class to allow reading a `bytes` object."""
+    """Class to allow reading a `bytes` object, or a ``mmap``."""
 
     def __init__(self, data):
         self.data = data
+        self.pos = 0
+
+    def _view(self, n):
+        """Return a ``memoryview`` of up to `n` bytes at the position."""
+        try:
+            return memoryview(self.data)[self.pos:self.pos+n]
+        except TypeError:
+            # a ``mmap`` on Python 2, which has no memoryview; copy the bytes
+            return memoryview(self.data[self.pos:self.pos+n])
+
+    def peek(self, n):
+        """Return a ``memoryview`` of up to `n` bytes, not consuming them."""
+        return self._view(n)
+
+    def skip(self, n):
+        """Discard `n` bytes, returning the number of bytes skipped."""
+        n = min(n, len(self.data) - self.pos)
+        self.pos += n
+        return n
 
     def read(self, n):
         """Read and return `n` bytes."""
-        out = self.data[:n]
-        self.data = self.data[n:]
+        out = self.data[self.pos:self.pos+n]
+        self.pos += len(out)
         return out
+
+    def readinto(self, b):
+        """Read bytes directly into the writable buffer `b`."""
+        view = memoryview(b)
+        n = min(len(view), len(self.data) - self.pos)
+        view[:n] = self._view(n)
+        self.pos += n
+        return n
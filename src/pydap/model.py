@@ -169,6 +169,7 @@ therefore highly recommended.
 
 import operator
 import copy
+import threading
 from six.moves import reduce, map
 from six import string_types
 import numpy as np
@@ -177,6 +178,12 @@ import warnings
 
 from .lib import quote, decode_np_strings
 
+# the deferred data of variables is created under a lock, so that threads
+# never see the placeholder data; it's reentrant since the data of a variable
+# can be created from the data of its parents
+_deferred_lock = threading.RLock()
+_creating = set()
+
 
 __all__ = [
     'BaseType', 'StructureType', 'DatasetType', 'SequenceType', 'GridType']
@@ -199,6 +206,35 @@ class DapType(object):
         # Set the id to the name.
         self._id = self.name
 
+    # The attributes.
+    def _set_attributes(self, attributes):
+        self._attributes = attributes
+        self._deferred_attributes = []
+
+    def _get_attributes(self):
+        if self._deferred_attributes:
+            deferred, self._deferred_attributes = (
+                self._deferred_attributes, [])
+            for update in deferred:
+                update(self._attributes)
+        return self._attributes
+
+    attributes = property(_get_attributes, _set_attributes)
+
+    def defer_attributes(self, update):
+        """Defer an update of the attributes until they are first accessed.
+
+        The `update` function is called with the dictionary of attributes::
+
+            >>> var = DapType('var')
+            >>> var.defer_attributes(lambda attributes: attributes.update(
+            ...     foo='bar'))
+            >>> var.foo
+            'bar'
+
+        """
+        self._deferred_attributes.append(update)
+
     def __repr__(self):
         return 'DapType(%s)' % ', '.join(
             map(repr, [self.name, self.attributes]))
@@ -231,6 +267,8 @@ class DapType(object):
         This will return the value stored under `attributes`.
 
         """
+        if attr in ('_attributes', '_deferred_attributes'):
+            raise AttributeError(attr)
         try:
             return self.attributes[attr]
         except (KeyError, TypeError):
@@ -247,6 +285,8 @@ class BaseType(DapType):
 
     """A thin wrapper over Numpy arrays."""
 
+    _deferred_data = None
+
     def __init__(self, name='nameless', data=None, dimensions=None,
                  attributes=None, **kwargs):
         super(BaseType, self).__init__(name, attributes, **kwargs)
@@ -263,12 +303,12 @@ class BaseType(DapType):
     @property
     def dtype(self):
         """Property that returns the data dtype."""
-        return self.data.dtype
+        return self._data.dtype
 
     @property
     def shape(self):
         """Property that returns the data shape."""
-        return self.data.shape
+        return self._data.shape
 
     def reshape(self, *args):
         """Method that reshapes the data:"""
@@ -290,9 +330,10 @@ class BaseType(DapType):
         dimensions, same name, and a view of the data.
 
         """
-        out = type(self)(self.name, self.data, self.dimensions[:],
+        out = type(self)(self.name, self._data, self.dimensions[:],
                          self.attributes.copy())
         out.id = self.id
+        out._deferred_data = self._deferred_data
         return out
 
     # Comparisons are passed to the data.
@@ -343,16 +384,20 @@ class BaseType(DapType):
         return self._get_data_index()
 
     def _get_data_index(self, index=Ellipsis):
+        data = self.data
         if (self._is_string_dtype and
-           isinstance(self._data, np.ndarray)):
-            return np.vectorize(decode_np_strings)(self._data[index])
+           isinstance(data, np.ndarray)):
+            return np.vectorize(decode_np_strings)(data[index])
         else:
-            return self._data[index]
+            return data[index]
 
     def _get_data(self):
+        if self._deferred_data is not None:
+            create_deferred_data(self)
         return self._data
 
     def _set_data(self, data):
+        self._deferred_data = None
         self._data = data
         if np.isscalar(data):
             # Convert scalar data to
@@ -362,6 +407,40 @@ class BaseType(DapType):
             self._data = np.array(data)
     data = property(_get_data, _set_data)
 
+    def defer_data(self, factory):
+        """Defer the creation of the data until it is first accessed.
+
+        The `factory` is called with the variable, returning its data. Until
+        then the current data is used only for the dtype and the shape::
+
+            >>> var = BaseType('var', np.empty(3))
+            >>> var.defer_data(lambda var: np.arange(var.shape[0]))
+            >>> var.data
+            array([0, 1, 2])
+
+        """
+        self._deferred_data = factory
+
+
+def create_deferred_data(var):
+    """Create the deferred data of `var`, if it wasn't created yet.
+
+    The deferral is cleared only after the factory succeeds, so that it's
+    tried again if it fails.
+
+    """
+    with _deferred_lock:
+        factory = var._deferred_data
+        if factory is None or id(var) in _creating:
+            return
+        _creating.add(id(var))
+        try:
+            data = factory(var)
+        finally:
+            _creating.discard(id(var))
+        if var._deferred_data is factory:
+            var.data = data
+
 
 class StructureType(DapType, Mapping):
     """A dict-like object holding other variables."""
@@ -391,8 +470,9 @@ class StructureType(DapType, Mapping):
     # From these, keys, items, values, get, __eq__,
     # and __ne__ are obtained.
     def __iter__(self):
+        visible = set(self._visible_keys)
         for key in self._dict.keys():
-            if key in self._visible_keys:
+            if key in visible:
                 yield key
 
     def _all_keys(self):
@@ -449,7 +529,7 @@ class StructureType(DapType, Mapping):
                 'Key "%s" is different from variable name "%s"!' %
                 (key, item.name))
 
-        if key in self:
+        if key in self._dict:
             del self[key]
         self._dict[key] = item
         # By default added keys are visible:
@@ -609,21 +689,34 @@ class SequenceType(StructureType):
 
     """
 
+    _deferred_data = None
+
     def __init__(self, name='nameless', data=None, attributes=None, **kwargs):
         super(SequenceType, self).__init__(name, attributes, **kwargs)
         self._data = data
 
     def _set_data(self, data):
+        self._deferred_data = None
         self._data = data
         for child in self.children():
             tokens = child.id[len(self.id)+1:].split('.')
             child.data = reduce(operator.getitem, [data] + tokens)
 
     def _get_data(self):
+        if self._deferred_data is not None:
+            create_deferred_data(self)
         return self._data
 
     data = property(_get_data, _set_data)
 
+    def defer_data(self, factory):
+        """Defer the creation of the data until it is first accessed.
+
+        The `factory` is called with the sequence, returning its data.
+
+        """
+        self._deferred_data = factory
+
     def iterdata(self):
         for line in self.data:
             yield tuple(map(decode_np_strings, line))
@@ -687,8 +780,9 @@ class SequenceType(StructureType):
             return out
 
     def __shallowcopy__(self):
-        out = type(self)(self.name, self.data, self.attributes.copy())
+        out = type(self)(self.name, self._data, self.attributes.copy())
         out.id = self.id
+        out._deferred_data = self._deferred_data
         return out
 
 
@@ -1,7 +1,11 @@
+import threading
+import weakref
 from webob.request import Request
+from webob.response import Response
 from webob.exc import HTTPError
 from contextlib import closing
 import requests
+from requests.adapters import HTTPAdapter
 from requests.exceptions import (MissingSchema, InvalidSchema,
                                  Timeout)
 
@@ -10,35 +14,169 @@ from six.moves.urllib.parse import urlsplit, urlunsplit
 from .lib import DEFAULT_TIMEOUT
 
 
-def GET(url, application=None, session=None, timeout=DEFAULT_TIMEOUT):
+# size of the chunks read from streamed responses
+BLOCKSIZE = 2**16
+
+# content encodings accepted by default; they are decompressed while streaming
+ACCEPT_ENCODING = 'gzip, deflate'
+
+# headers that apply only to the connection, and not to the webob response
+HOP_BY_HOP = set([
+    'connection', 'keep-alive', 'proxy-authenticate', 'proxy-authorization',
+    'te', 'trailers', 'transfer-encoding', 'upgrade'])
+
+
+def GET(url, application=None, session=None, timeout=DEFAULT_TIMEOUT,
+        headers=None):
     """Open a remote URL returning a webob.response.Response object
 
     Optional parameters:
     session: a requests.Session() object (potentially) containing
-             authentication cookies.
+             authentication cookies, or a ``Transport``.
+    headers: a dictionary of extra headers to send with the request.
 
     Optionally open a URL to a local WSGI application
     """
+    headers = dict({'Accept-Encoding': ACCEPT_ENCODING}, **(headers or {}))
     if application:
         _, _, path, query, fragment = urlsplit(url)
         url = urlunsplit(('', '', path, query, fragment))
+        req = Request.blank(url)
+        req.headers.update(headers)
+        return req.get_response(application)
+
+    return get_transport(session).get(url, timeout=timeout, headers=headers)
+
+
+class Transport(object):
+
+    """A pooled HTTP transport, safe to share between threads.
+
+    Requests are made with a single ``requests.Session``, so connections are
+    kept alive and reused, and cookies set by the server are sent in the
+    following requests. Redirects that keep the query string are remembered
+    for the URL without its query string, so that later requests for the same
+    resource with other constraints go directly to the final location.
+
+    Responses are returned as ``webob.response.Response`` objects, with the
+    body streamed from the connection through their ``app_iter``. Bodies are
+    not decompressed, so only the encodings in ``ACCEPT_ENCODING`` are
+    requested, unless other ones are given explicitly.
+
+    """
+
+    def __init__(self, session=None, pool_maxsize=32):
+        if session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_maxsize=pool_maxsize)
+            session.mount('http://', adapter)
+            session.mount('https://', adapter)
+        self.session = session
+        self.redirects = {}
+        self.lock = threading.Lock()
+
+    def get(self, url, timeout=DEFAULT_TIMEOUT, headers=None):
+        """Open `url`, returning a streamed ``webob`` response."""
+        scheme, netloc, path, query, fragment = urlsplit(url)
+        key = (scheme, netloc, path)
+        with self.lock:
+            scheme, netloc, path = self.redirects.get(key, key)
+        url = urlunsplit((scheme, netloc, path, query, fragment))
+        headers = dict({'Accept-Encoding': ACCEPT_ENCODING}, **(headers or {}))
+
+        try:
+            r = self.session.get(url, headers=headers, timeout=timeout,
+                                 stream=True, allow_redirects=True)
+        except (MissingSchema, InvalidSchema):
+            # this can occur in tests when the url is not pointing to any
+            # resource; fall back to webob
+            req = create_request(url, session=self.session, timeout=timeout)
+            if headers:
+                req.headers.update(headers)
+            return req.get_response()
+        except Timeout:
+            raise HTTPError('Timeout')
+
+        if r.history:
+            final = urlsplit(r.url)
+            if final.query == query:
+                with self.lock:
+                    self.redirects[key] = (
+                        final.scheme, final.netloc, final.path)
+
+        return Response(
+            status=r.status_code,
+            headerlist=[(k, v) for k, v in r.headers.items()
+                        if k.lower() not in HOP_BY_HOP],
+            app_iter=StreamedBody(r))
+
+
+class StreamedBody(object):
+
+    """The body of a ``requests`` response, read in chunks.
+
+    The body is read without decoding its content encoding, since that is
+    declared in the headers of the webob response. Closing the body returns
+    the connection to the pool.
+
+    """
+
+    def __init__(self, response, blocksize=BLOCKSIZE):
+        self.response = response
+        self.blocksize = blocksize
+
+    def __iter__(self):
+        for chunk in self.response.raw.stream(self.blocksize,
+                                              decode_content=False):
+            if chunk:
+                yield chunk
+        self.close()
+
+    def close(self):
+        self.response.close()
+
+
+_default_transport = None
+_transports = weakref.WeakKeyDictionary()
+_transports_lock = threading.Lock()
+
+
+def get_transport(session=None):
+    """Return the transport used for a session.
+
+    Requests without a session share a single transport, while each
+    ``requests.Session`` has its own, reusing its cookies and credentials.
+
+    """
+    global _default_transport
 
-    return follow_redirect(url, application=application, session=session,
-                           timeout=timeout)
+    if isinstance(session, Transport):
+        return session
+    with _transports_lock:
+        if session is None:
+            if _default_transport is None:
+                _default_transport = Transport()
+            return _default_transport
+        if session not in _transports:
+            _transports[session] = Transport(session)
+        return _transports[session]
 
 
 def raise_for_status(response):
     # Raise error if status is above 300:
     if response.status_code >= 300:
+        # error pages can be compressed too
+        from .handlers.dap import iter_body, get_charset
+        body = b''.join(iter_body(response))
         raise HTTPError(
-            detail=response.status+'\n'+response.text,
+            detail=response.status+'\n'+body.decode(get_charset(response)),
             headers=response.headers,
-            comment=response.body
+            comment=body
         )
 
 
 def follow_redirect(url, application=None, session=None,
-                    timeout=DEFAULT_TIMEOUT):
+                    timeout=DEFAULT_TIMEOUT, headers=None):
     """
     This function essentially performs the following command:
     >>> Request.blank(url).get_response(application)  # doctest: +SKIP
@@ -48,6 +186,8 @@ def follow_redirect(url, application=None, session=None,
     """
 
     req = create_request(url, session=session, timeout=timeout)
+    if headers:
+        req.headers.update(headers)
     return req.get_response(application)
 
 
@@ -181,3 +181,36 @@ class SimpleParser(object):
         else:
             raise Exception("Unable to parse token: %s" % self.buffer[:10])
         return token
+
+
+class CursorParser(object):
+
+    """A parser that scans its input in a single pass.
+
+    Tokens are matched with precompiled patterns at a cursor, instead of
+    slicing the remaining input after each token. The whitespace after each
+    consumed token is skipped.
+
+    """
+
+    whitespace = re.compile(r'\s*')
+
+    def __init__(self, input):
+        self.input = input
+        self.pos = 0
+
+    def peek(self, pattern):
+        """Check if a token is present and return it."""
+        m = pattern.match(self.input, self.pos)
+        if m:
+            return m.group()
+        return ''
+
+    def consume(self, pattern):
+        """Consume and return a token, skipping the whitespace after it."""
+        m = pattern.match(self.input, self.pos)
+        if not m:
+            raise Exception("Unable to parse token: %s" %
+                            self.input[self.pos:self.pos+10])
+        self.pos = self.whitespace.match(self.input, m.end()).end()
+        return m.group()
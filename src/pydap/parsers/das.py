@@ -12,47 +12,65 @@ import operator
 
 from six.moves import reduce
 
-from . import SimpleParser
+from . import CursorParser
 from ..lib import walk
 
 
-class DASParser(SimpleParser):
+def _compile(regexp):
+    return re.compile(regexp, re.IGNORECASE | re.VERBOSE | re.DOTALL)
 
-    """A parser for the Dataset Attribute Structure response."""
 
-    def __init__(self, das):
-        super(DASParser, self).__init__(
-            das, re.IGNORECASE | re.VERBOSE | re.DOTALL)
+# patterns matched by the parser, compiled only once
+ATTRIBUTES = _compile('attributes')
+OPEN = _compile('{')
+CLOSE = _compile('}')
+SEMICOLON = _compile(';')
+COMMA = _compile(',')
+TOKEN = _compile(r'[^\s]+')
+CONTAINER = _compile(r'[^\s]+\s+{')
+VALUE = _compile(r'''
+    ""          # empty attribute
+    |           # or
+    ".*?[^\\]"  # from quote up to an unquoted quote
+    |           # or
+    [^;,]+      # up to semicolon or comma
+''')
 
-    def consume(self, regexp):
-        """Return a token from the buffer.
 
-        Not that it will Ignore white space when consuming tokens.
+class DASParser(CursorParser):
 
-        """
-        token = super(DASParser, self).consume(regexp)
-        self.buffer = self.buffer.lstrip()
-        return token
+    """A parser for the Dataset Attribute Structure response.
+
+    If `lazy` is true the values of the attributes are not converted while
+    parsing; instead, each container is returned as a ``LazyAttributes``
+    dictionary, converted when applied to a variable with ``add_attributes``
+    and its attributes are first accessed.
+
+    """
+
+    def __init__(self, das, lazy=False):
+        super(DASParser, self).__init__(das)
+        self.lazy = lazy
 
     def parse(self):
         """Start the parsing, returning a nested dictionary of attributes."""
-        out = {}
-        self.consume('attributes')
+        out = LazyAttributes() if self.lazy else {}
+        self.consume(ATTRIBUTES)
         self.container(out)
         return out
 
     def container(self, target):
         """Collect the attributes for a DAP variable."""
-        self.consume('{')
-        while not self.peek('}'):
-            if self.peek(r'[^\s]+\s+{'):
-                name = self.consume(r'[^\s]+')
-                target[name] = {}
+        self.consume(OPEN)
+        while not self.peek(CLOSE):
+            if self.peek(CONTAINER):
+                name = self.consume(TOKEN)
+                target[name] = LazyAttributes() if self.lazy else {}
                 self.container(target[name])
             else:
                 name, values = self.attribute()
                 target[name] = values
-        self.consume('}')
+        self.consume(CLOSE)
 
     def attribute(self):
         """Parse attributes.
@@ -62,43 +80,97 @@ class DASParser(SimpleParser):
         attribute(s).
 
         """
-        type = self.consume(r'[^\s]+')
-        name = self.consume(r'[^\s]+')
+        type = self.consume(TOKEN)
+        name = self.consume(TOKEN)
 
         values = []
-        while not self.peek(';'):
-            value = self.consume(
-                r'''
-                    ""          # empty attribute
-                    |           # or
-                    ".*?[^\\]"  # from quote up to an unquoted quote
-                    |           # or
-                    [^;,]+      # up to semicolon or comma
-                '''
-            )
-
-            if type.lower() in ['string', 'url']:
-                value = str(value).strip('"')
-            elif value.lower() in ['nan', 'nan.', '-nan']:
-                value = float('nan')
-            else:
-                value = ast.literal_eval(value)
+        while not self.peek(SEMICOLON):
+            values.append(self.consume(VALUE))
+            if self.peek(COMMA):
+                self.consume(COMMA)
+
+        self.consume(SEMICOLON)
+
+        if self.lazy:
+            return name, RawAttribute(type, values)
+        return name, convert_values(type, values)
+
+
+def convert_values(type, values):
+    """Convert the values of an attribute to the corresponding Python objects.
+
+    A single value is returned directly, instead of in a list.
+
+    """
+    string = type.lower() in ['string', 'url']
+    out = []
+    for value in values:
+        if string:
+            value = str(value).strip('"')
+        elif value.lower() in ['nan', 'nan.', '-nan']:
+            value = float('nan')
+        else:
+            value = ast.literal_eval(value)
+        out.append(value)
+
+    if len(out) == 1:
+        out = out[0]
+
+    return out
 
-            values.append(value)
-            if self.peek(','):
-                self.consume(',')
 
-        self.consume(';')
+class RawAttribute(object):
 
-        if len(values) == 1:
-            values = values[0]
+    """The type and the unconverted values of an attribute."""
 
-        return name, values
+    __slots__ = ('type', 'values')
 
+    def __init__(self, type, values):
+        self.type = type
+        self.values = values
 
-def parse_das(das):
-    """Parse the DAS, returning nested dictionaries."""
-    return DASParser(das).parse()
+    def convert(self):
+        return convert_values(self.type, self.values)
+
+
+class LazyAttributes(dict):
+
+    """A container of attributes, with values not converted yet."""
+
+    def materialize(self):
+        """Return a dictionary with the converted attributes."""
+        out = {}
+        for name, value in self.items():
+            if isinstance(value, LazyAttributes):
+                value = value.materialize()
+            elif isinstance(value, RawAttribute):
+                value = value.convert()
+            out[name] = value
+        return out
+
+
+def parse_das(das, lazy=False):
+    """Parse the DAS, returning nested dictionaries.
+
+    If `lazy` is true the conversion of the values is deferred until the
+    attributes are accessed.
+
+    """
+    return DASParser(das, lazy).parse()
+
+
+def update_attributes(var, attributes):
+    """Update the attributes of a variable.
+
+    Lazily parsed attributes are converted only when the attributes of the
+    variable are first accessed.
+
+    """
+    if isinstance(attributes, LazyAttributes):
+        var.defer_attributes(
+            lambda target: target.update(attributes.materialize()))
+    else:
+        var.attributes.update(attributes)
 
 
 def add_attributes(dataset, attributes):
@@ -107,13 +179,14 @@ def add_attributes(dataset, attributes):
     Returns the dataset with added attributes.
 
     """
-    dataset.attributes['NC_GLOBAL'] = attributes.get('NC_GLOBAL', {})
-    dataset.attributes['DODS_EXTRA'] = attributes.get('DODS_EXTRA', {})
+    extra = type(attributes)()
+    extra['NC_GLOBAL'] = attributes.get('NC_GLOBAL', {})
+    extra['DODS_EXTRA'] = attributes.get('DODS_EXTRA', {})
 
     for var in list(walk(dataset))[::-1]:
         # attributes can be flat, eg, "foo.bar" : {...}
         if var.id in attributes:
-            var.attributes.update(attributes.pop(var.id))
+            update_attributes(var, attributes.pop(var.id))
 
         # or nested, eg, "foo" : { "bar" : {...} }
         try:
@@ -125,14 +198,14 @@ def add_attributes(dataset, attributes):
             pass
         else:
             try:
-                var.attributes.update(value)
+                update_attributes(var, value)
             except (TypeError, ValueError):
                 # This attribute should be given to the parent.
                 # Keep around:
                 nested.update({k: value})
 
     # add attributes that don't belong to any child
-    for k, v in attributes.items():
-        dataset.attributes[k] = v
+    extra.update(attributes)
+    update_attributes(dataset, extra)
 
     return dataset
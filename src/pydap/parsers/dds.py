@@ -4,7 +4,7 @@ import re
 
 import numpy as np
 
-from . import SimpleParser
+from . import CursorParser
 from ..model import (DatasetType, BaseType,
                      SequenceType, StructureType,
                      GridType)
@@ -14,50 +14,71 @@ constructors = ('grid', 'sequence', 'structure')
 name_regexp = r'[\w%!~"\'\*-]+'
 
 
+def _compile(regexp):
+    return re.compile(regexp, re.IGNORECASE)
+
+
+# patterns matched by the parser, compiled only once
+WORD = _compile(r'\w+')
+NAME = _compile(r'[^;]+')
+BASE_NAME = _compile(r'[^;\[]+')
+DIMENSION_NAME = _compile(name_regexp)
+NUMBER = _compile(r'\d+')
+SYMBOLS = dict((symbol, _compile(re.escape(symbol)))
+               for symbol in '{}[];:=')
+KEYWORDS = dict((keyword, _compile(keyword)) for keyword in
+                ('dataset', 'array', 'maps') + constructors)
+
+# cache of parsed types
+_dtypes = {}
+
+
 def DAP2_parser_typemap(type_string):
     """
     This function takes a numpy dtype object
     and returns a dtype object that is compatible with
     the DAP2 specification.
     """
-    dtype_str = LOWER_DAP2_TO_NUMPY_PARSER_TYPEMAP[type_string.lower()]
-    return np.dtype(dtype_str)
+    type_string = type_string.lower()
+    if type_string not in _dtypes:
+        _dtypes[type_string] = np.dtype(
+            LOWER_DAP2_TO_NUMPY_PARSER_TYPEMAP[type_string])
+    return _dtypes[type_string]
 
 
-class DDSParser(SimpleParser):
+class DDSParser(CursorParser):
 
-    """A parser for the DDS."""
+    """A parser for the DDS.
+
+    The DDS is scanned in a single pass, matching precompiled patterns at a
+    cursor, so that the text is never copied while parsing.
+
+    """
 
     def __init__(self, dds):
-        super(DDSParser, self).__init__(dds, re.IGNORECASE)
+        super(DDSParser, self).__init__(dds)
         self.dds = dds
 
-    def consume(self, regexp):
-        """Consume and return a token."""
-        token = super(DDSParser, self).consume(regexp)
-        self.buffer = self.buffer.lstrip()
-        return token
-
     def parse(self):
         """Parse the DAS, returning a dataset."""
         dataset = DatasetType('nameless')
 
-        self.consume('dataset')
-        self.consume('{')
-        while not self.peek('}'):
+        self.consume(KEYWORDS['dataset'])
+        self.consume(SYMBOLS['{'])
+        while not self.peek(SYMBOLS['}']):
             var = self.declaration()
             dataset[var.name] = var
-        self.consume('}')
+        self.consume(SYMBOLS['}'])
 
-        dataset.name = quote(self.consume('[^;]+'))
+        dataset.name = quote(self.consume(NAME))
         dataset._set_id(dataset.name)
-        self.consume(';')
+        self.consume(SYMBOLS[';'])
 
         return dataset
 
     def declaration(self):
         """Parse and return a declaration."""
-        token = self.peek(r'\w+').lower()
+        token = self.peek(WORD).lower()
 
         map = {
             'grid':      self.grid,
@@ -69,13 +90,13 @@ class DDSParser(SimpleParser):
 
     def base(self):
         """Parse a base variable, returning a ``BaseType``."""
-        data_type_string = self.consume(r'\w+')
+        data_type_string = self.consume(WORD)
 
         parser_dtype = DAP2_parser_typemap(data_type_string)
-        name = quote(self.consume(r'[^;\[]+'))
+        name = quote(self.consume(BASE_NAME))
 
         shape, dimensions = self.dimensions()
-        self.consume(r';')
+        self.consume(SYMBOLS[';'])
 
         data = DummyData(parser_dtype, shape)
         var = BaseType(name, data, dimensions=dimensions)
@@ -86,68 +107,68 @@ class DDSParser(SimpleParser):
         """Parse variable dimensions, returning tuples of dimensions/names."""
         shape = []
         names = []
-        while not self.peek(';'):
-            self.consume(r'\[')
-            token = self.consume(name_regexp)
-            if self.peek('='):
+        while not self.peek(SYMBOLS[';']):
+            self.consume(SYMBOLS['['])
+            token = self.consume(DIMENSION_NAME)
+            if self.peek(SYMBOLS['=']):
                 names.append(token)
-                self.consume('=')
-                token = self.consume(r'\d+')
+                self.consume(SYMBOLS['='])
+                token = self.consume(NUMBER)
             shape.append(int(token))
-            self.consume(r'\]')
+            self.consume(SYMBOLS[']'])
         return tuple(shape), tuple(names)
 
     def sequence(self):
         """Parse a DAS sequence, returning a ``SequenceType``."""
         sequence = SequenceType('nameless')
-        self.consume('sequence')
-        self.consume('{')
+        self.consume(KEYWORDS['sequence'])
+        self.consume(SYMBOLS['{'])
 
-        while not self.peek('}'):
+        while not self.peek(SYMBOLS['}']):
             var = self.declaration()
             sequence[var.name] = var
-        self.consume('}')
+        self.consume(SYMBOLS['}'])
 
-        sequence.name = quote(self.consume('[^;]+'))
-        self.consume(';')
+        sequence.name = quote(self.consume(NAME))
+        self.consume(SYMBOLS[';'])
         return sequence
 
     def structure(self):
         """Parse a DAP structure, returning a ``StructureType``."""
         structure = StructureType('nameless')
-        self.consume('structure')
-        self.consume('{')
+        self.consume(KEYWORDS['structure'])
+        self.consume(SYMBOLS['{'])
 
-        while not self.peek('}'):
+        while not self.peek(SYMBOLS['}']):
             var = self.declaration()
             structure[var.name] = var
-        self.consume('}')
+        self.consume(SYMBOLS['}'])
 
-        structure.name = quote(self.consume('[^;]+'))
-        self.consume(';')
+        structure.name = quote(self.consume(NAME))
+        self.consume(SYMBOLS[';'])
 
         return structure
 
     def grid(self):
         """Parse a DAP grid, returning a ``GridType``."""
         grid = GridType('nameless')
-        self.consume('grid')
-        self.consume('{')
+        self.consume(KEYWORDS['grid'])
+        self.consume(SYMBOLS['{'])
 
-        self.consume('array')
-        self.consume(':')
+        self.consume(KEYWORDS['array'])
+        self.consume(SYMBOLS[':'])
         array = self.base()
         grid[array.name] = array
 
-        self.consume('maps')
-        self.consume(':')
-        while not self.peek('}'):
+        self.consume(KEYWORDS['maps'])
+        self.consume(SYMBOLS[':'])
+        while not self.peek(SYMBOLS['}']):
             var = self.base()
             grid[var.name] = var
-        self.consume('}')
+        self.consume(SYMBOLS['}'])
 
-        grid.name = quote(self.consume('[^;]+'))
-        self.consume(';')
+        grid.name = quote(self.consume(NAME))
+        self.consume(SYMBOLS[';'])
 
         return grid
 
@@ -0,0 +1,148 @@
+"""A parser for the DDX response.
+
+The DDX is an XML document combining the DDS and the DAS, describing the
+structure of a dataset together with its attributes. Servers that support it
+allow a dataset to be opened with a single request for metadata. The
+``parse_ddx`` function will convert a DDX response into a dataset, with the
+same variables and attributes built from the corresponding DDS and DAS.
+
+"""
+
+from xml.etree import ElementTree
+
+from six import text_type
+
+from ..model import (DatasetType, BaseType, SequenceType, StructureType,
+                     GridType)
+from ..lib import quote, LOWER_DAP2_TO_NUMPY_PARSER_TYPEMAP
+from .dds import DAP2_parser_typemap, DummyData
+from .das import (convert_values, update_attributes, RawAttribute,
+                  LazyAttributes)
+
+constructors = {
+    'structure': StructureType,
+    'sequence': SequenceType,
+    'grid': GridType,
+}
+
+# elements declaring their type in a child element, instead of in the tag
+arrays = ('array', 'map')
+
+
+def local_name(tag):
+    """Return the name of an element without its namespace.
+
+        >>> local_name('{http://xml.opendap.org/ns/DAP2}Float32')
+        'float32'
+
+    """
+    return tag.rsplit('}', 1)[-1].lower()
+
+
+class DDXParser(object):
+
+    """A parser for the DDX.
+
+    If `lazy` is true the values of the attributes are converted only when the
+    attributes of a variable are first accessed, like in the ``DASParser``.
+
+    """
+
+    def __init__(self, ddx, lazy=False):
+        if isinstance(ddx, text_type):
+            ddx = ddx.encode('utf-8')
+        self.ddx = ddx
+        self.lazy = lazy
+
+    def parse(self):
+        """Parse the DDX, returning a dataset.
+
+        Raises ``xml.etree.ElementTree.ParseError`` if the response is not a
+        DDX, like the error pages of some servers.
+
+        """
+        root = ElementTree.fromstring(self.ddx)
+        if local_name(root.tag) != 'dataset':
+            raise ElementTree.ParseError(
+                "Expected a DDX, found a {0} element".format(root.tag))
+        dataset = DatasetType(quote(root.get('name', 'nameless')))
+
+        attributes = self.container(root, dataset)
+        attributes.setdefault('NC_GLOBAL', self.attributes())
+        attributes.setdefault('DODS_EXTRA', self.attributes())
+        update_attributes(dataset, attributes)
+
+        dataset._set_id(dataset.name)
+        return dataset
+
+    def attributes(self):
+        return LazyAttributes() if self.lazy else {}
+
+    def container(self, element, parent):
+        """Add the variables declared in `element` to `parent`.
+
+        Returns the attributes of `element`, which are not applied.
+
+        """
+        attributes = self.attributes()
+        for child in element:
+            tag = local_name(child.tag)
+            if tag == 'attribute':
+                self.attribute(child, attributes)
+            elif tag in constructors:
+                var = constructors[tag](quote(child.get('name')))
+                update_attributes(var, self.container(child, var))
+                parent[var.name] = var
+            elif tag in arrays or tag in LOWER_DAP2_TO_NUMPY_PARSER_TYPEMAP:
+                var = self.base(child)
+                parent[var.name] = var
+        return attributes
+
+    def base(self, element):
+        """Parse a base variable or an array, returning a ``BaseType``."""
+        type_string = local_name(element.tag)
+        attributes = self.attributes()
+        shape, dimensions = [], []
+        for child in element:
+            tag = local_name(child.tag)
+            if tag == 'attribute':
+                self.attribute(child, attributes)
+            elif tag == 'dimension':
+                shape.append(int(child.get('size')))
+                if child.get('name') is not None:
+                    dimensions.append(quote(child.get('name')))
+            elif tag in LOWER_DAP2_TO_NUMPY_PARSER_TYPEMAP:
+                type_string = tag
+
+        data = DummyData(DAP2_parser_typemap(type_string), tuple(shape))
+        var = BaseType(quote(element.get('name')), data,
+                       dimensions=tuple(dimensions))
+        update_attributes(var, attributes)
+        return var
+
+    def attribute(self, element, target):
+        """Parse an attribute or a container of attributes into `target`."""
+        name, type = element.get('name'), element.get('type')
+        if type.lower() == 'container':
+            target[name] = self.attributes()
+            for child in element:
+                if local_name(child.tag) == 'attribute':
+                    self.attribute(child, target[name])
+            return
+
+        values = [child.text or '' for child in element
+                  if local_name(child.tag) == 'value']
+        if self.lazy:
+            target[name] = RawAttribute(type, values)
+        else:
+            target[name] = convert_values(type, values)
+
+
+def parse_ddx(ddx, lazy=False):
+    """Parse the DDX, returning a dataset with its attributes.
+
+    If `lazy` is true the conversion of the values is deferred until the
+    attributes are accessed.
+
+    """
+    return DDXParser(ddx, lazy).parse()
@@ -0,0 +1,151 @@
+"""Planning of strided requests.
+
+Some servers read strided hyperslabs of chunked files very slowly, while
+others handle them as fast as contiguous ones. A ``FetchPlanner`` learns the
+cost of both kinds of requests for each host from the timings it observes,
+and decides for each strided read whether the step should be sent to the
+server, or the contiguous range downloaded and decimated locally. It can be
+passed to ``pydap.client.open_url``:
+
+    >>> from pydap.client import open_url
+    >>> from pydap.planner import FetchPlanner
+    >>> dataset = open_url(
+    ...     'http://test.opendap.org/dap/data/nc/coads_climatology.nc',
+    ...     planner=FetchPlanner())  # doctest: +SKIP
+    >>> quicklook = dataset.SST.SST[0, ::10, ::10]  # doctest: +SKIP
+
+Contiguous ranges larger than the ``chunk_bytes`` of the proxy are split
+into several hyperslabs, downloaded concurrently when ``max_workers`` is
+set.
+
+"""
+
+import threading
+
+from six.moves.urllib.parse import urlsplit
+
+from .lib import slice_shape
+
+# the ways of requesting a slice
+STRIDED = 'strided'
+CONTIGUOUS = 'contiguous'
+
+
+def request_mode(slice_):
+    """Return how a normalized slice is requested from the server.
+
+        >>> request_mode((slice(0, 10, 2), slice(3, 4, 5)))
+        'strided'
+        >>> request_mode((slice(0, 10, 1), slice(3, 4, 5)))
+        'contiguous'
+
+    """
+    for s, count in zip(slice_, slice_shape(slice_)):
+        if s.step > 1 and count > 1:
+            return STRIDED
+    return CONTIGUOUS
+
+
+class CostModel(object):
+
+    """Estimate the duration of requests from their size.
+
+    The duration is modelled as a latency plus a time per byte, fitted to the
+    observed requests with a least squares fit where the weight of older
+    requests decays by `decay` with each new one, so that the model follows
+    changes in the load of the server.
+
+        >>> model = CostModel()
+        >>> model.update(1000, 0.2)
+        >>> model.update(3000, 0.4)
+        >>> round(model.estimate(2000), 3)
+        0.3
+
+    """
+
+    def __init__(self, decay=0.9):
+        self.decay = decay
+        self.weight = self.x = self.y = self.xx = self.xy = 0.0
+
+    def update(self, nbytes, seconds):
+        """Add the duration of a request of `nbytes`."""
+        d = self.decay
+        self.weight = d * self.weight + 1
+        self.x = d * self.x + nbytes
+        self.y = d * self.y + seconds
+        self.xx = d * self.xx + nbytes * nbytes
+        self.xy = d * self.xy + nbytes * seconds
+
+    def estimate(self, nbytes):
+        """Return the estimated duration of a request of `nbytes`."""
+        mean_x, mean_y = self.x / self.weight, self.y / self.weight
+        variance = self.xx / self.weight - mean_x * mean_x
+        if variance > 1e-9 * mean_x * mean_x:
+            slope = max(0, (self.xy / self.weight - mean_x * mean_y) /
+                        variance)
+            latency = max(0, mean_y - slope * mean_x)
+        else:
+            # requests of a single size can't tell latency from throughput
+            slope = mean_y / mean_x if mean_x else 0
+            latency = 0 if mean_x else mean_y
+        return latency + slope * nbytes
+
+
+class FetchPlanner(object):
+
+    """Choose how strided slices are requested from each host.
+
+    The planner keeps a ``CostModel`` for the strided and the contiguous
+    requests to each host. A strided read is requested as a contiguous range
+    when that is estimated to be faster, even if more bytes are downloaded.
+
+    Until strided requests to a host have been observed the step is sent to
+    the server. Contiguous ranges of up to `explore_bytes` are tried once
+    when only strided requests have been observed, so that the planner can
+    learn their cost.
+
+    Larger ranges are never downloaded just to explore, so a strided read
+    larger than `explore_bytes` keeps the step until a contiguous request to
+    the host has been timed. The proxies record the timings of all their
+    requests, so ordinary contiguous reads also train the model. Its
+    estimates for large ranges are extrapolated from the sizes observed
+    so far.
+
+    """
+
+    def __init__(self, decay=0.9, explore_bytes=2**20):
+        self.decay = decay
+        self.explore_bytes = explore_bytes
+        self.models = {}
+        self.lock = threading.Lock()
+
+    def choose(self, url, nbytes, span_bytes):
+        """Return how a strided read should be requested.
+
+        `nbytes` is the size of the strided data, and `span_bytes` the size of
+        the contiguous range containing it. Returns ``STRIDED`` or
+        ``CONTIGUOUS``.
+
+        """
+        host = urlsplit(url).netloc
+        with self.lock:
+            strided = self.models.get((host, STRIDED))
+            contiguous = self.models.get((host, CONTIGUOUS))
+            if strided is None:
+                return STRIDED
+            if contiguous is None:
+                if span_bytes <= self.explore_bytes:
+                    return CONTIGUOUS
+                return STRIDED
+            if contiguous.estimate(span_bytes) < strided.estimate(nbytes):
+                return CONTIGUOUS
+            return STRIDED
+
+    def record(self, url, mode, nbytes, seconds):
+        """Record the duration of a request of `nbytes` to `url`."""
+        host = urlsplit(url).netloc
+        with self.lock:
+            model = self.models.get((host, mode))
+            if model is None:
+                model = self.models[host, mode] = CostModel(self.decay)
+            model.update(nbytes, seconds)
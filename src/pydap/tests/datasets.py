@@ -179,3 +179,19 @@ SimpleGrid["x"] = SimpleGrid["SimpleGrid"]["x"] = BaseType(
     "x", np.arange(3), axis="X", units="degrees_east")
 SimpleGrid["y"] = SimpleGrid["SimpleGrid"]["y"] = BaseType(
     "y", np.arange(2), axis="Y", units="degrees_north")
+
+
+def recording_app(test, app, key='QUERY_STRING'):
+    """Return a WSGI app calling `app`, and recording the requests.
+
+    The `key` of the environment of each request is appended to the
+    ``requests`` list of the test case `test`, which can be replaced by an
+    empty list to start recording again.
+
+    """
+    test.requests = []
+
+    def application(environ, start_response):
+        test.requests.append(environ[key])
+        return app(environ, start_response)
+    return application
@@ -0,0 +1,307 @@
+"""Test the asynchronous client."""
+
+import asyncio
+import numpy as np
+from webob.exc import HTTPError
+from pydap.model import DatasetType, BaseType
+from pydap.handlers.lib import BaseHandler
+from pydap.net import GET
+from pydap.parsers.dds import build_dataset
+from pydap.aio import (open_url_async, AsyncBaseProxy, AsyncSequenceProxy,
+                       unpack_available)
+from pydap.tests.datasets import (VerySimpleSequence, SimpleSequence,
+                                  SimpleArray)
+import unittest
+try:
+    from unittest.mock import patch, Mock
+except ImportError:
+    from mock import patch, Mock
+
+
+def byte_by_byte(app):
+    """Return a WSGI app that sends the response one byte at a time."""
+    def application(environ, start_response):
+        for chunk in app(environ, start_response):
+            for i in range(len(chunk)):
+                yield chunk[i:i+1]
+    return application
+
+
+class AsyncTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        self.addCleanup(self.loop.close)
+        self.addCleanup(self.run_async, self.loop.shutdown_asyncgens())
+
+    def run_async(self, coroutine):
+        return self.loop.run_until_complete(coroutine)
+
+    def collect(self, proxy):
+        async def collect():
+            return [rec async for rec in proxy]
+        return self.run_async(collect())
+
+
+class TestOpenUrlAsync(AsyncTestCase):
+
+    """Test arrays with the asynchronous client."""
+
+    def setUp(self):
+        super(TestOpenUrlAsync, self).setUp()
+        dataset = DatasetType("test")
+        self.original = np.arange(60, dtype='>i4').reshape(10, 6)
+        dataset["a"] = BaseType("a", self.original, units="m")
+        self.app = BaseHandler(dataset)
+        self.dataset = self.run_async(
+            open_url_async("http://localhost:8001/", self.app))
+
+    def test_metadata(self):
+        """Test that the dataset has metadata and async proxies."""
+        self.assertEqual(self.dataset.a.units, "m")
+        self.assertEqual(self.dataset.a.shape, (10, 6))
+        self.assertIsInstance(self.dataset.a.data, AsyncBaseProxy)
+
+    def test_get(self):
+        """Test downloading data."""
+        data = self.run_async(self.dataset.a.data.get())
+        np.testing.assert_array_equal(data, self.original)
+
+        data = self.run_async(self.dataset.a.data.get((2, slice(1, 4))))
+        np.testing.assert_array_equal(data, self.original[2:3, 1:4])
+
+    def test_lazy_slice(self):
+        """Test that slicing returns a new proxy."""
+        proxy = self.dataset.a[1:5].data
+        self.assertIsInstance(proxy, AsyncBaseProxy)
+        data = self.run_async(proxy.get(np.s_[::2, 3]))
+        np.testing.assert_array_equal(data, self.original[1:5:2, 3:4])
+
+    def test_gather(self):
+        """Test concurrent downloads."""
+        async def main():
+            return await asyncio.gather(*[
+                self.dataset.a.data.get(i) for i in range(10)])
+
+        for i, data in enumerate(self.run_async(main())):
+            np.testing.assert_array_equal(data, self.original[i:i+1])
+
+    def test_parallel(self):
+        """Test that large requests are split."""
+        dataset = self.run_async(open_url_async(
+            "http://localhost:8001/", self.app,
+            max_workers=3, chunk_bytes=40))
+        data = self.run_async(dataset.a.data.get())
+        np.testing.assert_array_equal(data, self.original)
+
+
+class TestOpenUrlAsyncDDX(AsyncTestCase):
+
+    """Test opening datasets from the DDX asynchronously."""
+
+    def test_error_page(self):
+        """Test falling back when the DDX is answered with an error page."""
+        dataset = DatasetType("test")
+        dataset["a"] = BaseType("a", np.arange(3, dtype='>i4'), units="m")
+        handler = BaseHandler(dataset)
+
+        def app(environ, start_response):
+            if environ['PATH_INFO'].endswith('.ddx'):
+                start_response('200 OK', [('Content-Type', 'text/html')])
+                return [b"<html><body>Error</body></html>"]
+            return handler(environ, start_response)
+
+        remote = self.run_async(
+            open_url_async("http://localhost:8001/", app, ddx=True))
+        self.assertEqual(remote.a.units, "m")
+
+
+class TestAsyncSequenceProxy(AsyncTestCase):
+
+    """Test sequences with the asynchronous client."""
+
+    def setUp(self):
+        super(TestAsyncSequenceProxy, self).setUp()
+        app = byte_by_byte(BaseHandler(VerySimpleSequence))
+        dataset = self.run_async(open_url_async("http://localhost:8001/", app))
+        self.remote = dataset.sequence.data
+        self.local = VerySimpleSequence.sequence.data
+
+    def test_aiter(self):
+        """Test iteration as the data arrives."""
+        self.assertIsInstance(self.remote, AsyncSequenceProxy)
+        self.assertEqual([tuple(row) for row in self.collect(self.remote)],
+                         [tuple(row) for row in self.local])
+
+    def test_filter_and_child(self):
+        """Test filtering and iterating over a child."""
+        remote = self.remote[self.remote["byte"] > 4]["int"]
+        self.assertEqual(self.collect(remote),
+                         [row[1] for row in self.local if row[0] > 4])
+
+    def test_to_array(self):
+        """Test downloading as an array."""
+        data = self.run_async(self.remote.to_array())
+        np.testing.assert_array_equal(data["int"], self.local["int"])
+
+    def test_blocking_iter(self):
+        """Test that blocking iteration is not allowed."""
+        with self.assertRaises(TypeError):
+            iter(self.remote)
+
+    def test_strings(self):
+        """Test a sequence with strings."""
+        app = byte_by_byte(BaseHandler(SimpleSequence))
+        dataset = self.run_async(open_url_async("http://localhost:8001/", app))
+        self.assertEqual(
+            [tuple(row) for row in self.collect(dataset.cast.data)], [
+                ('1', 100, -10, 0, -1, 21, 35, 0),
+                ('2', 200, 10, 500, 1, 15, 35, 100)])
+
+
+class TestUnpackChunks(AsyncTestCase):
+
+    """Test decoding a sequence from the chunks of a response."""
+
+    def test_marker(self):
+        """Test that only a line with the data marker ends the DDS."""
+        dataset = build_dataset("Dataset { Sequence { Int32 a; } s; } d;")
+        proxy = AsyncSequenceProxy("http://localhost:8001/", dataset.s)
+        chunks = [
+            b"Dataset {\n    Sequence {\n        Int32 a;\n    } s;\n} ",
+            b"Data:\n", b";\n\nDa", b"ta:\n\x5a\x00\x00\x00\x00\x00",
+            b"\x00\x07\x5a\x00\x00\x00\x00\x00\x00\x08",
+            b"\xa5\x00\x00\x00"]
+
+        async def stream():
+            for chunk in chunks:
+                yield chunk
+
+        async def collect():
+            return [tuple(rec) async for rec in proxy._unpack_chunks(stream())]
+
+        self.assertEqual(self.run_async(collect()), [(7,), (8,)])
+
+
+class FakeResponse(object):
+
+    """A response of the fake ``aiohttp`` session, from a WSGI app.
+
+    If `timeout` is true reading the body times out, after half of it is
+    received when iterating over its chunks.
+
+    """
+
+    def __init__(self, response, timeout=False):
+        self.status = response.status_code
+        self.headers = response.headers
+        self.body = response.body
+        self.timeout = timeout
+        self.content = self
+
+    async def read(self):
+        if self.timeout:
+            raise asyncio.TimeoutError()
+        return self.body
+
+    async def iter_chunked(self, n):
+        body = self.body[:len(self.body) // 2] if self.timeout else self.body
+        for i in range(0, len(body), n):
+            yield body[i:i+n]
+        if self.timeout:
+            raise asyncio.TimeoutError()
+
+    def release(self):
+        pass
+
+
+class FakeSession(object):
+
+    """A fake ``aiohttp.ClientSession``, recording its requests."""
+
+    instances = []
+
+    def __init__(self, app, timeout=False):
+        self.app = app
+        self.timeout = timeout
+        self.requests = []
+        self.closed = False
+        self.instances.append(self)
+
+    async def get(self, url, headers=None, timeout=None):
+        self.requests.append(url)
+        return FakeResponse(GET(url, self.app, headers=headers),
+                            self.timeout and '.dods' in url)
+
+    async def close(self):
+        self.closed = True
+
+
+class TestSharedSession(AsyncTestCase):
+
+    """Test that the requests for a dataset share a single session."""
+
+    def test_session(self):
+        dataset = DatasetType("test")
+        dataset["a"] = BaseType("a", np.arange(6, dtype='>i4'))
+        app = BaseHandler(dataset)
+        FakeSession.instances = []
+        aiohttp = Mock(ClientSession=lambda: FakeSession(app))
+
+        with patch('pydap.aio.import_aiohttp', return_value=aiohttp):
+            remote = self.run_async(open_url_async("http://localhost:8001/"))
+            data = self.run_async(remote.a.data.get())
+            np.testing.assert_array_equal(data, np.arange(6))
+
+        session, = FakeSession.instances
+        self.assertEqual(len(session.requests), 3)
+        self.assertFalse(session.closed)
+        self.run_async(remote.aclose())
+        self.assertTrue(session.closed)
+
+
+class TestTimeout(AsyncTestCase):
+
+    """Test timeouts while reading the body of responses."""
+
+    def open(self, dataset):
+        """Open a dataset whose data responses time out."""
+        self.aiohttp = Mock(ClientSession=lambda: FakeSession(
+            BaseHandler(dataset), timeout=True))
+        with patch('pydap.aio.import_aiohttp', return_value=self.aiohttp):
+            remote = self.run_async(open_url_async(
+                "http://localhost:8001/", timeout=10))
+        self.addCleanup(self.run_async, remote.aclose())
+        return remote
+
+    def test_read(self):
+        """Test a timeout reading the response of an array."""
+        remote = self.open(SimpleArray)
+        with self.assertRaises(HTTPError):
+            self.run_async(remote.byte.data.get())
+        self.aiohttp.ClientTimeout.assert_called_with(
+            sock_connect=10, sock_read=10)
+
+    def test_iter_chunks(self):
+        """Test a timeout iterating over a sequence."""
+        remote = self.open(VerySimpleSequence)
+        with self.assertRaises(HTTPError):
+            self.collect(remote.sequence.data)
+
+
+def test_unpack_available():
+    """Test unpacking a partially received sequence."""
+    dataset = build_dataset(
+        "Dataset { Sequence { Int32 a; Int32 b; } s; } d;")
+    data = (b'\x5a\x00\x00\x00' + b'\x00\x00\x00\x00\x00\x00\x00\x01' +
+            b'\x5a\x00\x00\x00' + b'\x00\x00')
+    records, pos, done = unpack_available(data, dataset.s)
+    assert [tuple(rec) for rec in records] == [(0, 1)]
+    assert pos == 12
+    assert not done
+
+    records, pos, done = unpack_available(
+        data[pos:] + b'\x00\x02\x00\x00\x00\x03' +
+        b'\xa5\x00\x00\x00', dataset.s)
+    assert [tuple(rec) for rec in records] == [(2, 3)]
+    assert done
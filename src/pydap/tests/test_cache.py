@@ -0,0 +1,276 @@
+"""Test the client side caches."""
+
+import shutil
+import tempfile
+import threading
+import numpy as np
+from pydap.model import DatasetType, BaseType
+from pydap.handlers.lib import BaseHandler
+from pydap.handlers.dap import BaseProxy, DAPHandler
+from pydap.tests.datasets import recording_app
+from pydap.lib import fix_slice, combine_slices
+from pydap.cache import (TileCache, MetadataCache, merge_tiles, tile_range,
+                         assemble_tiles)
+import unittest
+try:
+    from unittest.mock import patch
+except ImportError:
+    from mock import patch
+
+
+def normalize(index, shape):
+    """Convert an index to a tuple of slices, like ``BaseProxy`` does."""
+    return combine_slices(
+        tuple(slice(None) for n in shape), fix_slice(index, shape))
+
+
+class TestTileCache(unittest.TestCase):
+
+    """Test the tile cache with a local array."""
+
+    def setUp(self):
+        self.original = np.arange(120, dtype='>i4').reshape(10, 12)
+        self.requests = []
+        # tiles have 3 rows of the array
+        self.cache = TileCache(max_bytes=1000, tile_bytes=150)
+
+    def fetch(self, index):
+        self.requests.append(index)
+        return self.original[index]
+
+    def get(self, index):
+        index = normalize(index, self.original.shape)
+        return self.cache.get('a', index, self.original.shape,
+                              self.original.dtype, self.fetch)
+
+    def test_tile_shape(self):
+        """Test the shape of the tiles."""
+        self.assertEqual(self.cache.tile_shape((10, 12), 4), (3, 12))
+        self.assertEqual(self.cache.tile_shape((10, 100), 4), (1, 37))
+        self.assertEqual(self.cache.tile_shape((2, 3), 4), (2, 3))
+        self.assertEqual(self.cache.tile_shape((), 4), ())
+
+    def test_get(self):
+        """Test that requests return the right data."""
+        for index in [
+                np.s_[:], np.s_[2:7, 3:5], np.s_[::4, ::5], np.s_[9, 1],
+                np.s_[1:8:3, 11:], np.s_[4:4]]:
+            np.testing.assert_array_equal(
+                self.get(index), self.original[normalize(index, (10, 12))])
+
+    def test_reuse(self):
+        """Test that cached tiles are not downloaded again."""
+        self.get(np.s_[0:2])
+        self.assertEqual(self.requests, [(slice(0, 3, 1), slice(0, 12, 1))])
+
+        self.requests = []
+        np.testing.assert_array_equal(self.get(np.s_[1:8]),
+                                      self.original[1:8])
+        self.assertEqual(self.requests, [(slice(3, 9, 1), slice(0, 12, 1))])
+
+        self.requests = []
+        self.get(np.s_[2:5, 4])
+        self.assertEqual(self.requests, [])
+
+    def test_skip_tiles(self):
+        """Test that tiles without requested data are not downloaded."""
+        np.testing.assert_array_equal(self.get(np.s_[::7]),
+                                      self.original[::7])
+        self.assertEqual(self.requests, [
+            (slice(0, 3, 1), slice(0, 12, 1)),
+            (slice(6, 9, 1), slice(0, 12, 1))])
+
+    def test_eviction(self):
+        """Test that old tiles are discarded."""
+        self.cache.max_bytes = 300
+        np.testing.assert_array_equal(self.get(np.s_[:]), self.original)
+        self.assertEqual(len(self.cache), 2)
+        self.assertEqual(self.cache.nbytes, 192)
+
+        self.requests = []
+        self.get(np.s_[0])
+        self.assertEqual(self.requests, [(slice(0, 3, 1), slice(0, 12, 1))])
+
+    def test_clear(self):
+        """Test clearing the cache."""
+        self.get(np.s_[0])
+        self.cache.clear()
+        self.assertEqual(len(self.cache), 0)
+        self.assertEqual(self.cache.nbytes, 0)
+
+    def test_error(self):
+        """Test that failed downloads are not cached."""
+        def fetch(index):
+            raise IOError("Connection refused")
+
+        index = normalize(np.s_[0], (10, 12))
+        with self.assertRaises(IOError):
+            self.cache.get('a', index, (10, 12), self.original.dtype, fetch)
+        self.assertEqual(self.cache.pending, {})
+        np.testing.assert_array_equal(self.get(np.s_[0]), self.original[0:1])
+
+    def test_single_flight(self):
+        """Test that concurrent requests download data only once."""
+        started, release = threading.Event(), threading.Event()
+
+        def fetch(index):
+            started.set()
+            release.wait()
+            return self.fetch(index)
+
+        index = normalize(np.s_[0:2], (10, 12))
+        results = []
+
+        def get():
+            results.append(self.cache.get(
+                'a', index, (10, 12), self.original.dtype, fetch))
+
+        threads = [threading.Thread(target=get) for i in range(3)]
+        threads[0].start()
+        started.wait()
+        for thread in threads[1:]:
+            thread.start()
+        release.set()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len(self.requests), 1)
+        for result in results:
+            np.testing.assert_array_equal(result, self.original[0:2])
+
+
+def test_tile_range():
+    """Test finding the tiles of strided slices."""
+    assert tile_range(slice(0, 10, 1), 3, 10) == [0, 1, 2, 3]
+    assert tile_range(slice(1, 9, 3), 3, 3) == [0, 1, 2]
+    assert tile_range(slice(0, 10**9, 10**6), 10, 1000) == list(
+        range(0, 10**8, 10**5))
+
+
+def test_merge_tiles():
+    """Test merging tiles into boxes."""
+    assert merge_tiles([]) == []
+    assert merge_tiles([(0,), (1,), (3,)]) == [((0, 2),), ((3, 4),)]
+    assert merge_tiles([(0, 0), (1, 0), (0, 1)]) == [
+        ((0, 1), (0, 2)), ((1, 2), (0, 1))]
+
+
+class TestBaseProxyCache(unittest.TestCase):
+
+    """Test ``BaseProxy`` with a tile cache."""
+
+    def setUp(self):
+        """Create a WSGI app that records the requests"""
+        dataset = DatasetType("test")
+        self.original = np.arange(60, dtype='>i4').reshape(10, 6)
+        dataset["a"] = BaseType("a", self.original)
+        application = recording_app(self, BaseHandler(dataset))
+        self.data = BaseProxy(
+                              "http://localhost:8001/", "a",
+                              np.dtype(">i4"), (10, 6),
+                              application=application,
+                              cache=TileCache(tile_bytes=48))
+
+    def test_getitem(self):
+        """Test that overlapping requests reuse the data."""
+        np.testing.assert_array_equal(self.data[1:4, 2],
+                                      self.original[1:4, 2:3])
+        self.assertEqual(self.requests, ['a[0:1:3][0:1:5]'])
+
+        np.testing.assert_array_equal(self.data[2:6],
+                                      self.original[2:6])
+        self.assertEqual(self.requests, ['a[0:1:3][0:1:5]',
+                                         'a[4:1:5][0:1:5]'])
+
+    def test_empty(self):
+        """Test that empty requests have the native byte order."""
+        self.assertEqual(self.data[4:4].dtype, np.dtype("=i4"))
+        self.assertEqual(self.requests, [])
+
+    def test_read_into(self):
+        """Test that tiles are assembled into the output array."""
+        out = np.zeros((3, 6), np.int32)
+        with patch('pydap.cache.assemble_tiles',
+                   wraps=assemble_tiles) as assemble:
+            self.assertIs(self.data.read_into(out, np.s_[1:7:2]), out)
+        self.assertIs(assemble.call_args[0][-1], out)
+        np.testing.assert_array_equal(out, self.original[1:7:2])
+
+    def test_strings(self):
+        """Test that string arrays are not cut to the width of a tile."""
+        dataset = DatasetType("test")
+        dataset["s"] = BaseType("s", np.array([b"a", b"bb", b"dddddddd"]))
+        data = BaseProxy("http://localhost:8001/", "s", np.dtype("S"), (3,),
+                         application=BaseHandler(dataset),
+                         cache=TileCache(tile_bytes=2))
+        np.testing.assert_array_equal(data[0:2], [b"a", b"bb"])
+        np.testing.assert_array_equal(data[:], [b"a", b"bb", b"dddddddd"])
+
+
+class TestMetadataCache(unittest.TestCase):
+
+    """Test the on-disk metadata cache."""
+
+    def setUp(self):
+        """Create a WSGI app that supports conditional requests."""
+        dataset = DatasetType("test")
+        dataset["a"] = BaseType("a", np.arange(5, dtype='>i4'))
+        dataset["a"].attributes["units"] = "m"
+        app = BaseHandler(dataset)
+        self.requests = []
+
+        def application(environ, start_response):
+            self.requests.append(
+                (environ['PATH_INFO'], environ.get('HTTP_IF_NONE_MATCH')))
+            if environ.get('HTTP_IF_NONE_MATCH') == '"v1"':
+                start_response('304 Not Modified', [('ETag', '"v1"')])
+                return []
+
+            def etag_start_response(status, headers, exc_info=None):
+                return start_response(
+                    status, headers + [('ETag', '"v1"')], exc_info)
+            return app(environ, etag_start_response)
+
+        self.app = application
+        self.path = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.path)
+
+    def open(self, cache):
+        return DAPHandler("http://localhost:8001/", self.app,
+                          metadata_cache=cache).dataset
+
+    def test_revalidate(self):
+        """Test that stored responses are revalidated."""
+        cache = MetadataCache(self.path)
+        self.open(cache)
+        self.assertEqual(self.requests, [('/.dds', None), ('/.das', None)])
+
+        self.requests = []
+        dataset = self.open(MetadataCache(self.path))
+        self.assertEqual(self.requests, [('/.dds', '"v1"'),
+                                         ('/.das', '"v1"')])
+        self.assertEqual(dataset.a.units, "m")
+        np.testing.assert_array_equal(dataset.a[:], np.arange(5))
+
+    def test_ttl(self):
+        """Test that fresh responses are not revalidated."""
+        self.open(MetadataCache(self.path, ttl=3600))
+        self.requests = []
+        dataset = self.open(MetadataCache(self.path, ttl=3600))
+        self.assertEqual(self.requests, [])
+        self.assertEqual(dataset.a.units, "m")
+
+    def test_corrupt(self):
+        """Test that unreadable entries are ignored."""
+        cache = MetadataCache(self.path)
+        with open(cache.filename("http://localhost:8001/.dds"), "w") as f:
+            f.write("{")
+        self.open(cache)
+        self.assertEqual(self.requests, [('/.dds', None), ('/.das', None)])
+
+    def test_clear(self):
+        """Test clearing the cache."""
+        cache = MetadataCache(self.path, ttl=3600)
+        self.open(cache)
+        cache.clear()
+        self.assertEqual(cache.get("http://localhost:8001/.dds"), None)
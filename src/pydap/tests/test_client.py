@@ -1,10 +1,15 @@
 """Test the Pydap client."""
 
 import os
+import tempfile
 import numpy as np
+from webob.request import Request
 from pydap.handlers.lib import BaseHandler
-from pydap.client import open_url, open_dods, open_file
-from pydap.tests.datasets import SimpleSequence, SimpleGrid, SimpleStructure
+from pydap.client import (open_url, open_urls, open_mfurl, open_dods,
+                          open_file, fetch, gather)
+from pydap.model import DatasetType, BaseType, GridType
+from pydap.tests.datasets import (SimpleSequence, SimpleGrid, SimpleStructure,
+                                  recording_app)
 from pydap.wsgi.ssf import ServerSideFunctions
 import unittest
 
@@ -27,6 +32,177 @@ class TestOpenUrl(unittest.TestCase):
         self.assertEqual(list(dataset.keys()), ["cast"])
 
 
+class TestFetch(unittest.TestCase):
+
+    """Test the ``fetch`` function, to download many variables at once."""
+
+    def setUp(self):
+        """Create a WSGI app that records the requests"""
+        dataset = DatasetType("test")
+        for i, name in enumerate(["u", "v", "temp", "salt"]):
+            dataset[name] = BaseType(
+                name, np.arange(20, dtype='>i4').reshape(4, 5) * i)
+        application = recording_app(self, BaseHandler(dataset))
+        self.original = dataset
+        self.dataset = open_url('http://localhost:8001/', application)
+
+    def test_fetch(self):
+        """Test that variables are downloaded in a single request."""
+        u, v, temp = fetch(self.dataset, ["u", "v", "temp"], np.s_[1:3, 2])
+        self.assertEqual(self.requests[2:], ['u[1:1:2][2:1:2],'
+                                             'v[1:1:2][2:1:2],'
+                                             'temp[1:1:2][2:1:2]'])
+        for name, data in zip(["u", "v", "temp"], [u, v, temp]):
+            np.testing.assert_array_equal(
+                data, self.original[name].data[1:3, 2:3])
+
+    def test_fetch_grid(self):
+        """Test fetching the array of a grid."""
+        dataset = open_url('http://localhost:8001/', BaseHandler(SimpleGrid))
+        data, x = fetch(dataset, ["SimpleGrid", "x"])
+        np.testing.assert_array_equal(data, np.arange(6).reshape(2, 3))
+        np.testing.assert_array_equal(x, np.arange(3))
+
+    def test_fetch_into(self):
+        """Test decoding the data into existing arrays."""
+        u = np.zeros((2, 1), '>i4')
+        temp = np.zeros((2, 1), np.float64)
+        data = fetch(self.dataset, ["u", "v", "temp"], np.s_[1:3, 2],
+                     out=[u, None, temp])
+        self.assertIs(data[0], u)
+        self.assertIs(data[2], temp)
+        for name, data in zip(["u", "v", "temp"], data):
+            np.testing.assert_array_equal(
+                data, self.original[name].data[1:3, 2:3])
+
+    def test_duplicate(self):
+        """Test that variables can be fetched only once."""
+        with self.assertRaises(ValueError):
+            fetch(self.dataset, ["u", "u"])
+
+
+class TestGather(unittest.TestCase):
+
+    """Test opening many datasets and reading from them concurrently."""
+
+    def setUp(self):
+        """Create WSGI apps for two datasets, recording the requests"""
+        self.originals = {}
+        self.apps = {}
+        for i, path in enumerate(["/a", "/b"]):
+            dataset = DatasetType("test")
+            for name in ["u", "v"]:
+                dataset[name] = BaseType(
+                    name, np.arange(10, dtype='>i4') + 100 * i)
+            self.originals[path] = dataset
+
+        def application(environ, start_response):
+            path = environ['PATH_INFO'].rsplit('.', 1)[0]
+            app = BaseHandler(self.originals[path])
+            return app(environ, start_response)
+        self.app = recording_app(self, application, 'PATH_INFO')
+
+    def test_open_urls(self):
+        """Test that datasets are returned in order."""
+        datasets = open_urls(
+            ['http://localhost:8001/a', 'http://localhost:8001/b'],
+            max_concurrency=2, application=self.app)
+        self.assertEqual(len(datasets), 2)
+        np.testing.assert_array_equal(datasets[1].u[:].data,
+                                      np.arange(10) + 100)
+
+    def test_gather(self):
+        """Test that reads are combined per dataset and returned in order."""
+        a, b = open_urls(
+            ['http://localhost:8001/a', 'http://localhost:8001/b'],
+            application=self.app)
+        self.requests[:] = []
+        local = BaseType("local", np.arange(3))
+
+        data = gather([(a.u, 0), (b.u, slice(2, 4)), (a.v, -1),
+                       (a.u, slice(5, 6)), (local, 1)])
+        self.assertEqual(sorted(self.requests),
+                         ['/a.dods', '/a.dods', '/b.dods'])
+        np.testing.assert_array_equal(data[0], [0])
+        np.testing.assert_array_equal(data[1], [102, 103])
+        np.testing.assert_array_equal(data[2], [9])
+        np.testing.assert_array_equal(data[3], [5])
+        self.assertEqual(data[4], 1)
+
+
+class TestOpenMfurl(unittest.TestCase):
+
+    """Test the aggregation of several datasets along a dimension."""
+
+    def setUp(self):
+        """Create WSGI apps for three files with different lengths"""
+        self.originals = {}
+        self.urls = []
+        start = 0
+        for i, length in enumerate([2, 3, 1]):
+            time = np.arange(start, start + length, dtype='>i4')
+            start += length
+            dataset = DatasetType("test")
+            dataset["time"] = BaseType("time", time, dimensions=("time",))
+            dataset["x"] = BaseType("x", np.arange(4, dtype='>i4'),
+                                    dimensions=("x",))
+            dataset["sst"] = GridType("sst")
+            dataset["sst"]["sst"] = BaseType(
+                "sst", (time[:, np.newaxis] * 10 +
+                        np.arange(4)).astype('>f4'),
+                dimensions=("time", "x"))
+            dataset["sst"]["time"] = BaseType(
+                "time", time, dimensions=("time",))
+            dataset["sst"]["x"] = BaseType(
+                "x", np.arange(4, dtype='>i4'), dimensions=("x",))
+            self.originals["/%d" % i] = dataset
+            self.urls.append("http://localhost:8001/%d" % i)
+
+        def application(environ, start_response):
+            path = environ['PATH_INFO'].rsplit('.', 1)[0]
+            app = BaseHandler(self.originals[path])
+            return app(environ, start_response)
+
+        self.dataset = open_mfurl(
+            self.urls, "time",
+            application=recording_app(self, application, 'PATH_INFO'))
+        self.expected = np.arange(6)[:, np.newaxis] * 10 + np.arange(4)
+
+    def test_shape(self):
+        """Test the shape of the aggregated variables."""
+        self.assertEqual(self.dataset.time.shape, (6,))
+        self.assertEqual(self.dataset.sst.shape, (6, 4))
+        self.assertEqual(self.dataset.x.shape, (4,))
+
+    def test_data(self):
+        """Test reading across files."""
+        np.testing.assert_array_equal(self.dataset.time[:].data, np.arange(6))
+        np.testing.assert_array_equal(
+            self.dataset.sst.sst[1:6:2, 1:3].data, self.expected[1:6:2, 1:3])
+        np.testing.assert_array_equal(
+            self.dataset.sst.sst[-1].data, self.expected[-1:])
+        np.testing.assert_array_equal(self.dataset.x[:].data, np.arange(4))
+
+    def test_single_file(self):
+        """Test that only the files with the requested data are read."""
+        self.requests[:] = []
+        np.testing.assert_array_equal(
+            self.dataset.time[2:5].data, np.arange(2, 5))
+        self.assertEqual(self.requests, ["/1.dods"])
+
+    def test_read_into(self):
+        """Test reading directly into an existing array."""
+        out = np.zeros((4, 4), np.float32)
+        self.dataset.sst.sst.data.read_into(out, np.s_[1:5])
+        np.testing.assert_array_equal(out, self.expected[1:5])
+
+    def test_grid(self):
+        """Test slicing the grid, with its aggregated map."""
+        grid = self.dataset.sst[1:4, 0]
+        np.testing.assert_array_equal(grid.time.data, np.arange(1, 4))
+        np.testing.assert_array_equal(grid.sst.data, self.expected[1:4, :1])
+
+
 class TestOpenFile(unittest.TestCase):
 
     """Test the ``open_file`` function, to read downloaded files."""
@@ -74,6 +250,40 @@ class TestOpenFile(unittest.TestCase):
             "MetOcean WOCE/OCM")
 
 
+class TestOpenFileMapped(unittest.TestCase):
+
+    """Test that ``open_file`` maps arrays to the file."""
+
+    def setUp(self):
+        """Write a ``.dods`` response with several arrays to a file."""
+        dataset = DatasetType("test")
+        dataset["f"] = BaseType("f", np.arange(12, dtype='>f8').reshape(3, 4))
+        dataset["b"] = BaseType("b", np.arange(5, dtype='B'))
+        dataset["i16"] = BaseType("i16", np.array([-2, 1, 300], '>i2'))
+        dataset["s"] = BaseType("s", np.array(["one", "three"]))
+        dataset["i"] = BaseType("i", np.array(7, '>i4'))
+        dataset["u16"] = BaseType("u16", np.array([[1, 65535]], '>u2'))
+        self.original = dataset
+
+        fd, self.path = tempfile.mkstemp(suffix='.dods')
+        self.addCleanup(os.remove, self.path)
+        with os.fdopen(fd, 'wb') as f:
+            f.write(Request.blank('/.dods').get_response(
+                BaseHandler(dataset)).body)
+
+    def test_data(self):
+        """Test that arrays are read only views."""
+        dataset = open_file(self.path)
+        for name in ["f", "b", "i16", "u16"]:
+            data = dataset[name].data
+            self.assertIsInstance(data, np.ndarray)
+            self.assertFalse(data.flags.writeable)
+            self.assertEqual(data.dtype, dataset[name].dtype)
+            np.testing.assert_array_equal(data, self.original[name].data)
+        self.assertEqual(list(dataset.s.data), [b"one", b"three"])
+        self.assertEqual(dataset.i.data, 7)
+
+
 class TestOpenDods(unittest.TestCase):
 
     """Test the ``open_dods`` function, to access binary data directly."""
@@ -100,6 +310,17 @@ class TestOpenDods(unittest.TestCase):
         # attributes should be empty
         self.assertEqual(dataset.attributes, {})
 
+    def test_open_dods_gzip(self):
+        """Open a compressed dods response, with its compressed das."""
+        app = BaseHandler(SimpleSequence, gzip=True)
+        dataset = open_dods('.dods', metadata=True, application=app)
+        self.assertEqual(
+            list(dataset.data), [[
+                ('1', 100, -10, 0, -1, 21, 35, 0),
+                ('2', 200, 10, 500, 1, 15, 35, 100),
+            ]])
+        self.assertEqual(dataset.cast.lon.axis, 'X')
+
     def test_open_dods_with_attributes(self):
         """Open the dods response together with the das response."""
         dataset = open_dods('.dods', metadata=True, application=self.app)
@@ -1,12 +1,26 @@
 """Test the DAP handler, which forms the core of the client."""
 
+import io
+import zlib
 import numpy as np
-from pydap.model import StructureType, GridType, DatasetType, BaseType
+from pydap.model import (StructureType, GridType, DatasetType, BaseType,
+                         SequenceType)
+from pydap.lib import (BytesReader, StreamReader, START_OF_SEQUENCE,
+                       END_OF_SEQUENCE)
 from pydap.handlers.lib import BaseHandler, ConstraintExpression
-from pydap.handlers.dap import DAPHandler, BaseProxy, SequenceProxy
-from pydap.handlers.dap import find_pattern_in_string_iter
+from pydap.handlers.dap import (DAPHandler, BaseProxy, SequenceProxy,
+                                GridArrayProxy, MapProxy, RecordPlan,
+                                unpack_sequence, unpack_sequence_batches,
+                                decompress_chunks, unpack_strings,
+                                unpack_data,
+                                DECOMPRESSORS, DECOMPRESS_BYTES)
+from pydap.parsers.dds import build_dataset
+from pydap.planner import FetchPlanner, STRIDED, CONTIGUOUS
+from pydap.handlers.dap import (find_pattern_in_string_iter,
+                                split_pattern_in_string_iter)
 from pydap.tests.datasets import (
-    SimpleSequence, SimpleGrid, SimpleArray, VerySimpleSequence)
+    SimpleSequence, SimpleGrid, SimpleArray, VerySimpleSequence,
+    recording_app)
 
 import unittest
 try:
@@ -230,6 +244,36 @@ class TestDapHandler(unittest.TestCase):
         self.assertEqual(dataset.cast.lon.data.selection, [])
         self.assertEqual(dataset.cast.lon.data.slice, (slice(None),))
 
+    def test_lazy_proxies(self):
+        """Test that proxies are created only when the data is accessed."""
+        with patch.object(DAPHandler, 'base_proxy',
+                          autospec=True,
+                          side_effect=DAPHandler.base_proxy) as base_proxy:
+            dataset = DAPHandler("http://localhost:8001/", self.app1).dataset
+            self.assertEqual(base_proxy.call_count, 0)
+            self.assertEqual(dataset.x.shape, (3,))
+            self.assertEqual(base_proxy.call_count, 0)
+
+            self.assertIsInstance(dataset.x.data, BaseProxy)
+            self.assertEqual(base_proxy.call_count, 1)
+
+            # the array and the maps of a grid are created together
+            self.assertIsInstance(dataset.SimpleGrid.y.data, MapProxy)
+            self.assertIsInstance(
+                dataset.SimpleGrid.SimpleGrid.data, GridArrayProxy)
+            self.assertEqual(base_proxy.call_count, 4)
+
+    def test_lazy_sequence_child(self):
+        """Test the data of a sequence child accessed before the sequence."""
+        dataset = DAPHandler("http://localhost:8001/", self.app2).dataset
+
+        self.assertIsInstance(dataset.cast.lon.data, SequenceProxy)
+        self.assertEqual(dataset.cast.lon.data.id, "cast.lon")
+        self.assertIsInstance(dataset.cast.data, SequenceProxy)
+        self.assertEqual(
+            [tuple(row) for row in dataset.cast[['id', 'lon']].iterdata()],
+            [('1', 100), ('2', 200)])
+
     def test_sequence_with_projection(self):
         """Test projections applied to sequences."""
         dataset = DAPHandler(
@@ -241,6 +285,79 @@ class TestDapHandler(unittest.TestCase):
                 ('2', 200, 10, 500, 1, 15, 35, 100)])
 
 
+class TestDapHandlerDDX(unittest.TestCase):
+
+    """Test datasets opened from a single DDX response."""
+
+    ddx = """<?xml version="1.0" encoding="UTF-8"?>
+<Dataset name="SimpleGrid" xmlns="http://xml.opendap.org/ns/DAP2">
+    <Attribute name="description" type="String">
+        <value>A simple grid for testing.</value>
+    </Attribute>
+    <Grid name="SimpleGrid">
+        <Array name="SimpleGrid">
+            <Int32/>
+            <dimension name="y" size="2"/>
+            <dimension name="x" size="3"/>
+        </Array>
+        <Map name="x">
+            <Attribute name="units" type="String">
+                <value>degrees_east</value>
+            </Attribute>
+            <Int32/>
+            <dimension name="x" size="3"/>
+        </Map>
+        <Map name="y">
+            <Int32/>
+            <dimension name="y" size="2"/>
+        </Map>
+    </Grid>
+</Dataset>"""
+
+    def setUp(self):
+        """Create a WSGI app that also serves the DDX."""
+        self.handler = BaseHandler(SimpleGrid)
+
+        def app(environ, start_response):
+            if environ['PATH_INFO'].endswith('.ddx'):
+                start_response('200 OK', [('Content-Type', 'text/xml')])
+                return [self.ddx.encode('utf-8')]
+            return self.handler(environ, start_response)
+        self.app = recording_app(self, app, 'PATH_INFO')
+
+    def test_ddx(self):
+        """Test that the metadata is read from a single request."""
+        dataset = DAPHandler(
+            "http://localhost:8001/", self.app, ddx=True).dataset
+        self.assertEqual(self.requests, ["/.ddx"])
+        self.assertEqual(
+            dataset.attributes["description"], "A simple grid for testing.")
+        self.assertEqual(dataset.SimpleGrid.x.units, "degrees_east")
+        np.testing.assert_array_equal(
+            dataset.SimpleGrid.SimpleGrid[:].data, np.arange(6).reshape(2, 3))
+
+    def test_fallback(self):
+        """Test that servers without the DDX fall back to the DDS and DAS."""
+        dataset = DAPHandler(
+            "http://localhost:8001/", self.handler, ddx=True).dataset
+        self.assertEqual(list(dataset.keys()), ["SimpleGrid", "x", "y"])
+        self.assertEqual(dataset.x.units, "degrees_east")
+
+    def test_error_page(self):
+        """Test falling back when the DDX is answered with an error page."""
+        for page in [b"<html><body>Error</body></html>", b"Error {};"]:
+            self.ddx = page.decode('ascii')
+            dataset = DAPHandler(
+                "http://localhost:8001/", self.app, ddx=True).dataset
+            self.assertEqual(dataset.x.units, "degrees_east")
+
+    def test_concurrent(self):
+        """Test that the DDS and the DAS are requested without the DDX."""
+        dataset = DAPHandler("http://localhost:8001/", self.app).dataset
+        self.assertEqual(sorted(self.requests), ["/.das", "/.dds"])
+        self.assertEqual(dataset.x.units, "degrees_east")
+
+
 class TestBaseProxy(unittest.TestCase):
 
     """Test `BaseProxy` objects."""
@@ -295,6 +412,377 @@ class TestBaseProxy(unittest.TestCase):
         np.testing.assert_array_equal(self.data > 2, np.arange(5) > 2)
         np.testing.assert_array_equal(self.data < 2, np.arange(5) < 2)
 
+    def test_decode_plan(self):
+        """Test that the DDS is parsed once for responses of a shape."""
+        with patch('pydap.handlers.dap.build_dataset',
+                   side_effect=build_dataset) as mock_build:
+            for i in range(5):
+                np.testing.assert_array_equal(self.data[i], [i])
+            self.assertEqual(mock_build.call_count, 1)
+            np.testing.assert_array_equal(self.data[1:3], [1, 2])
+            self.assertEqual(mock_build.call_count, 2)
+        self.assertEqual(len(self.data.plans), 2)
+
+    def test_native(self):
+        """Test that arrays are returned in the native byte order."""
+        dataset = DatasetType("test")
+        dataset["a"] = BaseType("a", np.arange(6, dtype='>f8'))
+        dataset["b"] = BaseType("b", np.arange(6, dtype='>i2'))
+        app = BaseHandler(dataset)
+        for id, dtype in [("a", ">f8"), ("b", ">i2")]:
+            data = BaseProxy("http://localhost:8001/", id, np.dtype(dtype),
+                             (6,), application=app)[1:4]
+            self.assertTrue(data.dtype.isnative)
+            self.assertEqual(data.dtype, np.dtype(dtype).newbyteorder('='))
+            np.testing.assert_array_equal(data, [1, 2, 3])
+
+    def test_decode_plan_nested(self):
+        """Test decoding a variable inside a structure."""
+        dataset = DatasetType("test")
+        dataset["s"] = StructureType("s")
+        dataset["s"]["b"] = BaseType("b", np.arange(6, dtype='>f4'))
+        data = BaseProxy("http://localhost:8001/", "s.b", np.dtype(">f4"),
+                         (6,), application=BaseHandler(dataset))
+        np.testing.assert_array_equal(data[2:4], [2, 3])
+        np.testing.assert_array_equal(data[2:4], [2, 3])
+
+
+class TestBaseProxyStreaming(unittest.TestCase):
+
+    """Test that ``BaseProxy`` decodes responses split in small chunks."""
+
+    def setUp(self):
+        """Create a WSGI app that returns the response byte by byte"""
+        dataset = DatasetType("test")
+        dataset["a"] = BaseType("a", np.arange(12, dtype='>f8').reshape(3, 4))
+        app = BaseHandler(dataset)
+
+        def application(environ, start_response):
+            body = b''.join(app(environ, start_response))
+            return [body[i:i+1] for i in range(len(body))]
+
+        self.data = BaseProxy(
+                              "http://localhost:8001/", "a",
+                              np.dtype(">f8"), (3, 4),
+                              application=application)
+
+    def test_getitem(self):
+        """Test the ``__getitem__`` method."""
+        np.testing.assert_array_equal(
+            self.data[1:, ::2], np.arange(12).reshape(3, 4)[1:, ::2])
+
+
+class TestBaseProxyParallel(unittest.TestCase):
+
+    """Test parallel downloads with ``BaseProxy``."""
+
+    def setUp(self):
+        """Create a WSGI app that records the requests"""
+        dataset = DatasetType("test")
+        self.original = np.arange(60, dtype='>i4').reshape(10, 6)
+        dataset["a"] = BaseType("a", self.original)
+        application = recording_app(self, BaseHandler(dataset))
+        self.data = BaseProxy(
+                              "http://localhost:8001/", "a",
+                              np.dtype(">i4"), (10, 6),
+                              application=application,
+                              max_workers=4, chunk_bytes=40)
+
+    def test_getitem(self):
+        """Test that large requests are split."""
+        np.testing.assert_array_equal(self.data[:], self.original)
+        self.assertEqual(len(self.requests), 6)
+
+        self.requests = []
+        np.testing.assert_array_equal(self.data[1:9:3, 1:],
+                                      self.original[1:9:3, 1:])
+        self.assertEqual(sorted(self.requests),
+                         ['a[1:3:1][1:1:5]', 'a[4:3:7][1:1:5]'])
+
+    def test_small_request(self):
+        """Test that small requests are not split."""
+        np.testing.assert_array_equal(self.data[2, 1:3],
+                                      self.original[2:3, 1:3])
+        self.assertEqual(len(self.requests), 1)
+
+
+class TestGridProxy(unittest.TestCase):
+
+    """Test downloading grids with their maps in a single request."""
+
+    def setUp(self):
+        """Create a WSGI app that records the requests"""
+        dataset = DatasetType("test")
+        dataset["grid"] = GridType("grid")
+        dataset["grid"]["grid"] = BaseType(
+            "grid", np.arange(12, dtype='>i4').reshape(3, 4),
+            dimensions=("y", "x"))
+        dataset["grid"]["y"] = BaseType("y", np.arange(3, dtype='>i4'))
+        dataset["grid"]["x"] = BaseType("x", np.arange(4, dtype='>i4') * 10)
+        application = recording_app(self, BaseHandler(dataset))
+        self.dataset = DAPHandler(
+            "http://localhost:8001/", application).dataset
+        self.requests = []
+
+    def test_proxies(self):
+        """Test the proxies of the grid."""
+        self.assertIsInstance(self.dataset.grid.grid.data, GridArrayProxy)
+        self.assertIsInstance(self.dataset.grid.x.data, MapProxy)
+
+    def test_getitem(self):
+        """Test that maps are downloaded once, with the array."""
+        grid = self.dataset.grid[1:3, 2]
+        self.assertEqual(self.requests, ['grid.grid[1:1:2][2:1:2],'
+                                         'grid.y[0:1:2],grid.x[0:1:3]'])
+        np.testing.assert_array_equal(
+            grid.grid.data, np.arange(12).reshape(3, 4)[1:3, 2:3])
+        np.testing.assert_array_equal(grid.y.data, [1, 2])
+        np.testing.assert_array_equal(grid.x.data, [20])
+
+        self.requests = []
+        grid = self.dataset.grid[0, ::2]
+        self.assertEqual(self.requests, ['grid.grid[0:1:0][0:2:3]'])
+        np.testing.assert_array_equal(grid.x.data, [0, 20])
+
+    def test_map(self):
+        """Test that maps are sliced locally."""
+        np.testing.assert_array_equal(self.dataset.grid.x[1:3].data, [10, 20])
+        np.testing.assert_array_equal(self.dataset.grid.x[::3].data, [0, 30])
+        self.assertEqual(self.requests, ['grid.x[0:1:3]'])
+
+    def test_map_copy(self):
+        """Test that changing the data of a map doesn't change the map."""
+        x = self.dataset.grid.x[:].data
+        x += 1000
+        np.testing.assert_array_equal(self.dataset.grid.x[:].data,
+                                      [0, 10, 20, 30])
+        np.testing.assert_array_equal(self.dataset.grid[0, :].x.data,
+                                      [0, 10, 20, 30])
+
+    def test_map_fancy(self):
+        """Test that maps are indexed locally with arrays and masks."""
+        x = self.dataset.grid.x.data
+        np.testing.assert_array_equal(x[[0, 2]], [0, 20])
+        np.testing.assert_array_equal(
+            x[np.array([True, False, False, True])], [0, 30])
+        self.assertEqual(self.requests, ['grid.x[0:1:3]'])
+
+        # indexes are relative to the slice of the proxy
+        view = MapProxy(x.baseurl, x.id, x.dtype, x.shape, (slice(1, 4, 2),),
+                        application=x.application)
+        np.testing.assert_array_equal(view[[1, 0]], [30, 10])
+
+    def test_output_grid(self):
+        """Test that maps are not downloaded without ``output_grid``."""
+        dataset = DAPHandler(
+            "http://localhost:8001/", self.dataset.grid.grid.data.application,
+            output_grid=False).dataset
+        self.requests = []
+        dataset.grid[1:3, 2]
+        self.assertEqual(self.requests, ['grid.grid[1:1:2][2:1:2]'])
+
+
+class TestBaseProxyPlanner(unittest.TestCase):
+
+    """Test strided reads chosen by a ``FetchPlanner``."""
+
+    def setUp(self):
+        """Create a WSGI app recording the requests."""
+        dataset = DatasetType("test")
+        self.original = np.arange(60, dtype='>i4').reshape(10, 6)
+        dataset["a"] = BaseType("a", self.original)
+        application = recording_app(self, BaseHandler(dataset))
+        self.planner = FetchPlanner()
+        self.data = BaseProxy("http://localhost:8001/", "a", np.dtype(">i4"),
+                              (10, 6), application=application,
+                              planner=self.planner)
+
+    def test_learn(self):
+        """Test that timings are recorded, and contiguous ranges tried."""
+        np.testing.assert_array_equal(
+            self.data[1:8:3, ::2], self.original[1:8:3, ::2])
+        self.assertEqual(self.requests, ["a[1:3:7][0:2:5]"])
+
+        # with only strided requests observed a contiguous range is tried
+        data = self.data[1:8:3, ::2]
+        np.testing.assert_array_equal(data, self.original[1:8:3, ::2])
+        self.assertTrue(data.flags.c_contiguous)
+        self.assertEqual(self.requests[1], "a[1:1:7][0:1:4]")
+        self.assertEqual(sorted(key[1] for key in self.planner.models),
+                         [CONTIGUOUS, STRIDED])
+
+    def test_read_into(self):
+        """Test decimating a contiguous range into an existing array."""
+        self.planner.record("http://localhost:8001/", STRIDED, 10, 10.0)
+        self.planner.record("http://localhost:8001/", CONTIGUOUS, 10, 0.1)
+        out = np.zeros((2, 6), np.int32)
+        self.data.read_into(out, np.s_[::5])
+        np.testing.assert_array_equal(out, self.original[::5])
+        self.assertEqual(self.requests, ["a[0:1:5][0:1:5]"])
+
+    def test_empty(self):
+        """Test that empty strided reads are not explored or decimated."""
+        self.planner.record("http://localhost:8001/", STRIDED, 10, 10.0)
+        self.assertEqual(self.data[5:5:2, ::2].shape, (0, 3))
+        self.assertEqual(self.requests, ["a[5:2:4][0:2:5]"])
+
+    def test_read_into_parts(self):
+        """Test that large ranges are decimated in parts."""
+        self.planner.record("http://localhost:8001/", STRIDED, 10, 10.0)
+        self.planner.record("http://localhost:8001/", CONTIGUOUS, 10, 0.1)
+        self.data.chunk_bytes = 72
+        out = np.zeros((4, 3), np.int32)
+        self.data.read_into(out, np.s_[::3, ::2])
+        np.testing.assert_array_equal(out, self.original[::3, ::2])
+        self.assertEqual(self.requests, [
+            "a[0:1:0][0:1:4]", "a[3:1:3][0:1:4]", "a[6:1:9][0:1:4]"])
+
+
+class TestBaseProxyFancy(unittest.TestCase):
+
+    """Test reading a `BaseProxy` with index arrays and masks."""
+
+    def setUp(self):
+        """Create a WSGI app recording the requests."""
+        dataset = DatasetType("test")
+        self.original = np.arange(240, dtype='>i4').reshape(4, 10, 6)
+        dataset["a"] = BaseType("a", self.original)
+        application = recording_app(self, BaseHandler(dataset))
+        self.data = BaseProxy("http://localhost:8001/", "a", np.dtype(">i4"),
+                              (4, 10, 6), application=application)
+
+    def test_array(self):
+        """Test an index array, joined in a single request."""
+        index = [8, 1, 3, 1, -1]
+        np.testing.assert_array_equal(
+            self.data[:, index], self.original[:, index])
+        self.assertEqual(self.requests, ["a[0:1:3][1:1:9][0:1:5]"])
+
+    def test_runs(self):
+        """Test that distant indexes are requested separately."""
+        with patch('pydap.handlers.dap.GAP_BYTES', 0):
+            np.testing.assert_array_equal(
+                self.data[:, [0, 1, 2, 5, 7, 9]],
+                self.original[:, [0, 1, 2, 5, 7, 9]])
+        self.assertEqual(sorted(self.requests), [
+            "a[0:1:3][0:1:2][0:1:5]", "a[0:1:3][5:2:9][0:1:5]"])
+
+    def test_mask(self):
+        """Test boolean masks along one and two axes."""
+        mask = self.original[0, :, 0] % 4 == 0
+        np.testing.assert_array_equal(
+            self.data[:, mask], self.original[:, mask])
+
+        mask = self.original[0] % 7 == 0
+        np.testing.assert_array_equal(
+            self.data[1:3, mask], self.original[1:3, mask])
+
+    def test_stations(self):
+        """Test extracting points from a field, for all times."""
+        iy, ix = np.array([2, 7, 2, 9]), np.array([5, 0, 1, 5])
+        np.testing.assert_array_equal(
+            self.data[:, iy, ix], self.original[:, iy, ix])
+        self.assertEqual(len(self.requests), 3)
+
+    def test_separate_axes(self):
+        """Test that separate index arrays are moved to the front."""
+        index = np.array([[0, 3], [2, 2]])
+        np.testing.assert_array_equal(
+            self.data[index, :, index + 1],
+            self.original[index, :, index + 1])
+
+    def test_integer(self):
+        """Test that integers keep their axis."""
+        np.testing.assert_array_equal(
+            self.data[0, ..., [1, 4]], self.original[0:1, :, [1, 4]])
+
+    def test_projection(self):
+        """Test indexing a proxy of a slice."""
+        data = BaseProxy(self.data.baseurl, "a", self.data.dtype,
+                         self.data.shape, slice_=(slice(1, 4, 1),
+                                                  slice(1, 9, 2),
+                                                  slice(0, 6, 1)),
+                         application=self.data.application)
+        np.testing.assert_array_equal(
+            data[[0, 2], [3, 0]], self.original[1:4, 1:9:2][[0, 2], [3, 0]])
+
+    def test_empty(self):
+        """Test a mask selecting no elements."""
+        mask = np.zeros(10, bool)
+        self.assertEqual(self.data[:, mask].shape, (4, 0, 6))
+        self.assertEqual(self.data[2:2, [1, 3]].shape, (0, 2, 6))
+        self.assertEqual(self.requests, [])
+
+    def test_out_of_bounds(self):
+        """Test that indexes are checked before downloading."""
+        with self.assertRaises(IndexError):
+            self.data[:, [1, 10]]
+        with self.assertRaises(IndexError):
+            self.data[:, np.ones(9, bool)]
+        self.assertEqual(self.requests, [])
+
+
+class TestReadInto(unittest.TestCase):
+
+    """Test decoding data into existing arrays."""
+
+    def setUp(self):
+        """Create a WSGI app with a few arrays."""
+        dataset = DatasetType("test")
+        self.original = np.arange(60, dtype='>i4').reshape(10, 6)
+        dataset["a"] = BaseType("a", self.original)
+        dataset["b"] = BaseType("b", np.arange(7, dtype='B'))
+        self.app = BaseHandler(dataset)
+        self.data = BaseProxy("http://localhost:8001/", "a", np.dtype(">i4"),
+                              (10, 6), application=self.app)
+
+    def test_native(self):
+        """Test decoding into a native array."""
+        out = np.zeros((3, 6), np.int32)
+        self.assertIs(self.data.read_into(out, np.s_[2:5]), out)
+        np.testing.assert_array_equal(out, self.original[2:5])
+
+    def test_wire_order(self):
+        """Test decoding into a big endian array."""
+        out = np.zeros((10, 6), '>i4')
+        self.data.read_into(out)
+        np.testing.assert_array_equal(out, self.original)
+
+    def test_convert(self):
+        """Test converting to another type, in blocks."""
+        out = np.zeros((10, 6), np.float64)
+        with patch('pydap.handlers.dap.CONVERT_BYTES', 28):
+            self.data.read_into(out)
+        np.testing.assert_array_equal(out, self.original)
+
+    def test_not_contiguous(self):
+        """Test decoding into a view of a larger array."""
+        target = np.zeros((10, 12), np.int32)
+        self.data.read_into(target[:, ::2], np.s_[:, :])
+        np.testing.assert_array_equal(target[:, ::2], self.original)
+        np.testing.assert_array_equal(target[:, 1::2], 0)
+
+    def test_bytes(self):
+        """Test decoding padded bytes."""
+        data = BaseProxy("http://localhost:8001/", "b", np.dtype("B"), (7,),
+                         application=self.app)
+        out = np.zeros(5, np.uint8)
+        data.read_into(out, np.s_[2:])
+        np.testing.assert_array_equal(out, np.arange(2, 7))
+
+    def test_parallel(self):
+        """Test decoding parts of a parallel download."""
+        self.data.max_workers = 3
+        self.data.chunk_bytes = 40
+        out = np.zeros((10, 6), np.int32)
+        self.data.read_into(out)
+        np.testing.assert_array_equal(out, self.original)
+
+    def test_shape(self):
+        """Test that the shape of the array is checked."""
+        with self.assertRaises(ValueError):
+            self.data.read_into(np.zeros((10, 5)), np.s_[:, :])
+
 
 class TestBaseProxyShort(unittest.TestCase):
 
@@ -335,6 +823,62 @@ class TestBaseProxyString(unittest.TestCase):
             self.data[:], np.array(["one", "two", "three"], dtype='S'))
 
 
+class TestDecompression(unittest.TestCase):
+
+    """Test the incremental decompression of responses."""
+
+    def setUp(self):
+        self.data = np.arange(100000, dtype='>i4').tobytes()
+
+    def chunks(self, data, n=1000):
+        return [data[i:i+n] for i in range(0, len(data), n)]
+
+    def compress(self, data, wbits):
+        compressor = zlib.compressobj(6, zlib.DEFLATED, wbits)
+        return compressor.compress(data) + compressor.flush()
+
+    def test_gzip(self):
+        """Test gzip data, with several members, in small chunks."""
+        compressed = (self.compress(self.data[:1000], 16 + zlib.MAX_WBITS) +
+                      self.compress(self.data[1000:], 16 + zlib.MAX_WBITS))
+        pieces = list(decompress_chunks(self.chunks(compressed),
+                                        DECOMPRESSORS['gzip']))
+        self.assertEqual(b''.join(pieces), self.data)
+        self.assertTrue(all(len(piece) <= DECOMPRESS_BYTES
+                            for piece in pieces))
+
+    def test_deflate(self):
+        """Test deflate data, with and without the zlib header."""
+        for compressed in [self.compress(self.data, zlib.MAX_WBITS),
+                           self.compress(self.data, -zlib.MAX_WBITS)]:
+            self.assertEqual(b''.join(decompress_chunks(
+                self.chunks(compressed), DECOMPRESSORS['deflate'])),
+                self.data)
+
+    def test_deflate_bytes(self):
+        """Test deflate data received one byte at a time."""
+        data = self.data[:1000]
+        for compressed in [self.compress(data, zlib.MAX_WBITS),
+                           self.compress(data, -zlib.MAX_WBITS)]:
+            self.assertEqual(b''.join(decompress_chunks(
+                self.chunks(compressed, 1), DECOMPRESSORS['deflate'])),
+                data)
+
+    def test_sequence(self):
+        """Test iterating over a compressed sequence."""
+        app = BaseHandler(VerySimpleSequence, gzip=True)
+        dataset = DAPHandler("http://localhost:8001/", app).dataset
+        self.assertEqual(
+            [tuple(row) for row in dataset.sequence.data],
+            [tuple(row) for row in VerySimpleSequence.sequence.data])
+
+    def test_base_proxy(self):
+        """Test downloading a compressed array."""
+        data = BaseProxy("http://localhost:8001/", "byte", np.dtype("B"),
+                         (5,), application=BaseHandler(SimpleArray, gzip=True))
+        np.testing.assert_array_equal(data[1:3], [1, 2])
+
+
 class TestSequenceProxy(unittest.TestCase):
 
     """Test that a ``SequenceProxy`` behaves like a Numpy structured array."""
@@ -425,6 +969,29 @@ class TestSequenceProxy(unittest.TestCase):
         child = self.remote["byte"]
         self.assertEqual(list(child), [0, 1, 2, 3, 4, 5, 6, 7])
 
+    def test_iter_batches(self):
+        """Test iteration over batches of records."""
+        batches = list(self.remote.iter_batches(batch_rows=3))
+        self.assertEqual([len(batch) for batch in batches], [3, 3, 2])
+        self.assertEqual(batches[0].dtype.names, ("byte", "int", "float"))
+        self.assertEqual(
+            [tuple(row) for batch in batches for row in batch],
+            [tuple(row) for row in self.local])
+
+    def test_to_array(self):
+        """Test downloading the whole sequence as an array."""
+        data = self.remote.to_array()
+        np.testing.assert_array_equal(data["int"], np.arange(1, 9))
+        np.testing.assert_array_equal(data["float"], np.arange(10, 90, 10))
+
+        np.testing.assert_array_equal(
+            self.remote["byte"].to_array(batch_rows=5), np.arange(8))
+
+        filtered = self.remote[self.remote["byte"] > 10]
+        self.assertEqual(filtered.to_array().dtype.names,
+                         ("byte", "int", "float"))
+        self.assertEqual(len(filtered.to_array()), 0)
+
     def test_iter_find_pattern(self):
         pattern = b'Data:\n'
         # Check in a simple iteration:
@@ -447,6 +1014,20 @@ class TestSequenceProxy(unittest.TestCase):
         assert last_chunk == b''
         assert next(string_iter) == b'b'
 
+    def test_iter_split_pattern(self):
+        pattern = b'\nData:\n'
+        string_iter = iter([b'Dataset {', b'} x;\nDa', b'ta:\nabc', b'def'])
+        head, last_chunk = split_pattern_in_string_iter(pattern, string_iter)
+        assert head == b'Dataset {} x;'
+        assert last_chunk == b'abc'
+        assert next(string_iter) == b'def'
+
+        # Pattern not found:
+        head, last_chunk = split_pattern_in_string_iter(
+            pattern, iter([b'Dataset {', b'} x;']))
+        assert head == b'Dataset {} x;'
+        assert last_chunk is None
+
     def test_comparisons(self):
         """Test lazy comparisons on the object."""
         filtered = self.remote[self.remote["byte"] == 4]
@@ -462,6 +1043,57 @@ class TestSequenceProxy(unittest.TestCase):
         self.assertEqual(filtered.selection, ["sequence.byte<=4"])
 
 
+class TestRecordPlan(unittest.TestCase):
+
+    """Test the compiled decode plans for sequences."""
+
+    def test_nested_structure(self):
+        """Test that structures of scalars are decoded with one read."""
+        dataset = build_dataset("""Dataset {
+            Sequence {
+                Int32 a;
+                Structure {
+                    Float64 x;
+                    Byte q;
+                } p;
+            } s;
+        } d;""")
+        data = (START_OF_SEQUENCE + np.array(1, '>i4').tobytes() +
+                np.array(1.5, '>f8').tobytes() + b'\x07\x00\x00\x00' +
+                START_OF_SEQUENCE + np.array(2, '>i4').tobytes() +
+                np.array(2.5, '>f8').tobytes() + b'\x08\x00\x00\x00' +
+                END_OF_SEQUENCE)
+
+        plan = RecordPlan(dataset.s)
+        self.assertEqual(len(plan.steps), 1)
+        self.assertEqual(plan.wire.itemsize, 16)
+
+        self.assertEqual(
+            list(unpack_sequence(BytesReader(data), dataset.s)),
+            [(1, (1.5, 7)), (2, (2.5, 8))])
+
+        batches = list(unpack_sequence_batches(BytesReader(data), dataset.s))
+        self.assertEqual(len(batches), 1)
+        np.testing.assert_array_equal(batches[0]["a"], [1, 2])
+        np.testing.assert_array_equal(batches[0]["p"]["x"], [1.5, 2.5])
+        np.testing.assert_array_equal(batches[0]["p"]["q"], [7, 8])
+
+    def test_int16(self):
+        """Test that 16 bit integers are decoded from 32 bits."""
+        dataset = DatasetType("test")
+        dataset["s"] = SequenceType("s")
+        dataset["s"]["a"] = BaseType("a")
+        dataset["s"]["b"] = BaseType("b")
+        dataset["s"].data = np.rec.fromarrays(
+            [np.array([1, -2, 3], '>i2'), np.array([4, 5, 6], 'B')],
+            names='a,b')
+        remote = DAPHandler("http://localhost:8001/",
+                            BaseHandler(dataset)).dataset.s.data
+        self.assertEqual([tuple(row) for row in remote],
+                         [(1, 4), (-2, 5), (3, 6)])
+        np.testing.assert_array_equal(remote.to_array()["a"], [1, -2, 3])
+
+
 class TestSequenceWithString(unittest.TestCase):
 
     def setUp(self):
@@ -484,6 +1116,13 @@ class TestSequenceWithString(unittest.TestCase):
                 ('1', 100, -10, 0, -1, 21, 35, 0),
                 ('2', 200, 10, 500, 1, 15, 35, 100)])
 
+    def test_to_array(self):
+        """Test downloading a sequence with strings as an array."""
+        data = self.remote.to_array(batch_rows=1)
+        self.assertEqual(data.dtype.names[:2], ("id", "lon"))
+        self.assertEqual(data["id"].tolist(), ['1', '2'])
+        self.assertEqual(data["lon"].tolist(), [100, 200])
+
     def test_projection(self):
         """Test if we can select only a few variables."""
         filtered = self.local[["salinity", "depth"]]
@@ -540,6 +1179,64 @@ class TestStringBaseType(unittest.TestCase):
                                       "This is a test")
 
 
+class TestUnpackStrings(unittest.TestCase):
+
+    """Test the vectorized decoding of strings."""
+
+    def encode(self, strings):
+        out = b''
+        for s in strings:
+            out += np.array(len(s), '>u4').tobytes()
+            out += s + b'\0' * (-len(s) % 4)
+        return out
+
+    def test_uniform(self):
+        """Test strings with the same length."""
+        strings = [b'abc', b'def', b'ghi']
+        stream = BytesReader(self.encode(strings) + b'tail')
+        np.testing.assert_array_equal(
+            unpack_strings(stream, 3), strings)
+        self.assertEqual(stream.read(4), b'tail')
+
+    def test_mixed(self):
+        """Test strings with different lengths, including empty ones."""
+        strings = [b'a', b'', b'longer string', b'abcd', b'']
+        stream = BytesReader(self.encode(strings))
+        result = unpack_strings(stream, 5)
+        self.assertEqual(result.dtype, np.dtype('S13'))
+        np.testing.assert_array_equal(result, strings)
+
+    def test_empty(self):
+        """Test empty strings."""
+        stream = BytesReader(self.encode([b'', b'']))
+        np.testing.assert_array_equal(unpack_strings(stream, 2), [b'', b''])
+
+    def test_file_object(self):
+        """Test decoding strings from a plain file object."""
+        dataset = build_dataset("Dataset { String s[n = 2]; } d;")
+        stream = io.BytesIO(
+            b'\x00\x00\x00\x02' + self.encode([b'ab', b'cde']))
+        data, = unpack_data(stream, dataset)
+        np.testing.assert_array_equal(data, [b'ab', b'cde'])
+        self.assertEqual(len(unpack_strings(stream, 0)), 0)
+
+    def test_blocks(self):
+        """Test strings spanning several blocks, and larger than a block."""
+        strings = [b'x' * i for i in range(40)]
+        with patch('pydap.handlers.dap.STRING_BYTES', 16):
+            stream = BytesReader(self.encode(strings))
+            np.testing.assert_array_equal(
+                unpack_strings(stream, 40), strings)
+
+    def test_chunks(self):
+        """Test strings split between chunks of a stream."""
+        strings = [b'one', b'three', b'', b'seventeen']
+        data = self.encode(strings)
+        stream = StreamReader(iter(data[i:i + 3]
+                                   for i in range(0, len(data), 3)))
+        np.testing.assert_array_equal(unpack_strings(stream, 4), strings)
+
+
 class TestArrayStringBaseType(unittest.TestCase):
 
     """Regression test for an array of unicode base type."""
@@ -1,12 +1,15 @@
 """Test the basic DAP functions."""
 
+import mmap
+import tempfile
 import numpy as np
 from six import MAXSIZE
 from pydap.model import (DatasetType, BaseType,
                          StructureType)
 from pydap.exceptions import ConstraintExpressionError
 from pydap.lib import (quote, encode, fix_slice, combine_slices, hyperslab,
-                       walk, fix_shorthand, get_var)
+                       walk, fix_shorthand, get_var, StreamReader,
+                       BytesReader)
 import unittest
 
 
@@ -265,3 +268,90 @@ class TestGetVar(unittest.TestCase):
         dataset["b"]["c"] = BaseType("c")
 
         self.assertEqual(get_var(dataset, 'b.c'), dataset['b']['c'])
+
+
+class TestStreamReader(unittest.TestCase):
+
+    """Test the ``StreamReader`` over an iterator of chunks."""
+
+    def test_read(self):
+        """Test that reads can span chunks."""
+        stream = StreamReader(iter([b'abc', b'defg', b'h']))
+        self.assertEqual(stream.read(2), b'ab')
+        self.assertEqual(stream.read(4), b'cdef')
+        self.assertEqual(stream.read(2), b'gh')
+
+    def test_readinto(self):
+        """Test reading directly into a Numpy array."""
+        stream = StreamReader(iter([b'abc', b'defg', b'h']))
+        self.assertEqual(stream.read(1), b'a')
+        buf = np.zeros(5, np.uint8)
+        self.assertEqual(stream.readinto(buf), 5)
+        self.assertEqual(buf.tostring(), b'bcdef')
+        self.assertEqual(stream.read(2), b'gh')
+
+    def test_peek(self):
+        """Test that peeking does not consume data, even across chunks."""
+        stream = StreamReader(iter([b'abc', b'defg', b'h']))
+        self.assertEqual(stream.peek(2).tobytes(), b'ab')
+        self.assertEqual(stream.peek(5).tobytes(), b'abcde')
+        self.assertEqual(stream.read(4), b'abcd')
+        self.assertEqual(stream.peek(10).tobytes(), b'efgh')
+
+    def test_skip(self):
+        """Test skipping bytes."""
+        stream = StreamReader(iter([b'abc', b'defg', b'h']))
+        self.assertEqual(stream.skip(4), 4)
+        self.assertEqual(stream.read(2), b'ef')
+        self.assertEqual(stream.skip(4), 2)
+        self.assertEqual(stream.read(1), b'')
+
+    def test_readinto_exhausted(self):
+        """Test that a short count is returned at the end of the stream."""
+        stream = StreamReader(iter([b'abc']))
+        buf = np.zeros(5, np.uint8)
+        self.assertEqual(stream.readinto(buf), 3)
+
+
+class TestBytesReader(unittest.TestCase):
+
+    """Test the ``BytesReader`` over a ``bytes`` object."""
+
+    def test_read(self):
+        """Test sequential reads."""
+        stream = BytesReader(b'abcdefgh')
+        self.assertEqual(stream.read(3), b'abc')
+        self.assertEqual(stream.read(3), b'def')
+        self.assertEqual(stream.read(3), b'gh')
+        self.assertEqual(stream.read(3), b'')
+
+    def test_peek_skip(self):
+        """Test peeking and skipping bytes."""
+        stream = BytesReader(b'abcdefgh')
+        self.assertEqual(stream.peek(3).tobytes(), b'abc')
+        self.assertEqual(stream.skip(3), 3)
+        self.assertEqual(stream.peek(10).tobytes(), b'defgh')
+        self.assertEqual(stream.skip(10), 5)
+
+    def test_readinto(self):
+        """Test reading directly into a Numpy array."""
+        stream = BytesReader(b'abcdefgh')
+        stream.read(2)
+        buf = np.zeros(4, np.uint8)
+        self.assertEqual(stream.readinto(buf), 4)
+        self.assertEqual(buf.tostring(), b'cdef')
+        self.assertEqual(stream.readinto(buf), 2)
+
+    def test_mmap(self):
+        """Test peeking and reading from a ``mmap``."""
+        with tempfile.TemporaryFile() as f:
+            f.write(b'abcdefgh')
+            f.flush()
+            buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            stream = BytesReader(buffer)
+            self.assertEqual(stream.peek(3).tobytes(), b'abc')
+            self.assertEqual(stream.read(2), b'ab')
+            buf = np.zeros(4, np.uint8)
+            self.assertEqual(stream.readinto(buf), 4)
+            self.assertEqual(buf.tobytes(), b'cdef')
+            buffer.close()
@@ -1,6 +1,8 @@
 """Test the data model."""
 
 import copy
+import time
+import threading
 import numpy as np
 from pydap.model import (DatasetType, BaseType,
                          SequenceType, StructureType,
@@ -29,6 +31,26 @@ def test_DapType_attributes():
     assert (var.attributes == {"foo": "bar", "value": 42})
 
 
+def test_DapType_defer_attributes():
+    """Test that deferred updates are applied on first access."""
+    var = DapType("var", foo="bar")
+    calls = []
+
+    def update(attributes):
+        calls.append(1)
+        attributes["value"] = 42
+    var.defer_attributes(update)
+    assert not calls
+    assert (var.attributes == {"foo": "bar", "value": 42})
+    assert (var.value == 42)
+    assert (calls == [1])
+
+    # replacing the attributes discards pending updates
+    var.defer_attributes(update)
+    var.attributes = {}
+    assert (var.attributes == {})
+
+
 def test_DapType_id():
     """Test id assignment."""
     var = DapType("var")
@@ -133,6 +155,74 @@ def test_BaseType_copy():
     assert (original.attributes == clone.attributes)
 
 
+def test_BaseType_defer_data():
+    """Test that deferred data is created on first access."""
+    var = BaseType("var", np.empty((2, 3)))
+    calls = []
+
+    def factory(var):
+        calls.append(var.name)
+        return np.ones(var.shape)
+    var.defer_data(factory)
+
+    # dtype, shape and copies do not create the data
+    assert (var.shape == (2, 3))
+    assert (var.dtype == np.dtype("float64"))
+    clone = copy.copy(var)
+    assert not calls
+
+    np.testing.assert_array_equal(var.data, np.ones((2, 3)))
+    np.testing.assert_array_equal(var[0], np.ones(3))
+    assert (calls == ["var"])
+
+    # setting the data discards the factory
+    clone.data = np.zeros(2)
+    np.testing.assert_array_equal(clone.data, np.zeros(2))
+    assert (calls == ["var"])
+
+
+def test_BaseType_defer_data_error():
+    """Test that a failing factory is tried again."""
+    var = BaseType("var", np.empty(3))
+    calls = []
+
+    def factory(var):
+        calls.append(var.name)
+        if len(calls) == 1:
+            raise IOError("Connection refused")
+        return np.arange(3)
+    var.defer_data(factory)
+
+    with pytest.raises(IOError):
+        var.data
+    np.testing.assert_array_equal(var.data, np.arange(3))
+    assert (len(calls) == 2)
+
+
+def test_BaseType_defer_data_threads():
+    """Test that threads wait for the data being created."""
+    var = BaseType("var", np.empty(3))
+    started = threading.Event()
+    calls = []
+
+    def factory(var):
+        calls.append(var.name)
+        started.set()
+        time.sleep(0.05)
+        return np.arange(3)
+    var.defer_data(factory)
+
+    results = []
+    thread = threading.Thread(target=lambda: results.append(var.data))
+    thread.start()
+    started.wait()
+    results.append(var.data)
+    thread.join()
+    for data in results:
+        np.testing.assert_array_equal(data, np.arange(3))
+    assert (calls == ["var"])
+
+
 def test_BaseType_comparisons():
     """Test that comparisons are applied to data."""
     var = BaseType("var", np.array(1))
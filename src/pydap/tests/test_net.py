@@ -2,10 +2,15 @@
 Test the follow redirects and handling of more complex routing situations
 """
 
+import zlib
+import pytest
 import requests
 from webob.request import Request
+from webob.response import Response
+from webob.exc import HTTPError
 import requests_mock
-from pydap.net import create_request
+from pydap.net import (create_request, GET, Transport, get_transport,
+                       raise_for_status)
 
 
 def test_redirect():
@@ -41,3 +46,76 @@ def test_redirect():
         assert len(m.request_history) == 2
         assert isinstance(req, Request)
         assert req.headers['Host'] == 'www.test2.com:80'
+
+
+def test_transport():
+    """Test that the transport reuses redirects and streams responses."""
+    transport = Transport()
+    with requests_mock.Mocker() as m:
+        m.register_uri('GET', 'http://www.test.com/a.dds', status_code=301,
+                       headers={'Location': 'https://www.test2.com/a.dds'})
+        m.register_uri('GET', 'https://www.test2.com/a.dds', content=b'abc',
+                       headers={'Content-Encoding': 'gzip'})
+        m.register_uri('GET', 'http://www.test.com/b.dds', text='Dataset')
+
+        res = GET('http://www.test.com/a.dds', session=transport)
+        assert isinstance(res, Response)
+        assert res.status_code == 200
+
+        # the redirect is followed directly, and there are no HEAD requests
+        res = GET('http://www.test.com/a.dds?x', session=transport)
+        assert list(res.app_iter) == [b'abc']
+        assert res.content_encoding == 'gzip'
+
+        # other paths on the same host are not redirected
+        res = GET('http://www.test.com/b.dds', session=transport)
+        assert res.text == 'Dataset'
+        assert [(r.method, r.url) for r in m.request_history] == [
+            ('GET', 'http://www.test.com/a.dds'),
+            ('GET', 'https://www.test2.com/a.dds'),
+            ('GET', 'https://www.test2.com/a.dds?x'),
+            ('GET', 'http://www.test.com/b.dds')]
+
+        # only the encodings that can be decompressed are accepted
+        transport.get('http://www.test.com/b.dds')
+        assert m.request_history[-1].headers['Accept-Encoding'] == (
+            'gzip, deflate')
+
+
+def test_accept_encoding():
+    """Test that compressed responses are accepted by default."""
+    environs = []
+
+    def app(environ, start_response):
+        environs.append(environ)
+        start_response('200 OK', [])
+        return [b'']
+
+    GET('http://localhost:8001/', app)
+    GET('http://localhost:8001/', app, headers={'Accept-Encoding': 'gzip'})
+    assert [e['HTTP_ACCEPT_ENCODING'] for e in environs] == [
+        'gzip, deflate', 'gzip']
+
+
+def test_raise_for_status_compressed():
+    """Test that compressed error pages are decompressed."""
+    def app(environ, start_response):
+        start_response('404 Not Found', [('Content-Encoding', 'gzip'),
+                                         ('Content-Type', 'text/plain')])
+        compressor = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+        return [compressor.compress(b'Not found') + compressor.flush()]
+
+    with pytest.raises(HTTPError) as e:
+        raise_for_status(GET('http://localhost:8001/', app))
+    assert e.value.detail == '404 Not Found\nNot found'
+    assert e.value.comment == b'Not found'
+
+
+def test_get_transport():
+    """Test that transports are shared."""
+    assert get_transport() is get_transport()
+    session = requests.Session()
+    assert get_transport(session) is get_transport(session)
+    assert get_transport(session).session is session
+    transport = Transport()
+    assert get_transport(transport) is transport
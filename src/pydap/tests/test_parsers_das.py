@@ -69,3 +69,30 @@ class TestParseDAS(unittest.TestCase):
         self.assertEqual(self.dataset.SPEH.attributes['TIME'], 0)
         self.assertEqual(self.dataset.SPEH.attributes['COADSX'], 1e20)
         self.assertEqual(self.dataset.SPEH.attributes['COADSY'], "zero")
+
+
+class TestLazyDAS(TestParseDAS):
+
+    """Test DAS parser with lazy attribute conversion."""
+
+    def setUp(self):
+        """Load a dataset and apply a lazily parsed DAS to it."""
+        self.dataset = build_dataset(DDS)
+        attributes = parse_das(DAS, lazy=True)
+        add_attributes(self.dataset, attributes)
+
+    def test_materialize(self):
+        """Test that lazy attributes convert to the same values."""
+        expected = parse_das(DAS)
+        attributes = parse_das(DAS, lazy=True).materialize()
+        self.assertEqual(attributes["SPEH"], expected["SPEH"])
+        self.assertEqual(attributes["structure"]["b"]["foo"], ["one", "two"])
+        self.assertTrue(np.isnan(attributes["structure"]["b"]["missing"]))
+
+    def test_deferred(self):
+        """Test that values are converted only when accessed."""
+        dataset = build_dataset(DDS)
+        add_attributes(dataset, parse_das(DAS, lazy=True))
+        self.assertEqual(len(dataset.SPEH._deferred_attributes), 1)
+        self.assertEqual(dataset.SPEH.attributes["COADSX"], 1e20)
+        self.assertEqual(dataset.SPEH._deferred_attributes, [])
@@ -114,3 +114,39 @@ class TestBuildDataset(unittest.TestCase):
         self.assertIsInstance(self.dataset.structure.u, BaseType)
         self.assertEqual(self.dataset.structure.u.dtype, np.dtype("|S128"))
         self.assertEqual(self.dataset.structure.u.shape, ())
+
+    def test_grid(self):
+        """Test grid parsing."""
+        self.assertEqual(list(self.dataset.SPEH.keys()),
+                         ["SPEH", "TIME", "COADSY", "COADSX"])
+        self.assertEqual(self.dataset.SPEH.SPEH.shape, (12, 90, 180))
+        self.assertEqual(self.dataset.SPEH.SPEH.dimensions,
+                         ("TIME", "COADSY", "COADSX"))
+        self.assertEqual(self.dataset.SPEH.TIME.id, "SPEH.TIME")
+
+    def test_sequence(self):
+        """Test sequence parsing."""
+        self.assertEqual(self.dataset.sequence.a.id, "sequence.a")
+        self.assertEqual(self.dataset.b.shape, (10,))
+        self.assertEqual(self.dataset.c.dimensions, ("c",))
+
+
+class TestBuildLargeDataset(unittest.TestCase):
+
+    """Test parsing a DDS with many variables."""
+
+    def test_many_variables(self):
+        """Test that the order of the variables is kept."""
+        names = ["v%d" % i for i in range(5000)]
+        dds = "dataset {\n%s\n} large;" % "\n".join(
+            "    INT32 %s[x = 3];" % name for name in names)
+        dataset = build_dataset(dds)
+        self.assertEqual(dataset.name, "large")
+        self.assertEqual(list(dataset.keys()), names)
+        self.assertEqual(dataset.v4999.shape, (3,))
+        self.assertEqual(dataset.v4999.dtype, np.dtype(">i4"))
+
+    def test_error(self):
+        """Test that invalid DDS raise an error."""
+        with self.assertRaises(Exception):
+            build_dataset("Dataset { Int32 a[x = 3; } d;")
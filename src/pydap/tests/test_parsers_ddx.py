@@ -0,0 +1,140 @@
+"""Test DDX parsing functions."""
+
+import numpy as np
+from xml.etree.ElementTree import ParseError
+from pydap.parsers.ddx import parse_ddx
+from pydap.parsers.dds import build_dataset
+from pydap.lib import walk
+from pydap.model import (BaseType, StructureType, SequenceType, GridType)
+import unittest
+
+
+DDX = """<?xml version="1.0" encoding="UTF-8"?>
+<Dataset name="d" xmlns="http://xml.opendap.org/ns/DAP2">
+    <Attribute name="NC_GLOBAL" type="Container">
+        <Attribute name="title" type="String">
+            <value>Test data</value>
+        </Attribute>
+    </Attribute>
+    <Structure name="structure">
+        <Byte name="b"/>
+        <Int16 name="i16">
+            <Attribute name="valid_range" type="Int16">
+                <value>-10</value>
+                <value>10</value>
+            </Attribute>
+        </Int16>
+        <String name="s"/>
+    </Structure>
+    <Sequence name="sequence">
+        <Int32 name="a"/>
+    </Sequence>
+    <Array name="b">
+        <Int32/>
+        <dimension size="10"/>
+    </Array>
+    <Grid name="SPEH">
+        <Attribute name="units" type="String">
+            <value>g/kg</value>
+        </Attribute>
+        <Array name="SPEH">
+            <Attribute name="missing_value" type="Float32">
+                <value>-1e+34</value>
+            </Attribute>
+            <Float32/>
+            <dimension name="TIME" size="12"/>
+            <dimension name="COADSY" size="90"/>
+        </Array>
+        <Map name="TIME">
+            <Float64/>
+            <dimension name="TIME" size="12"/>
+        </Map>
+        <Map name="COADSY">
+            <Float64/>
+            <dimension name="COADSY" size="90"/>
+        </Map>
+    </Grid>
+    <blob href="cid:"/>
+</Dataset>"""
+
+
+class TestParseDDX(unittest.TestCase):
+
+    """Test the DDX parser."""
+
+    def setUp(self):
+        """Parse the whole dataset."""
+        self.dataset = parse_ddx(DDX)
+
+    def test_dataset(self):
+        """Test the name and the global attributes."""
+        self.assertEqual(self.dataset.name, "d")
+        self.assertEqual(
+            list(self.dataset.keys()), ["structure", "sequence", "b", "SPEH"])
+        self.assertEqual(self.dataset.attributes, {
+            "NC_GLOBAL": {"title": "Test data"}, "DODS_EXTRA": {}})
+
+    def test_structure(self):
+        """Test the structure."""
+        self.assertIsInstance(self.dataset.structure, StructureType)
+        self.assertIsInstance(self.dataset.structure.b, BaseType)
+        self.assertEqual(self.dataset.structure.b.dtype, np.dtype("B"))
+        self.assertEqual(self.dataset.structure.i16.dtype, np.dtype(">h"))
+        self.assertEqual(self.dataset.structure.i16.shape, ())
+        self.assertEqual(
+            self.dataset.structure.i16.attributes, {"valid_range": [-10, 10]})
+        self.assertEqual(self.dataset.structure.s.id, "structure.s")
+
+    def test_sequence(self):
+        """Test the sequence."""
+        self.assertIsInstance(self.dataset.sequence, SequenceType)
+        self.assertEqual(self.dataset.sequence.a.dtype, np.dtype(">i"))
+
+    def test_array(self):
+        """Test an array without named dimensions."""
+        self.assertEqual(self.dataset.b.dtype, np.dtype(">i"))
+        self.assertEqual(self.dataset.b.shape, (10,))
+        self.assertEqual(self.dataset.b.dimensions, ())
+
+    def test_grid(self):
+        """Test the grid, with attributes in the grid and in the array."""
+        grid = self.dataset.SPEH
+        self.assertIsInstance(grid, GridType)
+        self.assertEqual(grid.attributes, {"units": "g/kg"})
+        self.assertEqual(grid.array.id, "SPEH.SPEH")
+        self.assertEqual(grid.array.shape, (12, 90))
+        self.assertEqual(grid.array.dimensions, ("TIME", "COADSY"))
+        self.assertEqual(grid.array.missing_value, -1e+34)
+        self.assertEqual(list(grid.maps), ["TIME", "COADSY"])
+        self.assertEqual(grid.TIME.dtype, np.dtype(">d"))
+
+    def test_lazy(self):
+        """Test that lazy parsing gives the same attributes."""
+        dataset = parse_ddx(DDX, lazy=True)
+        self.assertEqual(dataset.attributes, self.dataset.attributes)
+        self.assertEqual(
+            dataset.structure.i16.attributes, {"valid_range": [-10, 10]})
+        self.assertEqual(
+            dataset.SPEH.SPEH.attributes, {"missing_value": -1e+34})
+
+
+class TestParseDDXNames(unittest.TestCase):
+
+    """Test names with special characters, and responses that aren't DDX."""
+
+    def test_quoted_names(self):
+        """Test that the ids are the same as when parsing the DDS."""
+        dataset = parse_ddx(
+            '<Dataset name="a b"><Structure name="s t">'
+            '<Int32 name="x.y z"/></Structure></Dataset>')
+        expected = build_dataset(
+            "Dataset { Structure { Int32 x.y%20z; } s%20t; } a%20b;")
+        self.assertEqual(dataset.name, expected.name)
+        self.assertEqual(
+            [var.id for var in walk(dataset)],
+            [var.id for var in walk(expected)])
+
+    def test_error_page(self):
+        """Test that other XML documents are not parsed."""
+        with self.assertRaises(ParseError):
+            parse_ddx("<html><body>Not found</body></html>")
@@ -0,0 +1,82 @@
+"""Test the planner of strided requests."""
+
+from pydap.planner import (FetchPlanner, CostModel, request_mode, STRIDED,
+                           CONTIGUOUS)
+import unittest
+
+
+class TestCostModel(unittest.TestCase):
+
+    """Test the estimation of the duration of requests."""
+
+    def test_fit(self):
+        """Test that latency and throughput are fitted."""
+        model = CostModel()
+        for nbytes in [1000, 5000, 2000, 8000]:
+            model.update(nbytes, 0.1 + nbytes * 1e-5)
+        self.assertAlmostEqual(model.estimate(0), 0.1)
+        self.assertAlmostEqual(model.estimate(10000), 0.2)
+
+    def test_single_size(self):
+        """Test requests of a single size."""
+        model = CostModel()
+        model.update(1000, 0.5)
+        self.assertAlmostEqual(model.estimate(2000), 1.0)
+
+    def test_decay(self):
+        """Test that recent requests weigh more."""
+        model = CostModel(decay=0.5)
+        for i in range(20):
+            model.update(1000, 1.0)
+        for i in range(20):
+            model.update(1000, 0.1)
+        self.assertAlmostEqual(model.estimate(1000), 0.1, places=4)
+
+
+class TestFetchPlanner(unittest.TestCase):
+
+    """Test the choice between strided and contiguous requests."""
+
+    def setUp(self):
+        self.planner = FetchPlanner(explore_bytes=1000)
+        self.url = "http://example.com/data.nc"
+
+    def test_default(self):
+        """Test that the step is sent to servers with no history."""
+        self.assertEqual(self.planner.choose(self.url, 10, 100), STRIDED)
+
+    def test_explore(self):
+        """Test that small contiguous ranges are tried once."""
+        self.planner.record(self.url, STRIDED, 100, 0.1)
+        self.assertEqual(self.planner.choose(self.url, 10, 100), CONTIGUOUS)
+        self.assertEqual(self.planner.choose(self.url, 10, 10000), STRIDED)
+
+    def test_slow_strided(self):
+        """Test a server that reads strided slices slowly."""
+        for nbytes in [100, 1000, 10000]:
+            self.planner.record(self.url, STRIDED, nbytes,
+                                0.05 + nbytes * 1e-4)
+            self.planner.record(self.url, CONTIGUOUS, nbytes,
+                                0.05 + nbytes * 1e-6)
+        self.assertEqual(
+            self.planner.choose(self.url, 1000, 10000), CONTIGUOUS)
+        self.assertEqual(
+            self.planner.choose(self.url, 1000, 10**7), STRIDED)
+
+        # other hosts are learned separately
+        self.assertEqual(
+            self.planner.choose("http://other.com/", 1000, 10000), STRIDED)
+
+    def test_fast_strided(self):
+        """Test a server that reads strided slices as fast as contiguous."""
+        for nbytes in [100, 1000, 10000]:
+            for mode in [STRIDED, CONTIGUOUS]:
+                self.planner.record(self.url, mode, nbytes,
+                                    0.05 + nbytes * 1e-6)
+        self.assertEqual(self.planner.choose(self.url, 1000, 4000), STRIDED)
+
+
+def test_request_mode():
+    """Test that single elements with a step are contiguous."""
+    assert request_mode((slice(0, 1, 3), slice(0, 5, 1))) == CONTIGUOUS
+    assert request_mode((slice(0, 4, 3), slice(0, 5, 1))) == STRIDED